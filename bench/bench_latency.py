@@ -0,0 +1,280 @@
+"""End-to-end latency breakdown for the text-to-SQL agents.
+
+Runs a fixed question set against a deterministic fake LLM and a local
+SQLite stand-in (sqlkit/datagen.py), and reports p50/p95/p99 per stage:
+prompt build, LLM, validation, connect, execute, fetch, row conversion,
+export and chart, plus end-to-end totals for the week1 and week2 agents.
+
+    python bench/bench_latency.py --orders 100000 --runs 5 --output bench_latency.json
+
+Caches are disabled so every run does the full work. Compare the JSON files
+written for different commits to see what moved.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "week1"))
+sys.path.append(os.path.join(ROOT, "week2"))
+
+QUESTIONS = [
+    ("How many customers do we have?",
+     "SELECT COUNT(*) AS customers FROM customers"),
+    ("How many customers are from California?",
+     "SELECT COUNT(*) AS customers FROM customers WHERE state = 'CA'"),
+    ("Show me total sales by state",
+     "SELECT c.state, SUM(o.total_amount) AS total_sales FROM orders o "
+     "JOIN customers c ON c.id = o.customer_id GROUP BY c.state ORDER BY total_sales DESC"),
+    ("Top 10 products by revenue",
+     "SELECT p.name, SUM(o.total_amount) AS revenue FROM orders o JOIN products p ON p.id = o.product_id "
+     "GROUP BY p.name ORDER BY revenue DESC LIMIT 10"),
+    ("How many orders per month?",
+     "SELECT date_trunc('month', order_date) AS month, COUNT(*) AS orders FROM orders GROUP BY 1 ORDER BY 1"),
+    ("Average order value by category",
+     "SELECT p.category, AVG(o.total_amount) AS avg_order FROM orders o "
+     "JOIN products p ON p.id = o.product_id GROUP BY p.category"),
+    ("List the most recent orders",
+     "SELECT id, customer_id, total_amount, order_date, status FROM orders ORDER BY order_date DESC"),
+]
+SQL_FOR = dict(QUESTIONS)
+
+
+# ---------- fake LLMs ----------
+
+def _lookup(text):
+    for question, sql in QUESTIONS:
+        if question in text:
+            return sql
+    return QUESTIONS[0][1]
+
+
+class FakeGeminiModel:
+    """Stands in for genai.GenerativeModel: canned SQL after a fixed delay."""
+    latency = 0.0
+
+    def __init__(self, model_name, system_instruction=None):
+        self.system_instruction = system_instruction
+
+    def generate_content(self, prompt):
+        time.sleep(self.latency)
+        return SimpleNamespace(text=f"```sql\n{_lookup(prompt)}\n```")
+
+
+class FakeToolLLM:
+    """Stands in for llm_with_tools: one execute_sql call, then an answer."""
+    latency = 0.0
+
+    def invoke(self, messages):
+        time.sleep(self.latency)
+        last = messages[-1]
+        if last["role"] == "tool":
+            return SimpleNamespace(content="Here are the results.", tool_calls=[])
+        return SimpleNamespace(content="", tool_calls=[
+            {"name": "execute_sql", "args": {"sql": _lookup(last["content"])}, "id": "call-1"}])
+
+
+# ---------- timing ----------
+
+class Stages:
+    def __init__(self):
+        self.samples = {}
+
+    @contextlib.contextmanager
+    def time(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples.setdefault(stage, []).append(time.perf_counter() - start)
+
+    def summary(self):
+        return {stage: summarize(values) for stage, values in self.samples.items()}
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100.0
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def summarize(values):
+    return {
+        "n": len(values),
+        "mean_ms": sum(values) / len(values) * 1000,
+        "p50_ms": percentile(values, 50) * 1000,
+        "p95_ms": percentile(values, 95) * 1000,
+        "p99_ms": percentile(values, 99) * 1000,
+    }
+
+
+# ---------- runs ----------
+
+def run_stage_breakdown(agent, stages, question, limit, workdir):
+    """The week1 pipeline, one timed stage at a time, using the same helpers as execute_query."""
+    import pandas as pd
+    from sqlkit.charts import _render, prepare_series
+    from sqlkit.cost_gate import guard_query
+    from sqlkit.pool import get_pool
+    from sqlkit.safety import check_sql
+
+    with stages.time("prompt_build"):
+        prompt = agent.system_prompt_for(question)
+    with stages.time("llm"):
+        response = FakeGeminiModel("gemini-2.5-flash", system_instruction=prompt).generate_content(question)
+        sql = response.text.strip().replace('```sql', '').replace('```', '').strip()
+    with stages.time("validation"):
+        check_sql.cache_clear()
+        ok, _ = check_sql(sql)
+    assert ok, sql
+
+    pool = get_pool(agent.DB_CONFIG)
+    with stages.time("connect"):
+        conn = pool.getconn()
+    try:
+        with stages.time("execute"):
+            run_sql = guard_query(conn, sql, confirm=lambda plan: True, limit=limit)
+            cur = conn.cursor()
+            cur.execute(run_sql)
+        with stages.time("fetch"):
+            columns = [d[0] for d in cur.description]
+            rows = cur.fetchall()
+        cur.close()
+    finally:
+        pool.putconn(conn)
+
+    with stages.time("row_conversion"):
+        data = [dict(zip(columns, row)) for row in rows]
+    with stages.time("dataframe"):
+        df = pd.DataFrame(rows, columns=columns)
+    with stages.time("export"):
+        with contextlib.redirect_stdout(io.StringIO()):
+            agent.export_results(data, format='csv', filename=os.path.join(workdir, "bench"))
+    if len(df) >= 2 and len(df.columns) >= 2:
+        with stages.time("chart"):
+            xs, ys, _ = prepare_series(df.iloc[:, 0], df.iloc[:, -1], "bar")
+            _render(xs, ys, "bar", "", "", "", os.path.join(workdir, "bench.png"))
+
+
+def run_week1(agent, totals, question, workdir):
+    from sqlkit.charts import render_chart
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        sql = agent.text_to_sql(question)
+        result = agent.execute_query(sql, confirm=lambda plan: True)
+        if result.get('count'):
+            agent.export_results(result['data'], format='csv', filename=os.path.join(workdir, "week1"))
+            if result['count'] >= 2 and len(result['data'][0]) >= 2:
+                keys = list(result['data'][0])
+                render_chart([r[keys[0]] for r in result['data']], [r[keys[-1]] for r in result['data']],
+                             "bar", os.path.join(workdir, "week1.png"))[0].result()
+    totals.setdefault("week1", []).append(time.perf_counter() - start)
+
+
+def run_week2(cli, totals, question, workdir):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        cli.run_agent(question)
+        cli.export_results("csv")
+        df = cli.cli_session.last_results
+        if df is not None and len(df.columns) == 2:
+            # visualize_results renders asynchronously; wait on the same path here
+            from sqlkit.charts import render_chart
+            render_chart(df.iloc[:, 0], df.iloc[:, 1], "bar", os.path.join(workdir, "week2.png"))[0].result()
+    totals.setdefault("week2", []).append(time.perf_counter() - start)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Text-to-SQL latency breakdown")
+    parser.add_argument("--orders", type=int, default=100000)
+    parser.add_argument("--db", default=None, help="existing SQLite stand-in (skips generation)")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--limit", type=int, default=10000, help="outer LIMIT injected by the cost gate")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="fake LLM delay in seconds")
+    parser.add_argument("--agents", default="week1,week2")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_latency_")
+    output = os.path.abspath(args.output) if args.output else None
+    db_path = os.path.abspath(args.db) if args.db else None
+    if db_path is None:
+        from sqlkit.datagen import generate
+        db_path = os.path.join(workdir, "ecommerce.sqlite3")
+        generate(db_path, n_orders=args.orders)
+
+    # Configure before the agents import sqlkit: local DB, no caches, no cost rejections
+    os.environ.update({
+        "DB_BACKEND": "sqlite",
+        "SQLITE_PATH": db_path,
+        "RESULT_CACHE_MB": "0",
+        "SQL_CACHE_PATH": os.path.join(workdir, "sql_cache.sqlite3"),
+        "WORKLOAD_LOG": os.path.join(workdir, "workload.sqlite3"),
+        "MATERIALIZE_PATH": "",
+        "QUERY_DEFAULT_LIMIT": str(args.limit),
+        "QUERY_MAX_COST": "1e18",
+        "QUERY_MAX_ROWS": "1e18",
+    })
+    os.environ.setdefault("GEMINI_API_KEY", "bench")
+    FakeGeminiModel.latency = FakeToolLLM.latency = args.llm_latency
+
+    import text_to_sql_agent as agent
+    agent.genai.GenerativeModel = FakeGeminiModel
+    agents = set(args.agents.split(","))
+    cli = None
+    if "week2" in agents:
+        import text_to_sql_langchain_cli as cli
+        cli.llm_with_tools = FakeToolLLM()
+        cli.cli_session.memory.summarize = None
+
+    stages = Stages()
+    totals = {}
+    os.chdir(workdir)  # agents write exports and charts to the current directory
+    for _ in range(args.runs):
+        for question, _ in QUESTIONS:
+            run_stage_breakdown(agent, stages, question, args.limit, workdir)
+            agent.sql_cache.clear()
+            if "week1" in agents:
+                run_week1(agent, totals, question, workdir)
+            if cli is not None:
+                cli.cli_session.memory.clear()
+                run_week2(cli, totals, question, workdir)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "config": {"orders": args.orders, "db": args.db, "runs": args.runs, "limit": args.limit,
+                   "llm_latency": args.llm_latency, "questions": len(QUESTIONS)},
+        "stages": stages.summary(),
+        "agents": {name: summarize(values) for name, values in totals.items()},
+    }
+
+    print(f"{'stage':<16}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, s in list(report["stages"].items()) + [(f"total:{k}", v) for k, v in report["agents"].items()]:
+        print(f"{name:<16}{s['p50_ms']:>10.2f}{s['p95_ms']:>10.2f}{s['p99_ms']:>10.2f}")
+
+    output = output or os.path.join(ROOT, f"bench_latency_{report['commit'] or 'local'}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWritten to {output}")
+
+
+if __name__ == "__main__":
+    main()
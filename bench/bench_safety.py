@@ -0,0 +1,71 @@
+"""Micro-benchmark: legacy substring is_safe_query vs sqlkit.safety.check_sql.
+
+Run from the repo root:  python bench/bench_safety.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from sqlkit.safety import check_sql
+
+
+def legacy_is_safe_query(sql):
+    """The original week1 implementation, kept here for comparison"""
+    sql_upper = sql.upper().strip()
+    dangerous_keywords = ['DELETE', 'DROP', 'INSERT', 'UPDATE', 'ALTER', 'TRUNCATE', 'EXEC', 'EXECUTE']
+
+    if not sql_upper.startswith('SELECT'):
+        return False
+
+    for keyword in dangerous_keywords:
+        if keyword in sql_upper:
+            return False
+
+    return True
+
+
+QUERIES = [
+    "SELECT COUNT(*) FROM customers LIMIT 100",
+    "SELECT state, COUNT(*) FROM customers GROUP BY state ORDER BY 2 DESC LIMIT 100",
+    "SELECT c.name, SUM(o.total_amount) AS total FROM orders o JOIN customers c ON c.id = o.customer_id "
+    "WHERE o.order_date >= '2024-01-01' GROUP BY c.name ORDER BY total DESC LIMIT 100",
+    "SELECT id, updated_at, last_update FROM orders WHERE status = 'shipped' LIMIT 100",
+    "WITH recent AS (SELECT * FROM orders WHERE order_date > now() - interval '30 days') "
+    "SELECT p.category, SUM(r.total_amount) FROM recent r JOIN products p ON p.id = r.product_id "
+    "GROUP BY p.category LIMIT 100",
+    "SELECT * FROM orders; DROP TABLE orders",
+]
+
+# Schema-qualified side-effect functions and row locks; check_sql must reject these
+MUST_REJECT = [
+    "SELECT pg_catalog.pg_sleep(10)",
+    "SELECT pg_catalog.pg_read_file('/etc/passwd')",
+    "SELECT public.dblink_exec('dbname=shop', 'DELETE FROM orders')",
+    "SELECT pg_catalog.set_config('statement_timeout', '0', false)",
+    "SELECT * FROM orders FOR SHARE",
+    "SELECT * FROM orders FOR KEY SHARE",
+]
+QUERIES += MUST_REJECT
+
+
+def main(number=2000):
+    print(f"{'query':<8}{'legacy':>10}{'new':>10}{'legacy us':>12}{'cold us':>10}{'warm us':>10}")
+    for i, sql in enumerate(QUERIES, 1):
+        legacy = timeit.timeit(lambda: legacy_is_safe_query(sql), number=number) / number * 1e6
+
+        def cold():
+            check_sql.cache_clear()
+            check_sql(sql)
+
+        cold_us = timeit.timeit(cold, number=number) / number * 1e6
+        check_sql(sql)
+        warm_us = timeit.timeit(lambda: check_sql(sql), number=number) / number * 1e6
+        print(f"q{i:<7}{str(legacy_is_safe_query(sql)):>10}{str(check_sql(sql)[0]):>10}"
+              f"{legacy:>12.2f}{cold_us:>10.2f}{warm_us:>10.2f}")
+    for sql in MUST_REJECT:
+        assert not check_sql(sql)[0], f"accepted: {sql}"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""Load test for the text-to-SQL HTTP service (week2/text_to_sql_server.py).
+
+Starts the service in-process on the SQLite stand-in with the fake tool LLM
+from bench_latency.py, then runs N concurrent sessions that each ask the
+question set over keep-alive connections. Reports questions/sec, answer
+latency and time to first streamed event per concurrency level.
+
+    python bench/load_test.py --orders 100000 --sessions 1,4,16 --llm-latency 0.2
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from bench_latency import QUESTIONS, FakeToolLLM, summarize
+
+
+async def request(reader, writer, method, path, payload=None):
+    """Send one request; return (status, events or JSON body, seconds to first body byte)."""
+    body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+    writer.write((f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                  f"Content-Length: {len(body)}\r\n\r\n").encode("latin-1") + body)
+    await writer.drain()
+    start = time.perf_counter()
+
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    if headers.get("transfer-encoding") != "chunked":
+        data = await reader.readexactly(int(headers.get("content-length", "0")))
+        return status, json.loads(data), time.perf_counter() - start
+
+    events, first = [], None
+    while True:
+        size = int((await reader.readline()).strip(), 16)
+        if size == 0:
+            await reader.readline()
+            break
+        chunk = await reader.readexactly(size + 2)
+        if first is None:
+            first = time.perf_counter() - start
+        events.append(json.loads(chunk[:-2]))
+    return status, events, first
+
+
+async def run_session(port, questions, latencies, first_events, failures):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        _, created, _ = await request(reader, writer, "POST", "/sessions")
+        path = f"/sessions/{created['session_id']}/ask"
+        for question in questions:
+            start = time.perf_counter()
+            status, events, first = await request(reader, writer, "POST", path, {"question": question})
+            if status != 200 or any(e.get("event") == "error" for e in events):
+                failures.append(question)
+                continue
+            latencies.append(time.perf_counter() - start)
+            first_events.append(first)
+        await request(reader, writer, "DELETE", f"/sessions/{created['session_id']}")
+    finally:
+        writer.close()
+
+
+async def run_level(port, sessions, rounds):
+    questions = [q for q, _ in QUESTIONS] * rounds
+    latencies, first_events, failures = [], [], []
+    start = time.perf_counter()
+    await asyncio.gather(*(run_session(port, questions, latencies, first_events, failures)
+                           for _ in range(sessions)))
+    elapsed = time.perf_counter() - start
+    return {
+        "sessions": sessions,
+        "questions": len(latencies),
+        "failures": len(failures),
+        "seconds": elapsed,
+        "questions_per_sec": len(latencies) / elapsed,
+        "latency": summarize(latencies) if latencies else None,
+        "first_event": summarize(first_events) if first_events else None,
+    }
+
+
+async def run(levels, rounds, workers):
+    import text_to_sql_langchain_cli as agent
+    from text_to_sql_server import AgentService, SessionStore
+
+    agent.llm_with_tools = FakeToolLLM()
+    agent.llm_summarizer = lambda llm: None  # no background summaries in the benchmark
+    service = AgentService(SessionStore(), workers=workers)
+    server = await service.start("127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    try:
+        results = []
+        for sessions in levels:
+            results.append(await run_level(port, sessions, rounds))
+        return results
+    finally:
+        server.close()
+        await server.wait_closed()
+        service.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent-session load test for the HTTP service")
+    parser.add_argument("--orders", type=int, default=100000)
+    parser.add_argument("--db", default=None, help="existing SQLite stand-in (skips generation)")
+    parser.add_argument("--sessions", default="1,4,16", help="comma-separated concurrency levels")
+    parser.add_argument("--rounds", type=int, default=2, help="passes over the question set per session")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="fake LLM delay in seconds")
+    parser.add_argument("--workers", type=int, default=None, help="agent worker threads (AGENT_WORKERS)")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="load_test_")
+    output = os.path.abspath(args.output) if args.output else None
+    db_path = os.path.abspath(args.db) if args.db else None
+    if db_path is None:
+        from sqlkit.datagen import generate
+        db_path = os.path.join(workdir, "ecommerce.sqlite3")
+        generate(db_path, n_orders=args.orders)
+
+    levels = [int(n) for n in args.sessions.split(",")]
+    # Same setup as bench_latency: local DB, no caches, no cost rejections
+    os.environ.update({
+        "DB_BACKEND": "sqlite",
+        "SQLITE_PATH": db_path,
+        "RESULT_CACHE_MB": "0",
+        "SQL_CACHE_PATH": os.path.join(workdir, "sql_cache.sqlite3"),
+        "WORKLOAD_LOG": os.path.join(workdir, "workload.sqlite3"),
+        "MATERIALIZE_PATH": "",
+        "QUERY_MAX_COST": "1e18",
+        "QUERY_MAX_ROWS": "1e18",
+        "DB_POOL_MAX": str(max(levels)),
+    })
+    os.environ.setdefault("GEMINI_API_KEY", "bench")
+    FakeToolLLM.latency = args.llm_latency
+
+    os.chdir(workdir)
+    results = asyncio.run(run(levels, args.rounds, args.workers or max(levels)))
+
+    print(f"{'sessions':>9}{'questions':>11}{'q/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'first ms':>10}")
+    for r in results:
+        lat, first = r["latency"] or {}, r["first_event"] or {}
+        print(f"{r['sessions']:>9}{r['questions']:>11}{r['questions_per_sec']:>9.2f}"
+              f"{lat.get('p50_ms', 0):>10.1f}{lat.get('p95_ms', 0):>10.1f}{first.get('p50_ms', 0):>10.1f}")
+
+    if output:
+        with open(output, "w") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+        print(f"\nWritten to {output}")
+
+
+if __name__ == "__main__":
+    main()
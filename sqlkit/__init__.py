@@ -0,0 +1 @@
+"""Shared helpers for the text-to-SQL agents in week1/ and week2/."""
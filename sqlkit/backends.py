@@ -0,0 +1,86 @@
+"""Database backends: PostgreSQL (psycopg2) and a local SQLite stand-in.
+
+The backend is picked per connection config: db_config["backend"] if set,
+otherwise the DB_BACKEND environment variable ("postgres" by default).
+SQLite uses db_config["path"] or SQLITE_PATH (see sqlkit/datagen.py to
+create and fill one).
+"""
+import os
+import sqlite3
+from datetime import date, datetime
+
+
+def backend_name(db_config):
+    return (db_config.get("backend") or os.getenv("DB_BACKEND", "postgres")).lower()
+
+
+def sqlite_path(db_config):
+    return db_config.get("path") or os.getenv("SQLITE_PATH", "ecommerce.sqlite3")
+
+
+def connect_factory(db_config):
+    """Zero-argument connect() for the configured backend."""
+    if backend_name(db_config) == "sqlite":
+        path = sqlite_path(db_config)
+        return lambda: connect_sqlite(path)
+
+    import psycopg2
+    from sqlkit.typed import register_typecasters
+    config = {k: v for k, v in db_config.items() if k not in ("backend", "path")}
+    return lambda: register_typecasters(psycopg2.connect(**config, connection_factory=_pg_connection_class()))
+
+
+_pg_connection = None
+
+
+def _pg_connection_class():
+    """psycopg2 connection that remembers the statements it has PREPAREd
+    (sqlkit.templates). They outlive pool checkouts: the pool resets
+    sessions with RESET ALL, not DISCARD ALL."""
+    global _pg_connection
+    if _pg_connection is None:
+        import psycopg2.extensions
+
+        class Connection(psycopg2.extensions.connection):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                self.prepared = set()
+
+        _pg_connection = Connection
+    return _pg_connection
+
+
+def is_sqlite(conn):
+    return isinstance(conn, sqlite3.Connection)
+
+
+def connect_sqlite(path, read_only=True):
+    """SQLite connection that behaves close enough to psycopg2 for the agents:
+    DATE/TIMESTAMP columns come back as date/datetime and a few PostgreSQL
+    functions the model likes (date_trunc, now) exist."""
+    conn = sqlite3.connect(path, check_same_thread=False, detect_types=sqlite3.PARSE_DECLTYPES)
+    conn.create_function("date_trunc", 2, _date_trunc, deterministic=True)
+    conn.create_function("now", 0, lambda: datetime.now().isoformat(sep=" "))
+    if read_only:
+        conn.execute("PRAGMA query_only = ON")
+    return conn
+
+
+def _date_trunc(unit, value):
+    if value is None:
+        return None
+    if isinstance(value, (date, datetime)):
+        value = value.isoformat()
+    dt = datetime.fromisoformat(str(value).replace("T", " ")[:19])
+    unit = unit.lower()
+    if unit == "year":
+        dt = dt.replace(month=1, day=1, hour=0, minute=0, second=0)
+    elif unit == "quarter":
+        dt = dt.replace(month=(dt.month - 1) // 3 * 3 + 1, day=1, hour=0, minute=0, second=0)
+    elif unit == "month":
+        dt = dt.replace(day=1, hour=0, minute=0, second=0)
+    elif unit == "day":
+        dt = dt.replace(hour=0, minute=0, second=0)
+    elif unit == "hour":
+        dt = dt.replace(minute=0, second=0)
+    return dt.isoformat(sep=" ")
@@ -0,0 +1,107 @@
+import contextlib
+import contextvars
+import threading
+import time
+
+from sqlkit.backends import is_sqlite
+
+
+def cancel_connection(conn):
+    """Stop the statement running on `conn`; safe to call from another thread.
+
+    psycopg2 sends a cancel request to the server (the running execute()
+    raises QueryCanceledError); SQLite interrupts the statement
+    (OperationalError: interrupted). Both connections stay usable.
+    """
+    if is_sqlite(conn):
+        conn.interrupt()
+    else:
+        conn.cancel()
+
+
+class QueryTracker:
+    """Statements in flight for one question, so another thread can show
+    progress (elapsed time, rows fetched) and cancel them.
+
+    child() gives one tool call its own tracker: cancelling the child stops
+    only that call's statements, cancelling the parent stops them all.
+    """
+
+    def __init__(self, parent=None):
+        self.started = time.monotonic()
+        self.rows = 0
+        self.parent = parent
+        self._cancelled = False
+        self._active = set()
+        self._lock = threading.Lock()
+
+    def child(self):
+        return QueryTracker(parent=self)
+
+    @property
+    def cancelled(self):
+        return self._cancelled or (self.parent is not None and self.parent.cancelled)
+
+    @contextlib.contextmanager
+    def running(self, conn):
+        """Register `conn` as executing for the duration of a `with` block."""
+        with contextlib.ExitStack() as stack:
+            if self.parent is not None:
+                stack.enter_context(self.parent.running(conn))
+            with self._lock:
+                if self.cancelled:
+                    raise QueryCancelled("query cancelled")
+                self._active.add(conn)
+            try:
+                yield conn
+            finally:
+                with self._lock:
+                    self._active.discard(conn)
+
+    def add_rows(self, n):
+        self.rows += n
+        if self.parent is not None:
+            self.parent.add_rows(n)
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def busy(self):
+        return bool(self._active)
+
+    def cancel(self):
+        """Cancel every running statement; later ones are refused. Returns how
+        many were running."""
+        with self._lock:
+            self._cancelled = True
+            active = list(self._active)
+        for conn in active:
+            try:
+                cancel_connection(conn)
+            except Exception:
+                pass
+        return len(active)
+
+
+class QueryCancelled(Exception):
+    pass
+
+
+_current = contextvars.ContextVar("query_tracker", default=None)
+
+
+def current_tracker():
+    """Tracker of the question being answered in this context, or None."""
+    return _current.get()
+
+
+@contextlib.contextmanager
+def tracking(tracker):
+    """Make `tracker` the current one for the duration of a `with` block."""
+    token = _current.set(tracker)
+    try:
+        yield tracker
+    finally:
+        _current.reset(token)
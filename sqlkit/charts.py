@@ -0,0 +1,148 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+MAX_POINTS = int(os.getenv("CHART_MAX_POINTS", "1000"))
+TOP_N = int(os.getenv("CHART_TOP_N", "20"))
+
+
+# ---------- downsampling ----------
+
+def lttb(x, y, n_out):
+    """Largest-Triangle-Three-Buckets: keep the n_out points that best preserve
+    the visual shape of an ordered series. x and y are float arrays."""
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Average of the next bucket is the third triangle vertex
+        nlo, nhi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[nlo:nhi].mean() if nhi > nlo else x[-1]
+        avg_y = y[nlo:nhi].mean() if nhi > nlo else y[-1]
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+
+def minmax(y, n_out):
+    """Keep the min and max of each of n_out/2 equal buckets (spikes survive)."""
+    n = len(y)
+    if n_out >= n:
+        return np.arange(n)
+    buckets = max(n_out // 2, 1)
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)
+    keep = []
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        if hi <= lo:
+            continue
+        seg = y[lo:hi]
+        keep.extend(sorted({lo + int(np.argmin(seg)), lo + int(np.argmax(seg))}))
+    return np.asarray(keep, dtype=np.int64)
+
+
+def top_n_other(x, y, n):
+    """Sum y per category, keep the n largest and fold the rest into 'Other'."""
+    totals = pd.Series(y).groupby(pd.Series(x).astype(str), sort=False).sum()
+    if len(totals) <= n:
+        return totals.index.to_numpy(), totals.to_numpy()
+    totals = totals.sort_values(ascending=False)
+    head, rest = totals.iloc[:n - 1], totals.iloc[n - 1:]
+    labels = np.append(head.index.to_numpy(), f"Other ({len(rest)})")
+    return labels, np.append(head.to_numpy(), rest.sum())
+
+
+def prepare_series(x, y, chart_type="bar", max_points=None, top_n=None):
+    """Reduce x/y to at most a point budget before anything is drawn.
+
+    Categorical x (and every pie) -> top-N + "Other". Ordered x (numbers or
+    dates) -> LTTB for lines, min/max buckets for bars.
+    Returns (x_values, y_values, strategy).
+    """
+    max_points = max_points or MAX_POINTS
+    top_n = top_n or TOP_N
+    x = pd.Series(x).reset_index(drop=True)
+    y = pd.to_numeric(pd.Series(y).reset_index(drop=True), errors="coerce").astype("float64")
+    mask = y.notna().to_numpy()
+    x, y = x[mask].reset_index(drop=True), y[mask].to_numpy()
+
+    ordered = pd.api.types.is_numeric_dtype(x) or pd.api.types.is_datetime64_any_dtype(x)
+    if chart_type == "pie" or not ordered:
+        if chart_type != "pie" and len(x) <= min(top_n, max_points) and not x.duplicated().any():
+            return x.astype(str).to_numpy(), y, "raw"
+        labels, values = top_n_other(x.to_numpy(), y, min(top_n, max_points))
+        return labels, values, "top_n"
+
+    order = np.argsort(x.to_numpy(), kind="stable")
+    x, y = x.iloc[order].reset_index(drop=True), y[order]
+    if len(x) <= max_points:
+        return x.to_numpy(), y, "raw"
+    xf = x.astype("int64").to_numpy().astype("float64") if pd.api.types.is_datetime64_any_dtype(x) \
+        else x.to_numpy().astype("float64")
+    if chart_type == "line":
+        keep = lttb(xf, y, max_points)
+        strategy = "lttb"
+    else:
+        keep = minmax(y, max_points)
+        strategy = "minmax"
+    return x.to_numpy()[keep], y[keep], strategy
+
+
+# ---------- rendering ----------
+
+def _render(x, y, chart_type, title, xlabel, ylabel, filename):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    plt.figure(figsize=(10, 6))
+    labels = x if np.issubdtype(np.asarray(x).dtype, np.number) else np.asarray(x).astype(str)
+    if chart_type == "bar":
+        plt.bar(np.asarray(labels).astype(str), y)
+    elif chart_type == "line":
+        plt.plot(labels, y, marker="o" if len(y) <= 50 else None)
+    elif chart_type == "pie":
+        plt.pie(y, labels=np.asarray(labels).astype(str), autopct="%1.1f%%")
+    plt.title(title)
+    plt.xlabel(xlabel)
+    plt.ylabel(ylabel)
+    plt.xticks(rotation=45, ha="right")
+    plt.tight_layout()
+    plt.savefig(filename)
+    plt.close()
+    return filename
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=1)
+        return _executor
+
+
+def render_chart(x, y, chart_type, filename, title="", xlabel="", ylabel="",
+                 max_points=None, top_n=None):
+    """Downsample, then draw on the Agg backend in a worker process.
+
+    Returns (future, strategy); the future resolves to the saved filename, so
+    callers can go back to the prompt while the PNG is written.
+    """
+    xs, ys, strategy = prepare_series(x, y, chart_type, max_points, top_n)
+    if strategy != "raw":
+        title = f"{title} ({strategy}, {len(ys)} points)"
+    future = _get_executor().submit(_render, xs, ys, chart_type, title, xlabel, ylabel, filename)
+    return future, strategy
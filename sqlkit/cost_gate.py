@@ -0,0 +1,137 @@
+import json
+import os
+import re
+import time
+
+from sqlkit.backends import is_sqlite
+from sqlkit.sqltext import outer_limit, table_aliases, tokenize, tokenize_spans
+
+MAX_COST = float(os.getenv("QUERY_MAX_COST", "1000000"))
+MAX_ROWS = float(os.getenv("QUERY_MAX_ROWS", "1000000"))
+STATEMENT_TIMEOUT_MS = int(os.getenv("STATEMENT_TIMEOUT_MS", "30000"))
+DEFAULT_LIMIT = int(os.getenv("QUERY_DEFAULT_LIMIT", "100"))
+
+
+class CostGateError(Exception):
+    pass
+
+
+def has_limit(sql):
+    """True if the outermost statement already has LIMIT or FETCH FIRST."""
+    depth = 0
+    for kind, text in tokenize(sql):
+        if text == "(":
+            depth += 1
+        elif text == ")":
+            depth -= 1
+        elif depth == 0 and kind == "word" and text.upper() in ("LIMIT", "FETCH"):
+            return True
+    return False
+
+
+def ensure_limit(sql, limit=None):
+    """Wrap `sql` in an outer LIMIT when the generated query has none."""
+    # Cut after the last token: a trailing -- comment would swallow the
+    # closing parenthesis of the wrapper
+    tokens = [t for t in tokenize_spans(sql) if t[1] != ";"]
+    sql = sql[:tokens[-1][3]].strip() if tokens else ""
+    if has_limit(sql):
+        return sql
+    return f"SELECT * FROM ({sql}) AS limited_result LIMIT {int(limit or DEFAULT_LIMIT)}"
+
+
+def hit_limit(sql, row_count, limit=None):
+    """True when a LIMIT may have cut the result of `sql` short, so the rows
+    are not the whole answer: the one ensure_limit() adds, or the query's
+    own (the model is asked to write LIMIT 100 itself)."""
+    own = outer_limit(sql)
+    if own is not None:
+        return row_count >= own
+    return not has_limit(sql) and row_count >= int(limit or DEFAULT_LIMIT)
+
+
+def explain(cursor, sql):
+    """Planner estimate for `sql`: {"cost", "rows", "node"}. "rows" is the
+    estimate below an outer Limit, since the Limit caps it at the LIMIT."""
+    cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}")
+    plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    top = plan[0]["Plan"]
+    rows = top["Plan Rows"]
+    if top["Node Type"] == "Limit" and top.get("Plans"):
+        rows = top["Plans"][0]["Plan Rows"]
+    return {"cost": top["Total Cost"], "rows": rows, "node": top["Node Type"]}
+
+
+# SQLite has no planner costs; visited rows are scaled to roughly match
+# PostgreSQL's sequential-scan cost units so one QUERY_MAX_COST fits both
+SQLITE_COST_PER_ROW = 0.02
+
+
+def explain_sqlite(conn, sql):
+    """Rough estimate from EXPLAIN QUERY PLAN: full scans nest, so the rows
+    visited are the product of the scanned tables' sizes. As in explain(),
+    "rows" is not capped by the outer LIMIT."""
+    tables = {name.lower() for (name,) in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table'")}
+    aliases = table_aliases(sql, tables)
+    visited = 1
+    scans = []
+    for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall():
+        match = re.match(r"SCAN (?:TABLE )?(\w+)", row[-1])
+        if not match or "COVERING INDEX" in row[-1]:
+            continue
+        table = aliases.get(match.group(1).lower(), match.group(1).lower())
+        if table in tables:
+            (size,) = conn.execute(f'SELECT coalesce(max(rowid), 0) FROM "{table}"').fetchone()
+            visited *= max(size, 1)
+            scans.append(table)
+    return {"cost": visited * SQLITE_COST_PER_ROW, "rows": visited,
+            "node": "Scan " + " x ".join(scans) if scans else "Search"}
+
+
+def _set_timeout(conn, timeout_ms):
+    if is_sqlite(conn):
+        # Abort via a progress handler; the pool clears it on return
+        deadline = time.monotonic() + timeout_ms / 1000.0
+        conn.set_progress_handler(lambda: 1 if time.monotonic() > deadline else 0, 10000)
+        return
+    cur = conn.cursor()
+    try:
+        # SET LOCAL lasts until the pool rolls the connection back
+        cur.execute("SET LOCAL statement_timeout = %s", (int(timeout_ms),))
+    finally:
+        cur.close()
+
+
+def guard_query(conn, sql, confirm=None, max_cost=None, max_rows=None, timeout_ms=None, limit=None):
+    """Prepare generated SQL for execution on `conn`.
+
+    Adds an outer LIMIT if missing, sets a transaction-scoped
+    statement_timeout and checks the EXPLAIN estimate. Plans above
+    max_cost / max_rows raise CostGateError unless `confirm(plan)` returns
+    True. Returns the SQL to execute on the same connection.
+    """
+    max_cost = MAX_COST if max_cost is None else max_cost
+    max_rows = MAX_ROWS if max_rows is None else max_rows
+    timeout_ms = STATEMENT_TIMEOUT_MS if timeout_ms is None else timeout_ms
+
+    sql = ensure_limit(sql, limit)
+    _set_timeout(conn, timeout_ms)
+    if is_sqlite(conn):
+        plan = explain_sqlite(conn, sql)
+    else:
+        cur = conn.cursor()
+        try:
+            plan = explain(cur, sql)
+        finally:
+            cur.close()
+
+    if plan["cost"] > max_cost or plan["rows"] > max_rows:
+        if confirm is None or not confirm(plan):
+            raise CostGateError(
+                f"Estimated cost {plan['cost']:.0f} / rows {plan['rows']:.0f} "
+                f"exceeds the limit (cost {max_cost:.0f}, rows {max_rows:.0f})"
+            )
+    return sql
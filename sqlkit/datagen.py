@@ -0,0 +1,145 @@
+"""Create the ecommerce schema in SQLite and fill it with synthetic data.
+
+    python -m sqlkit.datagen --orders 100000 --path ecommerce.sqlite3 --seed 42
+
+Customers default to orders / 10 and products to 500. Rows are generated
+lazily and inserted with executemany in batches, one transaction per batch.
+
+Point the agents at it with DB_BACKEND=sqlite SQLITE_PATH=ecommerce.sqlite3.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import time
+from datetime import date, timedelta
+
+SCHEMA = """
+CREATE TABLE customers (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    email TEXT NOT NULL,
+    city TEXT,
+    state TEXT,
+    signup_date DATE
+);
+CREATE TABLE products (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    category TEXT,
+    price NUMERIC,
+    stock INTEGER
+);
+CREATE TABLE orders (
+    id INTEGER PRIMARY KEY,
+    customer_id INTEGER REFERENCES customers(id),
+    product_id INTEGER REFERENCES products(id),
+    quantity INTEGER,
+    total_amount NUMERIC,
+    order_date DATE,
+    status TEXT
+);
+"""
+
+CITIES = [
+    ("Los Angeles", "CA"), ("San Francisco", "CA"), ("San Diego", "CA"), ("Houston", "TX"),
+    ("Austin", "TX"), ("Dallas", "TX"), ("New York", "NY"), ("Buffalo", "NY"), ("Miami", "FL"),
+    ("Orlando", "FL"), ("Chicago", "IL"), ("Seattle", "WA"), ("Boston", "MA"), ("Denver", "CO"),
+    ("Phoenix", "AZ"), ("Atlanta", "GA"), ("Portland", "OR"), ("Detroit", "MI"),
+]
+CATEGORIES = ["Electronics", "Books", "Clothing", "Home", "Sports", "Toys", "Beauty", "Grocery"]
+FIRST = ["Alice", "Bob", "Carol", "David", "Eve", "Frank", "Grace", "Heidi", "Ivan", "Judy", "Mallory", "Oscar"]
+LAST = ["Smith", "Johnson", "Lee", "Brown", "Garcia", "Miller", "Davis", "Martinez", "Clark", "Lopez"]
+STATUSES = ["delivered"] * 6 + ["shipped"] * 2 + ["pending", "cancelled"]
+
+
+def customers(n, rng, start):
+    for i in range(1, n + 1):
+        first, last = rng.choice(FIRST), rng.choice(LAST)
+        city, state = rng.choice(CITIES)
+        yield (i, f"{first} {last}", f"{first.lower()}.{last.lower()}{i}@example.com", city, state,
+               (start + timedelta(days=rng.randrange(730))).isoformat())
+
+
+def products(n, rng):
+    for i in range(1, n + 1):
+        category = rng.choice(CATEGORIES)
+        yield (i, f"{category} item {i}", category, round(rng.uniform(2, 500), 2), rng.randrange(0, 1000))
+
+
+def orders(n, n_customers, prices, rng, start):
+    for i in range(1, n + 1):
+        product_id = rng.randrange(1, len(prices) + 1)
+        quantity = rng.randint(1, 5)
+        yield (i, rng.randint(1, n_customers), product_id, quantity,
+               round(prices[product_id - 1] * quantity, 2),
+               (start + timedelta(days=rng.randrange(1095))).isoformat(), rng.choice(STATUSES))
+
+
+def _batched(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def bulk_insert(conn, table, rows, batch_size):
+    count = 0
+    sql = None
+    for batch in _batched(rows, batch_size):
+        if sql is None:
+            sql = f"INSERT INTO {table} VALUES ({', '.join('?' * len(batch[0]))})"
+        with conn:  # one transaction per batch
+            conn.executemany(sql, batch)
+        count += len(batch)
+    return count
+
+
+def generate(path, n_orders=1000, n_customers=None, n_products=500, seed=42, batch_size=10000):
+    """(Re)create the database at `path`. Returns row counts per table."""
+    if os.path.exists(path):
+        os.remove(path)
+    rng = random.Random(seed)
+    n_customers = n_customers or max(n_orders // 10, 100)
+    start = date(2023, 1, 1)
+
+    conn = sqlite3.connect(path)
+    # Bulk-load settings: the file is rebuilt from scratch if anything fails
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.executescript(SCHEMA)
+
+    counts = {"customers": bulk_insert(conn, "customers", customers(n_customers, rng, start), batch_size)}
+    product_rows = list(products(n_products, rng))
+    counts["products"] = bulk_insert(conn, "products", product_rows, batch_size)
+    prices = [row[3] for row in product_rows]
+    counts["orders"] = bulk_insert(conn, "orders", orders(n_orders, n_customers, prices, rng, start), batch_size)
+
+    conn.execute("ANALYZE")
+    conn.commit()
+    conn.close()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate the SQLite ecommerce stand-in")
+    parser.add_argument("--path", default=os.getenv("SQLITE_PATH", "ecommerce.sqlite3"))
+    parser.add_argument("--orders", type=int, default=1000, help="1k .. 10M")
+    parser.add_argument("--customers", type=int, default=None)
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    counts = generate(args.path, args.orders, args.customers, args.products, args.seed, args.batch_size)
+    seconds = time.perf_counter() - start
+    print(f"{args.path}: {counts} in {seconds:.1f}s ({counts['orders'] / seconds:,.0f} orders/sec)")
+
+
+if __name__ == "__main__":
+    main()
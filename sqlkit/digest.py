@@ -0,0 +1,52 @@
+import os
+
+import pandas as pd
+
+from sqlkit.sqltext import estimate_tokens
+
+TOKEN_BUDGET = int(os.getenv("TOOL_RESULT_TOKENS", "800"))
+
+
+def column_stats(df):
+    """Per-column dtype, nulls, distinct count and min/max in one vectorized pass."""
+    stats = pd.DataFrame({
+        "dtype": df.dtypes.astype(str),
+        "nulls": df.isna().sum(),
+        "distinct": df.nunique(dropna=True),
+    })
+    ordered = df.select_dtypes(include=["number", "datetime", "datetimetz"])
+    if not ordered.empty:
+        bounds = ordered.agg(["min", "max"]).T
+        stats["min"] = bounds["min"]
+        stats["max"] = bounds["max"]
+    else:
+        stats["min"] = stats["max"] = None
+    return stats
+
+
+def digest_frame(df, token_budget=None, max_sample=5):
+    """Compact text summary of a result for a tool message.
+
+    Small results are returned whole. Otherwise: row count, column stats and
+    head/tail sample rows, with the sample shrunk until the text fits
+    `token_budget` (TOOL_RESULT_TOKENS). The full frame is not changed.
+    """
+    token_budget = token_budget or TOKEN_BUDGET
+    # Only render small frames whole; to_string() on a big one is the cost we avoid
+    full = f"Rows: {len(df)}\n\n{df.to_string()}" if len(df) <= 50 else None
+    if full is not None and estimate_tokens(full) <= token_budget:
+        return full
+
+    stats = column_stats(df).to_string()
+    header = f"Rows: {len(df)} (summary; full result kept locally for export/visualization)\n\nColumns:\n{stats}"
+    for n in range(max_sample, -1, -1):
+        if n == 0:
+            text = header
+        elif len(df) <= 2 * n:
+            text = f"{header}\n\nRows:\n{df.to_string()}"
+        else:
+            text = f"{header}\n\nFirst {n} rows:\n{df.head(n).to_string()}\n\nLast {n} rows:\n{df.tail(n).to_string()}"
+        if estimate_tokens(text) <= token_budget:
+            return text
+    # Even the stats table is over budget: cut it to size
+    return text[:token_budget * 4]
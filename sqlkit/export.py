@@ -0,0 +1,101 @@
+import csv
+import json
+import time
+
+from sqlkit.safety import check_sql
+from sqlkit.streaming import QueryStream
+
+
+def export_query(pool, sql, fmt, path, batch_size=None, prepare=None):
+    """Stream the result of `sql` straight into `path` without building a DataFrame.
+
+    csv     -> COPY (sql) TO STDOUT WITH CSV HEADER, written as it arrives
+    jsonl   -> one JSON object per line from a server-side cursor
+    parquet -> one row group per fetched batch (needs pyarrow)
+
+    `prepare(conn, sql)` runs on the exporting connection first and returns
+    the SQL to run, as for QueryStream; the agents pass guard_query so an
+    export gets the same timeout, cost gate and LIMIT as the rows shown.
+
+    Returns {"file", "rows", "seconds", "rows_per_sec"}.
+    """
+    ok, reason = check_sql(sql)
+    if not ok:
+        raise ValueError(f"Unsafe query: {reason}")
+    sql = sql.strip().rstrip(";")
+
+    start = time.perf_counter()
+    if fmt == "csv":
+        rows = _export_csv(pool, sql, path, batch_size, prepare)
+    elif fmt == "jsonl":
+        rows = _export_jsonl(pool, sql, path, batch_size, prepare)
+    elif fmt == "parquet":
+        rows = _export_parquet(pool, sql, path, batch_size, prepare)
+    else:
+        raise ValueError(f"Unknown export format: {fmt}")
+    seconds = time.perf_counter() - start
+
+    return {
+        "file": path,
+        "rows": rows,
+        "seconds": seconds,
+        "rows_per_sec": rows / seconds if seconds > 0 else float(rows),
+    }
+
+
+def _export_csv(pool, sql, path, batch_size, prepare):
+    with pool.connection() as conn:
+        cur = conn.cursor()
+        if hasattr(cur, "copy_expert"):
+            # Same transaction as the statement_timeout prepare() sets
+            copy_sql = prepare(conn, sql) if prepare is not None else sql
+            with open(path, "w", newline="", encoding="utf-8") as f:
+                cur.copy_expert(f"COPY ({copy_sql}) TO STDOUT WITH CSV HEADER", f)
+            rows = cur.rowcount
+            cur.close()
+            return rows
+        cur.close()
+
+    # Drivers without COPY support fall back to csv.writer over a stream
+    stream = QueryStream(pool, sql, batch_size=batch_size, prepare=prepare)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(stream.columns)
+        for batch in stream.batches():
+            writer.writerows(batch)
+    return stream.count
+
+
+def _export_jsonl(pool, sql, path, batch_size, prepare):
+    stream = QueryStream(pool, sql, batch_size=batch_size, prepare=prepare)
+    columns = stream.columns
+    with open(path, "w", encoding="utf-8") as f:
+        for batch in stream.batches():
+            f.write("".join(json.dumps(dict(zip(columns, row)), default=str) + "\n" for row in batch))
+    return stream.count
+
+
+def _export_parquet(pool, sql, path, batch_size, prepare):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    stream = QueryStream(pool, sql, batch_size=batch_size, prepare=prepare)
+    columns = stream.columns
+    writer = None
+    try:
+        for batch in stream.batches():
+            data = {name: list(values) for name, values in zip(columns, zip(*batch))}
+            if writer is None:
+                table = pa.Table.from_pydict(data)
+                writer = pq.ParquetWriter(path, table.schema)
+            else:
+                table = pa.Table.from_pydict(data, schema=writer.schema)
+            writer.write_table(table)
+        if writer is None:
+            # Empty result: still write a file with the column names
+            writer = pq.ParquetWriter(path, pa.schema([(c, pa.null()) for c in columns]))
+    finally:
+        stream.close()
+        if writer is not None:
+            writer.close()
+    return stream.count
@@ -0,0 +1,191 @@
+import re
+from decimal import Decimal
+
+import pandas as pd
+
+# Words a refinement may contain besides the parts we understand. Anything
+# else (a new column, table or condition) means the warehouse is needed.
+FILLER = {
+    "now", "show", "just", "only", "me", "the", "them", "those", "these", "it", "a", "an", "and",
+    "then", "please", "give", "list", "what", "are", "is", "of", "results", "result", "rows",
+    "records", "entries", "ones", "instead", "same", "but", "with", "sort", "sorted", "order",
+    "ordered", "rank", "ranked", "can", "you", "to", "keep", "return", "display", "filter",
+    "in", "for", "from", "where", "which", "that", "have", "has", "by", "limit", "get",
+}
+DESC_WORDS = {"desc", "descending", "highest", "largest", "biggest", "most", "top", "decreasing"}
+ASC_WORDS = {"asc", "ascending", "lowest", "smallest", "least", "bottom", "increasing"}
+
+_LIMIT_RE = re.compile(r"\b(top|first|bottom|last|highest|lowest|largest|smallest|biggest)\s+(\d+)\b"
+                       r"|\b(\d+)\s+(highest|lowest|largest|smallest|biggest)\b")
+_BY_RE = re.compile(r"\bby\s+([a-z][a-z0-9_]*(?:\s+[a-z][a-z0-9_]*)?)")
+_COMPARE_RE = re.compile(r"\b([a-z][a-z0-9_]*)\s*(>=|<=|>|<|=|over|above|more than|greater than|"
+                         r"under|below|less than|at least|at most)\s*\$?(-?[\d,]*\.?\d+)")
+_OPS = {">=": "ge", "at least": "ge", "<=": "le", "at most": "le", ">": "gt", "over": "gt", "above": "gt",
+        "more than": "gt", "greater than": "gt", "<": "lt", "under": "lt", "below": "lt", "less than": "lt",
+        "=": "eq"}
+
+
+def resolve_column(phrase, columns):
+    """Column of the frame a word or two in the question refers to, or None.
+
+    "total" -> "total_sales", "states" -> "state", "signup date" -> "signup_date".
+    """
+    phrase = phrase.strip().lower().replace(" ", "_")
+    candidates = [phrase, phrase.rstrip("s")]
+    lowered = {str(c).lower(): c for c in columns}
+    for word in candidates:
+        if word in lowered:
+            return lowered[word]
+    for word in candidates:
+        matches = [c for low, c in lowered.items() if word in low.split("_") or low.startswith(word)]
+        if len(matches) == 1:
+            return matches[0]
+    return None
+
+
+def as_number(series):
+    """Numeric view of a column (Decimal and numeric strings included), or None."""
+    if pd.api.types.is_numeric_dtype(series):
+        return series
+    sample = series.dropna().head(20)
+    if sample.empty or not all(isinstance(v, (int, float, Decimal)) for v in sample):
+        return None
+    return pd.to_numeric(series, errors="coerce")
+
+
+def _rank_column(df):
+    """Column "top N" ranks on when no "by" is given: the last numeric one
+    that isn't an id."""
+    for col in reversed(list(df.columns)):
+        low = str(col).lower()
+        if low == "id" or low.endswith("_id"):
+            continue
+        if as_number(df[col]) is not None:
+            return col
+    return None
+
+
+def parse_followup(question, df):
+    """Operations for a refinement of the previous result, or None when the
+    question needs anything the frame doesn't have."""
+    q = question.lower().strip().rstrip("?.!")
+    spans = []
+    ops = {"filters": [], "sort": None, "limit": None}
+    columns = list(df.columns)
+
+    for m in _LIMIT_RE.finditer(q):
+        word = m.group(1) or m.group(4)
+        ops["limit"] = (int(m.group(2) or m.group(3)), word)
+        spans.append(m.span())
+
+    for m in _COMPARE_RE.finditer(q):
+        col = resolve_column(m.group(1), columns)
+        if col is None or as_number(df[col]) is None:
+            return None
+        ops["filters"].append((col, _OPS[m.group(2)], float(m.group(3).replace(",", ""))))
+        spans.append(m.span())
+
+    for m in _BY_RE.finditer(q):
+        words = m.group(1).split()
+        # "by total descending": the second word may be a direction, not a column
+        for n in (len(words), 1):
+            col = resolve_column(" ".join(words[:n]), columns)
+            if col is not None:
+                ops["sort"] = col
+                spans.append((m.start(), m.start(1) + len(" ".join(words[:n]))))
+                break
+        else:
+            return None
+
+    # Category values of the frame named in the question ("only California")
+    for col in columns:
+        if not (df[col].dtype == object or pd.api.types.is_string_dtype(df[col])):
+            continue
+        values = df[col].dropna()
+        if values.empty or not all(isinstance(v, str) for v in values.head(20)):
+            continue
+        for value in values.unique():
+            if len(value) <= 3:
+                m = re.search(rf"(?<![A-Za-z0-9]){re.escape(value)}(?![A-Za-z0-9])", question)
+                found = m and (m.start(), m.end())
+            else:
+                m = re.search(rf"(?<![a-z0-9]){re.escape(value.lower())}(?![a-z0-9])", q)
+                found = m and m.span()
+            if found:
+                ops["filters"].append((col, "in", value))
+                spans.append(found)
+
+    if not (ops["filters"] or ops["sort"] or ops["limit"]):
+        return None
+
+    rest = q
+    for start, end in sorted(spans, reverse=True):
+        rest = rest[:start] + " " + rest[end:]
+    for word in re.findall(r"[a-z0-9_']+", rest):
+        if word not in FILLER and word not in DESC_WORDS and word not in ASC_WORDS:
+            return None
+
+    words = set(re.findall(r"[a-z]+", q))
+    if words & DESC_WORDS - {"top"}:
+        ops["descending"] = True
+    elif words & ASC_WORDS - {"bottom"}:
+        ops["descending"] = False
+    else:
+        ops["descending"] = None
+    return ops
+
+
+def apply_followup(df, ops):
+    """Apply parsed operations to the frame with vectorized pandas calls."""
+    out = df
+    in_values = {}
+    for col, op, value in ops["filters"]:
+        if op == "in":
+            in_values.setdefault(col, []).append(value)
+        else:
+            out = out[getattr(as_number(out[col]), op)(value)]
+    for col, values in in_values.items():
+        out = out[out[col].isin(values)]
+
+    limit = ops["limit"]
+    sort_col = ops["sort"]
+    descending = ops["descending"]
+    if limit is not None:
+        n, word = limit
+        if sort_col is None and word not in ("first", "last"):
+            sort_col = _rank_column(out)
+        if descending is None:
+            descending = word not in ("bottom", "lowest", "smallest")
+    if sort_col is not None:
+        key = as_number(out[sort_col])
+        order = (key if key is not None else out[sort_col]).sort_values(
+            ascending=not descending, kind="stable").index
+        out = out.loc[order]
+    if limit is not None:
+        n, word = limit
+        out = out.tail(n) if word == "last" else out.head(n)
+    return out.reset_index(drop=True)
+
+
+def describe_ops(ops):
+    parts = []
+    for col, op, value in ops["filters"]:
+        parts.append(f"{col} {op} {value}")
+    if ops["sort"]:
+        parts.append(f"sort by {ops['sort']}{' desc' if ops['descending'] else ''}")
+    if ops["limit"]:
+        parts.append(f"{ops['limit'][1]} {ops['limit'][0]}")
+    return ", ".join(parts)
+
+
+def answer_followup(question, df, truncated=False):
+    """(refined frame, description) when the question only narrows, sorts or
+    limits the previous result `df`; None when it has to go back to the
+    database. A `truncated` result (cut off by a LIMIT) always goes
+    back: filtering or ranking only the rows that were fetched would be wrong."""
+    if df is None or df.empty or truncated:
+        return None
+    ops = parse_followup(question, df)
+    if ops is None:
+        return None
+    return apply_followup(df, ops), describe_ops(ops)
@@ -0,0 +1,325 @@
+"""Offline index advisor driven by the workload log (sqlkit/workload.py).
+
+Parses every logged statement shape for equality/range predicates, join keys
+and ORDER BY / GROUP BY columns, weighs them by how often the shape ran and
+how long it took, and proposes CREATE INDEX statements. Each proposal is
+validated on a scratch copy of the SQLite stand-in: the index is created
+and every logged statement on that table is EXPLAINed before and after.
+Proposals that don't clearly lower the estimated cost of at least one
+statement, or that make another one (or, with --time, the measured
+runtime) worse, are reported as skipped.
+
+    python -m sqlkit.index_advisor --log workload.sqlite3 --db ecommerce.sqlite3 --time
+"""
+import argparse
+import math
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from sqlkit.backends import connect_sqlite
+from sqlkit.sqltext import outer_limit, referenced_tables, table_aliases, tokenize
+
+ROLE_WEIGHTS = {"eq": 1.0, "join": 1.0, "range": 0.7, "sort": 0.4, "group": 0.4}
+MIN_GAIN = float(os.getenv("INDEX_MIN_GAIN", "0.1"))  # required drop in estimated cost
+
+_CLAUSES = {"WHERE": "filter", "ON": "filter", "HAVING": "filter", "ORDER": "sort", "GROUP": "group",
+            "SELECT": None, "FROM": None, "JOIN": None, "LIMIT": None, "OFFSET": None, "UNION": None}
+_RANGE_OPS = {"<", ">", "<=", ">=", "BETWEEN"}
+_EQ_OPS = {"=", "IN"}
+_AGGREGATES = {"COUNT", "SUM", "AVG", "MIN", "MAX"}
+
+
+def read_schema(conn):
+    """{table: [columns]} and {table: [leading columns of each index]} of a SQLite database."""
+    tables, indexes = {}, {}
+    for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"):
+        info = conn.execute(f'PRAGMA table_info("{name}")').fetchall()
+        tables[name.lower()] = [row[1].lower() for row in info]
+        # INTEGER PRIMARY KEY is the rowid: already an index
+        indexes[name.lower()] = [tuple(row[1].lower() for row in info if row[5])]
+        for idx in conn.execute(f'PRAGMA index_list("{name}")').fetchall():
+            cols = [row[2].lower() for row in conn.execute(f'PRAGMA index_info("{idx[1]}")') if row[2]]
+            indexes[name.lower()].append(tuple(cols))
+    return tables, indexes
+
+
+def column_uses(sql, tables):
+    """[(table, column, role)] for the columns a statement filters, joins,
+    sorts or groups on. role is eq, join, range, sort or group."""
+    tokens = tokenize(sql)
+    in_query = [t for t in referenced_tables(sql) if t in tables]
+    aliases = table_aliases(sql, set(tables))
+    aliases.update({t: t for t in in_query})
+
+    def resolve(i):
+        """(table, column, next index) for a column reference at token i, or None."""
+        kind, text = tokens[i]
+        if kind != "word":
+            return None
+        if i + 2 < len(tokens) and tokens[i + 1][1] == "." and tokens[i + 2][0] == "word":
+            table = aliases.get(text.lower())
+            column = tokens[i + 2][1].lower()
+            if table and column in tables[table]:
+                return table, column, i + 3
+            return None
+        if i > 0 and tokens[i - 1][1] == ".":
+            return None
+        owners = [t for t in in_query if text.lower() in tables[t]]
+        if len(owners) == 1:
+            return owners[0], text.lower(), i + 1
+        return None
+
+    uses = []
+    clause = None
+    i = 0
+    while i < len(tokens):
+        kind, text = tokens[i]
+        upper = text.upper() if kind == "word" else text
+        if kind == "word" and upper in _CLAUSES:
+            clause = _CLAUSES[upper]
+            i += 1
+            continue
+        ref = resolve(i) if clause else None
+        if ref is None:
+            i += 1
+            continue
+        table, column, end = ref
+        # Wrapped in a function (date_trunc(..., order_date)): not usable by a plain index
+        wrapped = i > 0 and tokens[i - 1][1] in ("(", ",") and clause != "filter"
+        if clause in ("sort", "group"):
+            if not wrapped:
+                uses.append((table, column, clause))
+        else:
+            op = tokens[end][1].upper() if end < len(tokens) else ""
+            before = tokens[i - 1][1].upper() if i > 0 else ""
+            other = resolve(end + 1) if op == "=" and end + 1 < len(tokens) else None
+            if other is not None:
+                uses.append((table, column, "join"))
+                uses.append((other[0], other[1], "join"))
+                end = other[2]
+            elif op in _EQ_OPS or before == "=":
+                uses.append((table, column, "eq"))
+            elif op in _RANGE_OPS or before in _RANGE_OPS:
+                uses.append((table, column, "range"))
+        i = end
+    return uses
+
+
+def candidates(statements, tables, indexes):
+    """{(table, columns): {"score", "shapes"}} from [(sql, runs, avg_ms)].
+
+    Single columns for each use, plus (equality column, range/sort column)
+    pairs used together. Candidates already covered by the leading columns
+    of an existing index are skipped.
+    """
+    found = {}
+    for sql, runs, avg_ms in statements:
+        weight = runs * max(avg_ms or 0, 1.0)
+        uses = column_uses(sql, tables)
+        keys = {}
+        for table, column, role in uses:
+            key = (table, (column,))
+            keys[key] = max(keys.get(key, 0), ROLE_WEIGHTS[role])
+        for table in {u[0] for u in uses}:
+            eq = [c for t, c, r in uses if t == table and r in ("eq", "join")]
+            tail = [c for t, c, r in uses if t == table and r in ("range", "sort")]
+            if eq and tail and eq[0] != tail[0]:
+                keys[(table, (eq[0], tail[0]))] = 1.2
+        for key, role_weight in keys.items():
+            table, cols = key
+            if any(existing[:len(cols)] == cols for existing in indexes.get(table, [])):
+                continue
+            entry = found.setdefault(key, {"score": 0.0, "shapes": []})
+            entry["score"] += weight * role_weight
+            entry["shapes"].append(sql)
+    return found
+
+
+def index_name(table, cols):
+    return f"idx_{table}_{'_'.join(cols)}"
+
+
+def create_index_sql(table, cols):
+    return f"CREATE INDEX {index_name(table, cols)} ON {table} ({', '.join(cols)})"
+
+
+# ---------- validation on the SQLite stand-in ----------
+
+def _stat_rows(conn, index):
+    """Average rows per key prefix for an index, from sqlite_stat1."""
+    row = conn.execute("SELECT stat FROM sqlite_stat1 WHERE idx = ?", (index,)).fetchone()
+    return [int(n) for n in row[0].split()[:8] if n.isdigit()] if row else []
+
+
+def _table_rows(conn, table):
+    return conn.execute(f'SELECT coalesce(max(rowid), 0) FROM "{table}"').fetchone()[0] or 1
+
+
+def estimate_cost(conn, sql, tables):
+    """Rows visited according to EXPLAIN QUERY PLAN and sqlite_stat1: full
+    scans cost the table size, index searches the average rows per key,
+    loop levels multiply, and temp B-trees (sorts) add a pass over the rows."""
+    aliases = table_aliases(sql, set(tables))
+    visited, sorts = 1.0, 0
+    for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall():
+        detail = row[-1]
+        if detail.startswith("USE TEMP B-TREE"):
+            sorts += 1
+            continue
+        match = re.match(r"(SCAN|SEARCH) (?:TABLE )?(\w+)", detail)
+        if not match:
+            continue
+        table = aliases.get(match.group(2).lower(), match.group(2).lower())
+        if table not in tables:
+            continue
+        size = _table_rows(conn, table)
+        if match.group(1) == "SCAN":
+            visited *= size
+            continue
+        if "PRIMARY KEY" in detail:
+            continue
+        index = re.search(r"INDEX (\w+)", detail)
+        conds = re.search(r"\((.*)\)", detail)
+        terms = conds.group(1).split(" AND ") if conds else []
+        n_eq = sum(1 for t in terms if t.endswith("=?"))
+        stats = _stat_rows(conn, index.group(1)) if index else []
+        rows = stats[n_eq] if 0 < n_eq < len(stats) else size
+        if len(terms) > n_eq:
+            rows = rows / 4.0  # SQLite's own guess for a range
+        visited *= max(rows, 1.0)
+
+    upper = sql.upper()
+    limit = outer_limit(sql)
+    aggregated = "GROUP BY" in upper or any(f"{a}(" in upper.replace(" (", "(") for a in _AGGREGATES)
+    if limit is not None and not sorts and not aggregated:
+        # Rows come out in order, so the scan stops at the limit
+        visited = min(visited, float(limit))
+    return visited + sorts * visited * math.log2(max(visited, 2)) / 10
+
+
+def _time_query(conn, sql, repeats=3):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        conn.execute(sql).fetchall()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def validate(db_path, proposals, tables, timing=False):
+    """EXPLAIN every statement of each proposal before and after creating its
+    index on a scratch copy of the database. Adds "cost_before", "cost_after",
+    the best and worst per-statement cost reduction ("gain", "worst"),
+    "skipped" [(sql, error)] for statements SQLite can't run and, with
+    timing=True, "ms_before"/"ms_after"."""
+    scratch = os.path.join(tempfile.mkdtemp(prefix="index_advisor_"), "scratch.sqlite3")
+    shutil.copyfile(db_path, scratch)
+    # connect_sqlite adds the functions the generated SQL uses (date_trunc, now)
+    conn = connect_sqlite(scratch, read_only=False)
+    try:
+        for proposal in proposals:
+            # Logged SQL is PostgreSQL; statements the stand-in can't run are skipped
+            statements, before, ms_before, proposal["skipped"] = [], [], [], []
+            for sql in proposal["shapes"]:
+                try:
+                    cost = estimate_cost(conn, sql, tables)
+                    ms = _time_query(conn, sql) if timing else None
+                except sqlite3.Error as e:
+                    proposal["skipped"].append((sql, str(e)))
+                    continue
+                statements.append(sql)
+                before.append(cost)
+                ms_before.append(ms)
+            if not statements:
+                proposal.update(cost_before=0.0, cost_after=0.0, gain=0.0, worst=0.0)
+                continue
+            name = index_name(proposal["table"], proposal["columns"])
+            conn.execute(create_index_sql(proposal["table"], proposal["columns"]))
+            conn.execute(f"ANALYZE {name}")
+            after = [estimate_cost(conn, sql, tables) for sql in statements]
+            ms_after = [_time_query(conn, sql) for sql in statements] if timing else None
+            conn.execute(f"DROP INDEX {name}")
+
+            proposal["cost_before"], proposal["cost_after"] = sum(before), sum(after)
+            # Per statement: the index must clearly help one and not hurt the others
+            gains = [1 - a / b if b else 0.0 for b, a in zip(before, after)]
+            proposal["gain"], proposal["worst"] = max(gains), min(gains)
+            if timing:
+                proposal["ms_before"] = sum(ms_before) * 1000
+                proposal["ms_after"] = sum(ms_after) * 1000
+    finally:
+        conn.close()
+        shutil.rmtree(os.path.dirname(scratch), ignore_errors=True)
+    return proposals
+
+
+def read_workload(log_path, since=None):
+    """[(example sql, runs, avg db ms)] per statement shape in the workload log."""
+    db = sqlite3.connect(log_path)
+    try:
+        return db.execute("""
+            SELECT MIN(sql), COUNT(*), AVG(db_ms) FROM queries
+            WHERE shape IS NOT NULL AND error IS NULL AND ts >= ?
+            GROUP BY shape_hash
+        """, (since or 0,)).fetchall()
+    finally:
+        db.close()
+
+
+def advise(log_path, db_path, top=10, timing=False, since=None):
+    """Validated index proposals, best first."""
+    conn = sqlite3.connect(db_path)
+    try:
+        tables, indexes = read_schema(conn)
+    finally:
+        conn.close()
+    found = candidates(read_workload(log_path, since), tables, indexes)
+    ranked = sorted(found.items(), key=lambda kv: -kv[1]["score"])[:top]
+    proposals = [{"table": table, "columns": cols, "score": entry["score"], "shapes": entry["shapes"],
+                  "sql": create_index_sql(table, cols)} for (table, cols), entry in ranked]
+    validate(db_path, proposals, tables, timing=timing)
+    for proposal in proposals:
+        proposal["accepted"] = (proposal["gain"] >= MIN_GAIN and proposal["worst"] > -MIN_GAIN
+                                and ("ms_before" not in proposal
+                                     or proposal["ms_after"] <= proposal["ms_before"] * (1 + MIN_GAIN)))
+    return sorted(proposals, key=lambda p: (not p["accepted"], -p["score"] * p["gain"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Propose indexes from the workload log")
+    parser.add_argument("--log", default=os.getenv("WORKLOAD_LOG", "workload.sqlite3"))
+    parser.add_argument("--db", default=os.getenv("SQLITE_PATH", "ecommerce.sqlite3"),
+                        help="SQLite stand-in used to validate proposals (not modified)")
+    parser.add_argument("--top", type=int, default=10, help="candidates to validate")
+    parser.add_argument("--hours", type=float, default=None, help="only the last N hours of the log")
+    parser.add_argument("--time", action="store_true", help="also time each statement before/after")
+    args = parser.parse_args()
+
+    since = time.time() - args.hours * 3600 if args.hours else None
+    proposals = advise(args.log, args.db, args.top, args.time, since)
+    if not proposals:
+        print("No candidate columns in the workload.")
+        return
+
+    for p in proposals:
+        verdict = "PROPOSE" if p["accepted"] else "skip   "
+        timing = f", {p['ms_before']:.0f} -> {p['ms_after']:.0f} ms" if "ms_before" in p else ""
+        print(f"{verdict} {p['sql']};")
+        print(f"        score {p['score']:.0f}, {len(p['shapes']) - len(p['skipped'])} statement(s), "
+              f"est. rows {p['cost_before']:.0f} -> {p['cost_after']:.0f} "
+              f"(best {p['gain']:.0%}, worst {p['worst']:.0%}){timing}")
+
+    skipped = {sql: error for p in proposals for sql, error in p["skipped"]}
+    if skipped:
+        print(f"\nSkipped {len(skipped)} statement(s) the SQLite stand-in can't run:")
+        for sql, error in skipped.items():
+            print(f"  {error}: {' '.join(sql.split())[:90]}")
+
+
+if __name__ == "__main__":
+    main()
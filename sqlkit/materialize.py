@@ -0,0 +1,591 @@
+"""Summary tables for hot aggregate queries.
+
+Repeated GROUP BY statements from the workload log (sqlkit/workload.py) are
+materialized into summary tables: mv_<hash> in the SQLite stand-in, or the
+sqlkit_mv schema on PostgreSQL, so neither shows up in the schema the model
+sees. Generated SQL whose body (everything before the top-level ORDER BY /
+LIMIT) matches a summary is rewritten to read from it while the summary is
+younger than its staleness bound; a stale summary is refreshed in the
+background and the base tables are queried meanwhile.
+
+Summaries whose aggregates are all SUM / COUNT / MIN / MAX, with every
+other column a GROUP BY key, are refreshed incrementally: only fact-table rows with an id above the stored watermark
+are aggregated and merged in. Updates to old rows are picked up by a full
+refresh every MATERIALIZE_FULL_REFRESH seconds. Bodies relative to the
+current time (now(), CURRENT_DATE) always refresh in full, since rows that
+leave the window are never merged out.
+
+    python -m sqlkit.materialize discover --log workload.sqlite3 --min-runs 3
+    python -m sqlkit.materialize refresh
+    python -m sqlkit.materialize list
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+from sqlkit.backends import backend_name, connect_factory, connect_sqlite, is_sqlite, sqlite_path
+from sqlkit.result_cache import db_namespace
+from sqlkit.schema import SUMMARY_PREFIX
+from sqlkit.sqltext import canonicalize, is_volatile, referenced_tables, table_aliases, tokenize_spans
+
+SUMMARY_SCHEMA = "sqlkit_mv"
+STALENESS = float(os.getenv("MATERIALIZE_STALENESS", "300"))
+FULL_REFRESH = float(os.getenv("MATERIALIZE_FULL_REFRESH", str(24 * 3600)))
+MIN_RUNS = int(os.getenv("MATERIALIZE_MIN_RUNS", "3"))
+RELOAD_INTERVAL = 30.0
+
+# How each aggregate's partial results combine
+_MERGEABLE = {"SUM": "sum", "COUNT": "sum", "MIN": "min", "MAX": "max"}
+
+# Aggregates whose partial results can't be combined (AVG, STDDEV, ...)
+_AGGREGATES = {
+    "AVG", "STDDEV", "STDDEV_POP", "STDDEV_SAMP", "VARIANCE", "VAR_POP", "VAR_SAMP", "STRING_AGG",
+    "ARRAY_AGG", "JSON_AGG", "JSONB_AGG", "JSON_OBJECT_AGG", "JSONB_OBJECT_AGG", "GROUP_CONCAT",
+    "BOOL_AND", "BOOL_OR", "EVERY", "BIT_AND", "BIT_OR", "MODE", "PERCENTILE_CONT", "PERCENTILE_DISC",
+    "CORR", "COVAR_POP", "COVAR_SAMP", "REGR_SLOPE", "REGR_INTERCEPT", "REGR_R2", "REGR_COUNT", "TOTAL",
+}
+_TAIL_WORDS = {"ORDER", "BY", "ASC", "DESC", "NULLS", "FIRST", "LAST", "LIMIT", "OFFSET"}
+
+
+# ---------- SQL shape ----------
+
+def split_tail(sql):
+    """(body, tail): the top-level ORDER BY / LIMIT / OFFSET part split off."""
+    sql = sql.strip().rstrip(";").strip()
+    depth = 0
+    for kind, text, start, _ in tokenize_spans(sql):
+        if text == "(":
+            depth += 1
+        elif text == ")":
+            depth -= 1
+        elif depth == 0 and kind == "word" and text.upper() in ("ORDER", "LIMIT", "OFFSET"):
+            return sql[:start].strip(), sql[start:].strip()
+    return sql, ""
+
+
+def _top_level(sql):
+    """Tokens of `sql` at parenthesis depth 0, as (kind, TEXT, start, end)."""
+    depth, out = 0, []
+    for kind, text, start, end in tokenize_spans(sql):
+        if text == ")":
+            depth -= 1
+        if depth == 0:
+            out.append((kind, text.upper() if kind == "word" else text, start, end))
+        if text == "(":
+            depth += 1
+    return out
+
+
+def select_items(body):
+    """Top-level expressions of the SELECT list."""
+    tokens = _top_level(body)
+    words = [t[1] for t in tokens]
+    if not words or words[0] != "SELECT" or "FROM" not in words:
+        return []
+    start = tokens[0][3]
+    end = tokens[words.index("FROM")][2]
+    items, last = [], start
+    for kind, text, s, e in tokens[1:words.index("FROM")]:
+        if text == ",":
+            items.append(body[last:s].strip())
+            last = e
+    items.append(body[last:end].strip())
+    return items
+
+
+def aggregate_kind(item):
+    """"sum"/"min"/"max" if the item is a single mergeable aggregate call
+    (COUNT merges as a sum), otherwise None."""
+    tokens = _top_level(item)
+    if len(tokens) < 2 or tokens[0][1] not in _MERGEABLE or tokens[1][1] != "(":
+        return None
+    if "DISTINCT" in item.upper().split("(", 1)[1].split():
+        return None
+    # Only the call and an optional alias: SUM(x) [AS] total
+    rest = [t[1] for t in tokens[3:]] if len(tokens) > 2 and tokens[2][1] == ")" else None
+    if rest is None or len(rest) > 2 or (len(rest) == 2 and rest[0] != "AS"):
+        return None
+    return _MERGEABLE[tokens[0][1]]
+
+
+def group_keys(body):
+    """Top-level expressions of the GROUP BY clause, canonicalized."""
+    tokens = _top_level(body)
+    words = [t[1] for t in tokens]
+    if "GROUP" not in words:
+        return []
+    i = words.index("GROUP") + 2
+    ends = [j for j, w in enumerate(words) if j >= i and w in ("HAVING", "WINDOW", "ORDER", "LIMIT", "OFFSET", "FETCH")]
+    end = tokens[ends[0]][2] if ends else len(body)
+    keys, last = [], tokens[i - 1][3]
+    for kind, text, s, e in tokens[i:ends[0] if ends else len(tokens)]:
+        if text == ",":
+            keys.append(canonicalize(body[last:s]))
+            last = e
+    keys.append(canonicalize(body[last:end]))
+    return keys
+
+
+def _split_alias(item):
+    """(expression, alias or None) for one SELECT item."""
+    tokens = _top_level(item)
+    if len(tokens) > 2 and tokens[-2][1] == "AS":
+        return item[:tokens[-2][2]].strip(), tokens[-1][1]
+    if (len(tokens) > 1 and tokens[-1][0] == "word" and tokens[-1][1] != "END"
+            and (tokens[-2][0] in ("word", "qident", "number", "string") or tokens[-2][1] == ")")):
+        return item[:tokens[-1][2]].strip(), tokens[-1][1]
+    return item, None
+
+
+def _calls_aggregate(item):
+    tokens = tokenize_spans(item)
+    return any(kind == "word" and text.upper() in _AGGREGATES and i + 1 < len(tokens) and tokens[i + 1][1] == "("
+               for i, (kind, text, _, _) in enumerate(tokens))
+
+
+def is_aggregate(body):
+    words = [t[1] for t in _top_level(body)]
+    return "GROUP" in words and "UNION" not in words
+
+
+def add_predicate(body, predicate):
+    """`body` with `predicate` ANDed into its top-level WHERE."""
+    tokens = _top_level(body)
+    words = [t[1] for t in tokens]
+    ends = [tokens[i][2] for i, w in enumerate(words) if w in ("GROUP", "HAVING", "WINDOW")]
+    end = ends[0] if ends else len(body)
+    if "WHERE" in words:
+        where = tokens[words.index("WHERE")]
+        return f"{body[:where[3]]} ({predicate}) AND ({body[where[3]:end].strip()}) {body[end:]}".strip()
+    return f"{body[:end].rstrip()} WHERE {predicate} {body[end:]}".strip()
+
+
+def merge_kinds(body):
+    """Merge kind (or None for a group key) per output column when new fact
+    rows can be aggregated on their own and merged in, else None."""
+    words = [t[1] for t in _top_level(body)]
+    if "HAVING" in words or "DISTINCT" in words:
+        return None
+    # A window relative to now() drops old rows over time; merging never would
+    if is_volatile(body):
+        return None
+    items = select_items(body)
+    merge = [aggregate_kind(item) for item in items]
+    if not any(merge):
+        return None
+    keys = group_keys(body)
+    for position, (item, kind) in enumerate(zip(items, merge), 1):
+        if _calls_aggregate(item):
+            return None
+        if kind is not None:
+            continue
+        # Anything else must be a group key (by expression, alias or position),
+        # or merging would add rows instead of updating them
+        expr, alias = _split_alias(item)
+        if not ({canonicalize(expr), alias, str(position)} & set(keys)):
+            return None
+    return merge
+
+
+def incremental_plan(body, tables):
+    """{"merge": merge_kinds(body), "fact", "alias"} when the summary can be
+    refreshed from new fact rows only, else None. `tables` maps table ->
+    (columns, estimated rows)."""
+    merge = merge_kinds(body)
+    if merge is None:
+        return None
+    facts = [t for t in referenced_tables(body) if t in tables and "id" in tables[t][0]]
+    if not facts:
+        return None
+    fact = max(facts, key=lambda t: tables[t][1] or 0)
+    aliases = {table: alias for alias, table in table_aliases(body, set(tables)).items()}
+    return {"merge": merge, "fact": fact, "alias": aliases.get(fact, fact)}
+
+
+# ---------- summaries ----------
+
+class Materializer:
+    """Registry and maintenance of summary tables for one database.
+
+    The registry (which summaries exist, their watermark and refresh times)
+    is a local SQLite file shared by the agents and the CLI, with rows keyed
+    by database (result_cache.db_namespace); agents reload it every
+    RELOAD_INTERVAL seconds.
+    """
+
+    def __init__(self, db_config, path="materialized.sqlite3", staleness=None):
+        self.db_config = db_config
+        self.staleness = STALENESS if staleness is None else staleness
+        self.sqlite = backend_name(db_config) == "sqlite"
+        self.database = db_namespace(db_config)
+        self.hits = 0
+        self.stale = 0
+        self._views = {}
+        self._loaded_at = 0.0
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS summaries (
+                database TEXT NOT NULL,
+                name TEXT NOT NULL,
+                key TEXT NOT NULL,
+                body TEXT NOT NULL,
+                plan TEXT,
+                watermark INTEGER,
+                refreshed_at REAL,
+                full_refreshed_at REAL,
+                max_staleness REAL,
+                rows INTEGER,
+                PRIMARY KEY (database, name),
+                UNIQUE (database, key)
+            );
+        """)
+        self._db.commit()
+
+    # ----- registry -----
+
+    def _load(self, force=False):
+        if not force and time.monotonic() - self._loaded_at < RELOAD_INTERVAL:
+            return
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT name, key, body, plan, watermark, refreshed_at, full_refreshed_at, max_staleness, rows "
+                "FROM summaries WHERE database = ?", (self.database,)).fetchall()
+        views = {}
+        for name, key, body, plan, watermark, refreshed, full, max_staleness, count in rows:
+            plan = json.loads(plan) if plan else None
+            # Plans saved before a merge rule tightened fall back to full refreshes
+            if plan is not None and plan["merge"] != merge_kinds(body):
+                plan = None
+            views[key] = {"name": name, "key": key, "body": body, "plan": plan,
+                          "watermark": watermark, "refreshed_at": refreshed, "full_refreshed_at": full,
+                          "max_staleness": max_staleness, "rows": count}
+        self._views = views
+        self._loaded_at = time.monotonic()
+
+    def _save(self, view):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO summaries (database, name, key, body, plan, watermark, refreshed_at, "
+                "full_refreshed_at, max_staleness, rows) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (self.database, view["name"], view["key"], view["body"], json.dumps(view["plan"]) if view["plan"] else None,
+                 view["watermark"], view["refreshed_at"], view["full_refreshed_at"],
+                 view["max_staleness"], view["rows"]))
+            self._db.commit()
+        self._views[view["key"]] = view
+
+    def views(self):
+        self._load(force=True)
+        return list(self._views.values())
+
+    def table(self, view):
+        return view["name"] if self.sqlite else f"{SUMMARY_SCHEMA}.{view['name']}"
+
+    # ----- database side -----
+
+    def _connect(self):
+        """Writable connection (the pooled ones are read-only on SQLite)."""
+        if self.sqlite:
+            conn = connect_sqlite(sqlite_path(self.db_config), read_only=False)
+            conn.isolation_level = None  # explicit BEGIN / COMMIT below
+            return conn
+        return connect_factory(self.db_config)()
+
+    def _begin(self, conn):
+        cur = conn.cursor()
+        if is_sqlite(conn):
+            cur.execute("BEGIN IMMEDIATE")
+        else:
+            # One snapshot for the watermark and the aggregate
+            cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+            cur.execute(f"CREATE SCHEMA IF NOT EXISTS {SUMMARY_SCHEMA}")
+        return cur
+
+    def _commit(self, conn):
+        if is_sqlite(conn):
+            conn.execute("COMMIT")
+        else:
+            conn.commit()
+
+    def _rollback(self, conn):
+        if not is_sqlite(conn):
+            conn.rollback()
+        elif conn.in_transaction:
+            conn.execute("ROLLBACK")
+
+    def _catalog(self, conn):
+        from sqlkit.schema import read_catalog
+        columns, estimates = read_catalog(conn)
+        tables = {}
+        for table, column, _ in columns:
+            tables.setdefault(table.lower(), ([], estimates.get(table)))[0].append(column.lower())
+        return tables
+
+    def create(self, sql, max_staleness=None):
+        """Materialize the body of an aggregate statement; returns the view."""
+        body, _ = split_tail(sql)
+        if not is_aggregate(body):
+            raise ValueError("only GROUP BY statements are materialized")
+        key = canonicalize(body)
+        self._load(force=True)
+        if key in self._views:
+            return self._views[key]
+        conn = self._connect()
+        try:
+            plan = incremental_plan(body, self._catalog(conn))
+        finally:
+            conn.close()
+        view = {"name": SUMMARY_PREFIX + hashlib.md5(key.encode("utf-8")).hexdigest()[:12], "key": key,
+                "body": body, "plan": plan, "watermark": None, "refreshed_at": None,
+                "full_refreshed_at": None, "max_staleness": max_staleness, "rows": None}
+        self.refresh(view, full=True)
+        return view
+
+    def drop(self, name):
+        self._load(force=True)
+        for view in list(self._views.values()):
+            if view["name"] == name:
+                conn = self._connect()
+                try:
+                    cur = self._begin(conn)
+                    cur.execute(f"DROP TABLE IF EXISTS {self.table(view)}")
+                    self._commit(conn)
+                finally:
+                    conn.close()
+                with self._lock:
+                    self._db.execute("DELETE FROM summaries WHERE database = ? AND name = ?", (self.database, name))
+                    self._db.commit()
+                del self._views[view["key"]]
+                return True
+        return False
+
+    def refresh(self, view, full=False):
+        """Bring a summary up to date. Incremental when the view allows it and
+        a full refresh isn't due; returns {"mode", "rows", "seconds"}."""
+        start = time.perf_counter()
+        plan = view["plan"]
+        due = view["full_refreshed_at"] is None or time.time() - view["full_refreshed_at"] > FULL_REFRESH
+        incremental = plan is not None and not full and not due and view["watermark"] is not None
+        conn = self._connect()
+        try:
+            cur = self._begin(conn)
+            watermark = None
+            if plan is not None:
+                cur.execute(f"SELECT max(id) FROM {plan['fact']}")
+                watermark = cur.fetchone()[0]
+            if incremental:
+                mode, rows = "incremental", self._merge_delta(cur, view, watermark)
+            else:
+                mode, rows = "full", self._rebuild(cur, view)
+            self._commit(conn)
+        except Exception:
+            self._rollback(conn)
+            raise
+        finally:
+            conn.close()
+
+        now = time.time()
+        view.update(watermark=watermark, refreshed_at=now, rows=rows)
+        if mode == "full":
+            view["full_refreshed_at"] = now
+        self._save(view)
+        return {"mode": mode, "rows": rows, "seconds": time.perf_counter() - start}
+
+    def _rebuild(self, cur, view):
+        table = self.table(view)
+        scratch = f"{table}_new"
+        cur.execute(f"DROP TABLE IF EXISTS {scratch}")
+        cur.execute(f"CREATE TABLE {scratch} AS {view['body']}")
+        cur.execute(f"DROP TABLE IF EXISTS {table}")
+        cur.execute(f"ALTER TABLE {scratch} RENAME TO {view['name']}")
+        cur.execute(f"SELECT COUNT(*) FROM {table}")
+        return cur.fetchone()[0]
+
+    def _merge_delta(self, cur, view, watermark):
+        """Aggregate fact rows above the stored watermark and merge them into
+        the summary with one vectorized groupby."""
+        plan = view["plan"]
+        table = self.table(view)
+        if watermark is None or watermark <= view["watermark"]:
+            cur.execute(f"SELECT COUNT(*) FROM {table}")
+            return cur.fetchone()[0]
+        # Integer ids inlined: with driver parameters psycopg2 would also
+        # read any literal % in the body (LIKE 'a%') as a placeholder
+        delta_sql = add_predicate(view["body"], f"{plan['alias']}.id > {int(view['watermark'])} "
+                                                f"AND {plan['alias']}.id <= {int(watermark)}")
+        cur.execute(delta_sql)
+        columns = [d[0] for d in cur.description]
+        delta = pd.DataFrame(cur.fetchall(), columns=columns)
+        cur.execute(f"SELECT * FROM {table}")
+        current = pd.DataFrame(cur.fetchall(), columns=columns)
+
+        keys = [c for c, kind in zip(columns, plan["merge"]) if kind is None]
+        aggs = {c: kind for c, kind in zip(columns, plan["merge"]) if kind is not None}
+        merged = pd.concat([current, delta], ignore_index=True)
+        merged = merged.groupby(keys, dropna=False, sort=False).agg(aggs).reset_index()[columns]
+        rows = merged.astype(object).where(merged.notna(), None).values.tolist()
+
+        cur.execute(f"DELETE FROM {table}")
+        mark = "?" if self.sqlite else "%s"
+        cur.executemany(f"INSERT INTO {table} VALUES ({', '.join([mark] * len(columns))})", rows)
+        return len(rows)
+
+    def refresh_due(self, full=False):
+        """Refresh every summary past its staleness bound (or all with full=True)."""
+        results = {}
+        for view in self.views():
+            if full or self._age(view) > self._bound(view):
+                results[view["name"]] = self.refresh(view, full=full)
+        return results
+
+    def discover(self, log_path, min_runs=None, max_staleness=None):
+        """Materialize every aggregate body that ran at least `min_runs`
+        times in the workload log. Returns the views created."""
+        db = sqlite3.connect(log_path)
+        try:
+            statements = db.execute(
+                "SELECT sql, COUNT(*) FROM queries WHERE sql IS NOT NULL AND error IS NULL GROUP BY sql"
+            ).fetchall()
+        finally:
+            db.close()
+        counts, examples = {}, {}
+        for sql, runs in statements:
+            body, _ = split_tail(sql)
+            if not is_aggregate(body):
+                continue
+            key = canonicalize(body)
+            counts[key] = counts.get(key, 0) + runs
+            examples.setdefault(key, body)
+        self._load(force=True)
+        created = []
+        for key, runs in sorted(counts.items(), key=lambda kv: -kv[1]):
+            if runs >= (min_runs or MIN_RUNS) and key not in self._views:
+                created.append(self.create(examples[key], max_staleness))
+        return created
+
+    # ----- query side -----
+
+    def _bound(self, view):
+        return view["max_staleness"] if view["max_staleness"] is not None else self.staleness
+
+    def _age(self, view):
+        return time.time() - (view["refreshed_at"] or 0)
+
+    def rewrite(self, sql):
+        """SQL to run for `sql`: a read of a fresh summary table when one
+        matches, otherwise `sql` unchanged."""
+        self._load()
+        if not self._views:
+            return sql
+        body, tail = split_tail(sql)
+        view = self._views.get(canonicalize(body))
+        if view is None:
+            return sql
+        if self._age(view) > self._bound(view):
+            self.stale += 1
+            self._refresh_in_background(view)
+            return sql
+        # The tail may only name output columns (ORDER BY total_sales DESC LIMIT 5)
+        columns = {item.split()[-1].split(".")[-1].strip('"').lower() for item in select_items(body)}
+        for kind, text, _, _ in tokenize_spans(tail):
+            if kind == "word" and text.upper() not in _TAIL_WORDS and text.lower() not in columns:
+                return sql
+            if kind in ("op", "qident") and text != "," and text.strip('"').lower() not in columns:
+                return sql
+        self.hits += 1
+        return f"SELECT * FROM {self.table(view)} {tail}".strip()
+
+    def _refresh_in_background(self, view):
+        with self._lock:
+            if view["name"] in self._refreshing:
+                return
+            self._refreshing.add(view["name"])
+
+        def run():
+            try:
+                self.refresh(view)
+            except Exception as e:
+                print(f"Refreshing {view['name']} failed: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(view["name"])
+
+        threading.Thread(target=run, name=f"refresh-{view['name']}", daemon=True).start()
+
+    def stats(self):
+        self._load()
+        return {"views": len(self._views), "hits": self.hits, "stale": self.stale}
+
+
+_materializers = {}
+_materializers_lock = threading.Lock()
+
+
+def get_materializer(db_config):
+    """Shared Materializer for a connection config, or None when
+    MATERIALIZE_PATH is set to an empty string."""
+    path = os.getenv("MATERIALIZE_PATH", "materialized.sqlite3")
+    if not path:
+        return None
+    key = (path, tuple(sorted((k, str(v)) for k, v in db_config.items())))
+    with _materializers_lock:
+        if key not in _materializers:
+            _materializers[key] = Materializer(db_config, path)
+        return _materializers[key]
+
+
+def rewrite_materialized(db_config, sql):
+    """sql rewritten onto a summary table when one matches (never raises)."""
+    try:
+        materializer = get_materializer(db_config)
+        return materializer.rewrite(sql) if materializer else sql
+    except Exception:
+        return sql
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summary tables for hot aggregate queries")
+    parser.add_argument("command", choices=["discover", "create", "refresh", "list", "drop"])
+    parser.add_argument("arg", nargs="?", help="SQL for create, summary name for drop")
+    parser.add_argument("--log", default=os.getenv("WORKLOAD_LOG", "workload.sqlite3"))
+    parser.add_argument("--min-runs", type=int, default=None)
+    parser.add_argument("--staleness", type=float, default=None, help="max age in seconds for new summaries")
+    parser.add_argument("--full", action="store_true", help="refresh: rebuild every summary")
+    args = parser.parse_args()
+
+    # Same connection settings as the agents
+    db_config = {"host": os.getenv("DB_HOST"), "port": os.getenv("DB_PORT"), "database": os.getenv("DB_NAME"),
+                 "user": os.getenv("DB_USER"), "password": os.getenv("DB_PASSWORD")}
+    materializer = get_materializer(db_config)
+    if materializer is None:
+        parser.error("MATERIALIZE_PATH is empty")
+
+    if args.command == "discover":
+        for view in materializer.discover(args.log, args.min_runs, args.staleness):
+            mode = "incremental" if view["plan"] else "full"
+            print(f"{view['name']}: {view['rows']} rows, {mode} refresh  <- {view['body'][:80]}")
+    elif args.command == "create":
+        view = materializer.create(args.arg, args.staleness)
+        print(f"{view['name']}: {view['rows']} rows")
+    elif args.command == "refresh":
+        for name, result in materializer.refresh_due(full=args.full).items():
+            print(f"{name}: {result['mode']}, {result['rows']} rows, {result['seconds'] * 1000:.0f} ms")
+    elif args.command == "drop":
+        print("dropped" if materializer.drop(args.arg) else "no such summary")
+    else:
+        for view in materializer.views():
+            age = time.time() - (view["refreshed_at"] or 0)
+            mode = "incremental" if view["plan"] else "full"
+            print(f"{view['name']}  {view['rows']} rows  age {age:.0f}s  {mode}  watermark {view['watermark']}"
+                  f"\n    {view['body'][:100]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlkit.sqltext import estimate_tokens
+
+TOKEN_BUDGET = int(os.getenv("MEMORY_TOKENS", "2000"))
+KEEP_TURNS = int(os.getenv("MEMORY_KEEP_TURNS", "4"))
+
+SUMMARY_PROMPT = (
+    "Summarize this conversation between a user and a text-to-SQL assistant in a few sentences. "
+    "Keep the filters, tables and entities the user cares about so follow-up questions still make sense."
+)
+
+
+def result_note(sql, result):
+    """'SQL -> N rows' (or the error line) instead of the full tool payload."""
+    text = str(result)
+    match = re.search(r"Rows: (\d+)|returned (\d+) rows", text)
+    if match:
+        outcome = f"{match.group(1) or match.group(2)} rows"
+    else:
+        outcome = text.strip().splitlines()[0][:120] if text.strip() else "no output"
+    return f"{' '.join(sql.split())} -> {outcome}"
+
+
+class ConversationMemory:
+    """Token-bounded chat memory for the agents.
+
+    The last `keep_turns` turns are kept verbatim (question, answer and a
+    one-line note per SQL run). Older turns are folded into a rolling summary
+    by `summarize(previous_summary, turns_text)` on a background thread, so
+    the next question never waits for it.
+    """
+
+    def __init__(self, summarize=None, token_budget=None, keep_turns=None):
+        self.summarize = summarize
+        self.token_budget = token_budget or TOKEN_BUDGET
+        self.keep_turns = keep_turns or KEEP_TURNS
+        self.summary = ""
+        self.turns = []  # {"question", "answer", "notes"}
+        self.prompt_tokens = []  # estimated size of each prompt sent
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory")
+        self._folding = False
+
+    def add_turn(self, question, answer, notes=()):
+        with self._lock:
+            self.turns.append({"question": question, "answer": answer, "notes": list(notes)})
+            self._maybe_fold()
+
+    def messages(self, question=None):
+        """Messages to send: summary, recent turns (newest kept first when over
+        budget) and optionally the new question."""
+        with self._lock:
+            summary, turns = self.summary, list(self.turns)
+
+        head = [{"role": "system", "content": f"Summary of the earlier conversation: {summary}"}] if summary else []
+        tail = [{"role": "user", "content": question}] if question else []
+        used = sum(estimate_tokens(m["content"]) for m in head + tail)
+
+        body = []
+        for turn in reversed(turns):
+            pair = turn_messages(turn)
+            size = sum(estimate_tokens(m["content"]) for m in pair)
+            if body and used + size > self.token_budget:
+                break
+            body = pair + body
+            used += size
+        return head + body + tail
+
+    def record_prompt(self, messages):
+        tokens = sum(estimate_tokens(str(m.get("content") if isinstance(m, dict) else m.content)) for m in messages)
+        self.prompt_tokens.append(tokens)
+        return tokens
+
+    def clear(self):
+        with self._lock:
+            self.summary = ""
+            self.turns = []
+            self.prompt_tokens = []
+
+    # ---------- summarization ----------
+
+    def _maybe_fold(self):
+        if self._folding or len(self.turns) <= self.keep_turns:
+            return
+        fold = self.turns[:len(self.turns) - self.keep_turns]
+        self._folding = True
+        self._executor.submit(self._fold, self.summary, fold)
+
+    def _fold(self, previous, turns):
+        text = "\n".join(turn_text(t) for t in turns)
+        try:
+            summary = self.summarize(previous, text) if self.summarize else None
+        except Exception:
+            summary = None
+        if not summary:
+            # No model (or it failed): keep the questions, trimmed
+            summary = (previous + " " + " | ".join(t["question"] for t in turns)).strip()[-self.token_budget:]
+        with self._lock:
+            # Turns are only ever appended, so the folded ones are still at the front
+            if self.turns[:len(turns)] == turns:
+                self.turns = self.turns[len(turns):]
+                self.summary = summary
+            self._folding = False
+            self._maybe_fold()
+
+
+def turn_messages(turn):
+    answer = turn["answer"]
+    if turn["notes"]:
+        answer = f"{answer}\n[SQL run: {'; '.join(turn['notes'])}]"
+    return [{"role": "user", "content": turn["question"]}, {"role": "assistant", "content": answer}]
+
+
+def turn_text(turn):
+    return "\n".join(f"{m['role']}: {m['content']}" for m in turn_messages(turn))
+
+
+def llm_summarizer(llm):
+    """summarize() callable backed by a LangChain chat model."""
+    def summarize(previous, turns_text):
+        content = f"Previous summary: {previous}\n\n{turns_text}" if previous else turns_text
+        response = llm.invoke([
+            {"role": "system", "content": SUMMARY_PROMPT},
+            {"role": "user", "content": content},
+        ])
+        text = response.content if isinstance(response.content, str) else response.content[0].get("text")
+        return text.strip()
+    return summarize
@@ -0,0 +1,216 @@
+import atexit
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from sqlkit.backends import backend_name, connect_factory, sqlite_path
+
+
+class PoolError(Exception):
+    pass
+
+
+class ConnectionPool:
+    """Thread-safe pool of DB-API connections.
+
+    Connections are created by `connect` (a zero-argument callable), checked
+    for health on checkout and rolled back / reset when they are returned.
+    """
+
+    def __init__(self, connect, min_size=1, max_size=5, timeout=10.0, check_after=30.0):
+        if min_size > max_size:
+            raise ValueError("min_size cannot be larger than max_size")
+        self.connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        # Idle connections younger than this are trusted without a ping
+        self.check_after = check_after
+
+        self._idle = deque()  # (conn, last_used)
+        self._in_use = set()
+        self._connecting = 0
+        self._cond = threading.Condition()
+        self._filled = False
+        self._closed = False
+
+    # ---------- checkout / return ----------
+
+    def getconn(self):
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            if self._closed:
+                raise PoolError("Pool is closed")
+            if not self._filled:
+                self._fill()
+
+            while True:
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    self._in_use.add(conn)
+                    break
+                if self._size() < self.max_size:
+                    conn, last_used = None, None
+                    # Reserve the slot, then connect outside the lock
+                    self._connecting += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolError(f"No connection available after {self.timeout}s")
+                self._cond.wait(remaining)
+
+        if conn is None:
+            try:
+                conn = self.connect()
+            except Exception:
+                with self._cond:
+                    self._connecting -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._connecting -= 1
+                self._in_use.add(conn)
+            return conn
+
+        if not self._is_healthy(conn, last_used):
+            self._discard(conn)
+            return self.getconn()
+        return conn
+
+    def putconn(self, conn, discard=False):
+        if not discard:
+            try:
+                reset_session(conn)
+            except Exception:
+                discard = True
+
+        with self._cond:
+            self._in_use.discard(conn)
+            if discard or self._closed:
+                _close_quietly(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """Check out a connection for the duration of a `with` block."""
+        conn = self.getconn()
+        broken = False
+        try:
+            yield conn
+        except Exception:
+            broken = bool(getattr(conn, "closed", False))
+            raise
+        finally:
+            self.putconn(conn, discard=broken)
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.pop()
+                _close_quietly(conn)
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {"idle": len(self._idle), "in_use": len(self._in_use), "max_size": self.max_size}
+
+    # ---------- internals ----------
+
+    def _size(self):
+        return len(self._idle) + len(self._in_use) + self._connecting
+
+    def _fill(self):
+        self._filled = True
+        while self._size() < self.min_size:
+            try:
+                self._idle.append((self.connect(), time.monotonic()))
+            except Exception:
+                # Report the failure on the checkout that actually needs it
+                break
+
+    def _is_healthy(self, conn, last_used):
+        if getattr(conn, "closed", False):
+            return False
+        if time.monotonic() - last_used < self.check_after:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.fetchall()
+            cur.close()
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, conn):
+        with self._cond:
+            self._in_use.discard(conn)
+            self._cond.notify()
+        _close_quietly(conn)
+
+
+def reset_session(conn):
+    """Drop any open transaction and session settings left by the last user."""
+    if getattr(conn, "closed", False):
+        raise PoolError("Connection is closed")
+    conn.rollback()
+    if hasattr(conn, "reset"):
+        # RESET ALL rather than conn.reset(), which runs DISCARD ALL and would
+        # drop the template statements in conn.prepared (sqlkit.templates).
+        # check_sql rejects temp tables, LISTEN, advisory locks and PREPARE,
+        # so settings are the only other state a borrower can leave behind
+        cur = conn.cursor()
+        cur.execute("RESET ALL")
+        cur.close()
+        conn.commit()
+    # SQLite statement timeouts are progress handlers (see cost_gate)
+    if hasattr(conn, "set_progress_handler"):
+        conn.set_progress_handler(None, 0)
+
+
+def _close_quietly(conn):
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+# ---------- shared pools ----------
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_config, min_size=None, max_size=None):
+    """Return the process-wide pool for a connection config.
+
+    The backend (PostgreSQL or the SQLite stand-in) is chosen by
+    sqlkit.backends. Size defaults come from DB_POOL_MIN / DB_POOL_MAX.
+    """
+    backend = backend_name(db_config)
+    if backend == "sqlite":
+        key = ("sqlite", os.path.abspath(sqlite_path(db_config)))
+    else:
+        key = tuple(sorted((k, str(v)) for k, v in db_config.items()))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(
+                connect_factory(db_config),
+                min_size=min_size if min_size is not None else int(os.getenv("DB_POOL_MIN", "1")),
+                max_size=max_size if max_size is not None else int(os.getenv("DB_POOL_MAX", "5")),
+            )
+            _pools[key] = pool
+        return pool
+
+
+@atexit.register
+def _close_pools():
+    for pool in list(_pools.values()):
+        pool.closeall()
@@ -0,0 +1,288 @@
+import hashlib
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from sqlkit.backends import backend_name, sqlite_path
+from sqlkit.sqltext import canonicalize, referenced_tables
+
+
+def parse_table_ttls(spec):
+    """'orders=30,customers=300' -> {'orders': 30.0, 'customers': 300.0}"""
+    ttls = {}
+    for item in (spec or "").split(","):
+        if "=" in item:
+            name, seconds = item.split("=", 1)
+            ttls[name.strip().lower()] = float(seconds)
+    return ttls
+
+
+def db_namespace(db_config):
+    """Identify a database so results from different servers never mix."""
+    if backend_name(db_config) == "sqlite":
+        return "sqlite:" + os.path.abspath(sqlite_path(db_config))
+    return "{}:{}/{}".format(db_config.get("host"), db_config.get("port") or 5432, db_config.get("database"))
+
+
+class ResultCache:
+    """LRU cache of query results keyed by canonical SQL.
+
+    Values are (columns, rows) pickled once on insert; memory use is the sum
+    of the pickled sizes and is kept under `max_bytes`. The TTL of an entry is
+    the smallest TTL of the tables it reads (`table_ttls`, else
+    `default_ttl`). With `spill_dir` set, entries are also written to disk so
+    they survive memory eviction and are shared between processes.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, default_ttl=60.0, table_ttls=None,
+                 spill_dir=None, max_entry_bytes=None, max_disk_bytes=512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes or max_bytes // 4
+        self.default_ttl = default_ttl
+        self.table_ttls = table_ttls or {}
+        self.spill_dir = spill_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.hits = 0
+        self.misses = 0
+        self.bytes = 0
+        self._entries = OrderedDict()  # key -> (expires_at, payload)
+        self._lock = threading.Lock()
+        self._disk_bytes = 0
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+            self._disk_bytes = sum(e.stat().st_size for e in os.scandir(spill_dir) if e.name.endswith(".pkl"))
+
+    # ---------- public API ----------
+
+    def get(self, sql, namespace=""):
+        """Return (columns, rows) for a cached query, or None."""
+        key = self.key(sql, namespace)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return pickle.loads(entry[1])
+                self._drop(key)
+
+        entry = self._read_disk(key, now)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._store(key, *entry)
+        return pickle.loads(entry[1])
+
+    def put(self, sql, columns, rows, namespace=""):
+        payload = pickle.dumps((list(columns), list(rows)), protocol=pickle.HIGHEST_PROTOCOL)
+        if len(payload) > self.max_entry_bytes:
+            return False
+        key = self.key(sql, namespace)
+        tables = tuple(referenced_tables(sql))
+        expires_at = time.time() + self._ttl(tables)
+        with self._lock:
+            self._store(key, expires_at, payload, tables)
+        self._write_disk(key, expires_at, payload)
+        return True
+
+    def ttl_for(self, sql):
+        return self._ttl(referenced_tables(sql))
+
+    def _ttl(self, tables):
+        ttls = [self.table_ttls[t] for t in tables if t in self.table_ttls]
+        return min(ttls) if ttls else self.default_ttl
+
+    def invalidate(self, table=None):
+        """Drop everything, or only entries whose SQL reads `table`."""
+        with self._lock:
+            if table is None:
+                for key in list(self._entries):
+                    self._drop(key)
+            else:
+                for key in [k for k, v in self._entries.items() if table.lower() in v[2]]:
+                    self._drop(key)
+        if self.spill_dir and table is None:
+            for e in os.scandir(self.spill_dir):
+                if e.name.endswith(".pkl"):
+                    self._remove_file(e.path)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "disk_bytes": self._disk_bytes,
+            }
+
+    @staticmethod
+    def key(sql, namespace=""):
+        return hashlib.sha256(f"{namespace}\x1f{canonicalize(sql)}".encode("utf-8")).hexdigest()
+
+    # ---------- memory tier ----------
+
+    def _store(self, key, expires_at, payload, tables=None):
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (expires_at, payload, tables or ())
+        self.bytes += len(payload)
+        while self.bytes > self.max_bytes and self._entries:
+            self._drop(next(iter(self._entries)))
+
+    def _drop(self, key):
+        entry = self._entries.pop(key)
+        self.bytes -= len(entry[1])
+
+    # ---------- disk tier ----------
+
+    def _path(self, key):
+        return os.path.join(self.spill_dir, f"{key}.pkl")
+
+    def _write_disk(self, key, expires_at, payload):
+        if not self.spill_dir:
+            return
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(expires_at.hex().encode("ascii") + b"\n")
+                f.write(payload)
+            os.replace(tmp, path)
+            with self._lock:
+                self._disk_bytes += os.path.getsize(path)
+        except OSError:
+            return
+        if self._disk_bytes > self.max_disk_bytes:
+            self._trim_disk()
+
+    def _read_disk(self, key, now):
+        if not self.spill_dir:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                expires_at = float.fromhex(f.readline().decode("ascii"))
+                payload = f.read()
+        except (OSError, ValueError):
+            return None
+        if expires_at <= now:
+            self._remove_file(path)
+            return None
+        return expires_at, payload
+
+    def _remove_file(self, path):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            self._disk_bytes -= size
+
+    def _trim_disk(self):
+        files = sorted(
+            (e for e in os.scandir(self.spill_dir) if e.name.endswith(".pkl")),
+            key=lambda e: e.stat().st_mtime,
+        )
+        for e in files:
+            if self._disk_bytes <= self.max_disk_bytes * 0.9:
+                break
+            self._remove_file(e.path)
+
+
+class RowSet:
+    """In-memory rows with the same interface as streaming.QueryStream."""
+
+    def __init__(self, columns, rows, batch_size=1000):
+        self.columns = list(columns)
+        self.rows = rows
+        self.batch_size = batch_size
+        self.count = 0
+
+    def batches(self):
+        for start in range(0, len(self.rows), self.batch_size):
+            batch = self.rows[start:start + self.batch_size]
+            self.count += len(batch)
+            yield batch
+
+    def __iter__(self):
+        for batch in self.batches():
+            yield from batch
+
+    def dicts(self):
+        for row in self:
+            yield dict(zip(self.columns, row))
+
+    def close(self):
+        pass
+
+
+class CachingStream:
+    """Pass-through wrapper around a QueryStream that caches the rows once the
+    stream has been fully read, as long as they stay under the entry limit."""
+
+    def __init__(self, cache, sql, stream, namespace=""):
+        self.cache = cache
+        self.sql = sql
+        self.stream = stream
+        self.namespace = namespace
+        self.columns = stream.columns
+        self.kinds = getattr(stream, "kinds", None)
+
+    @property
+    def count(self):
+        return self.stream.count
+
+    def batches(self):
+        kept = []
+        kept_bytes = 0
+        for batch in self.stream.batches():
+            if kept is not None:
+                kept.extend(batch)
+                kept_bytes += len(pickle.dumps(batch, protocol=pickle.HIGHEST_PROTOCOL))
+                if kept_bytes > self.cache.max_entry_bytes:
+                    kept = None
+            yield batch
+        if kept is not None:
+            self.cache.put(self.sql, self.columns, kept, namespace=self.namespace)
+
+    def __iter__(self):
+        for batch in self.batches():
+            yield from batch
+
+    def dicts(self):
+        for row in self:
+            yield dict(zip(self.columns, row))
+
+    def close(self):
+        self.stream.close()
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def get_result_cache():
+    """Process-wide result cache configured from the environment:
+
+    RESULT_CACHE_MB, RESULT_CACHE_TTL, RESULT_CACHE_TABLE_TTLS ('orders=30,...')
+    and RESULT_CACHE_DIR (enables the disk tier).
+    """
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = ResultCache(
+                max_bytes=int(float(os.getenv("RESULT_CACHE_MB", "64")) * 1024 * 1024),
+                default_ttl=float(os.getenv("RESULT_CACHE_TTL", "60")),
+                table_ttls=parse_table_ttls(os.getenv("RESULT_CACHE_TABLE_TTLS", "")),
+                spill_dir=os.getenv("RESULT_CACHE_DIR") or None,
+            )
+        return _shared
@@ -0,0 +1,86 @@
+from functools import lru_cache
+
+from sqlkit.sqltext import tokenize
+
+# Writes that can hide inside a read-only statement (data-modifying WITH,
+# SELECT ... INTO, FOR UPDATE): rejected anywhere
+FORBIDDEN_KEYWORDS = {"INSERT", "UPDATE", "DELETE", "MERGE", "UPSERT", "INTO"}
+
+# Statements that write, lock or change session/server state. They can only
+# start a statement, so they are rejected there (first word, or a WITH body)
+# and columns like comment, owner or load stay usable elsewhere
+FORBIDDEN_STATEMENTS = {
+    "DROP", "ALTER", "TRUNCATE", "CREATE", "GRANT", "REVOKE", "EXEC", "EXECUTE", "CALL", "DO",
+    "COPY", "LOCK", "VACUUM", "REINDEX", "CLUSTER", "REFRESH", "COMMENT", "SET", "RESET",
+    "PREPARE", "DEALLOCATE", "LISTEN", "NOTIFY", "UNLISTEN", "LOAD", "IMPORT", "SECURITY", "OWNER",
+}
+
+# Functions with side effects or file/network access
+FORBIDDEN_FUNCTIONS = {
+    "PG_SLEEP", "PG_SLEEP_FOR", "PG_SLEEP_UNTIL", "PG_TERMINATE_BACKEND", "PG_CANCEL_BACKEND",
+    "PG_RELOAD_CONF", "PG_ROTATE_LOGFILE", "PG_READ_FILE", "PG_READ_BINARY_FILE", "PG_LS_DIR",
+    "PG_STAT_FILE", "LO_IMPORT", "LO_EXPORT", "LO_UNLINK", "DBLINK", "DBLINK_EXEC", "SET_CONFIG",
+    "PG_ADVISORY_LOCK", "PG_ADVISORY_XACT_LOCK", "NEXTVAL", "SETVAL", "TXID_CURRENT",
+}
+
+READ_ONLY_STARTS = {"SELECT", "WITH", "VALUES", "TABLE"}
+
+# Row-locking clauses: FOR UPDATE / NO KEY UPDATE / SHARE / KEY SHARE
+LOCKING_WORDS = {"UPDATE", "SHARE", "NO", "KEY"}
+
+
+@lru_cache(maxsize=4096)
+def check_sql(sql):
+    """Validate that `sql` is a single read-only statement.
+
+    Returns (ok, reason). Strings, comments and quoted identifiers are never
+    inspected, and words used as qualified names (t.update) or aliases
+    (AS delete) don't count as keywords, so columns like updated_at pass.
+    Statement keywords (COMMENT, OWNER, ...) only count where a statement
+    starts. Function calls are checked with or without a schema prefix
+    (pg_catalog.pg_sleep), quoted or not.
+    """
+    tokens = tokenize(sql)
+    while tokens and tokens[-1][1] == ";":
+        tokens.pop()
+    if not tokens:
+        return False, "Empty query"
+
+    first = next((text.upper() for kind, text in tokens if text != "("), "")
+    if first in FORBIDDEN_STATEMENTS:
+        return False, f"Forbidden keyword: {first}"
+    if first not in READ_ONLY_STARTS:
+        return False, "Only SELECT queries (optionally with WITH) are allowed"
+
+    prev = ""
+    for i, (kind, text) in enumerate(tokens):
+        if kind == "op" and text == ";":
+            return False, "Multiple statements are not allowed"
+        nxt = tokens[i + 1][1] if i + 1 < len(tokens) else ""
+        if kind in ("word", "qident") and nxt == "(":
+            # Only the schema part of schema.func( is a plain name; quoted
+            # names resolve to func only when spelled in lower case
+            name = text.upper() if kind == "word" else text[1:-1]
+            if kind == "qident" and name != name.lower():
+                name = ""
+            if name.upper() in FORBIDDEN_FUNCTIONS:
+                return False, f"Forbidden function: {name.lower()}"
+        if kind == "word":
+            upper = text.upper()
+            is_name = prev == "." or nxt == "." or prev == "AS"
+            if not is_name:
+                if upper in FORBIDDEN_KEYWORDS:
+                    return False, f"Forbidden keyword: {upper}"
+                # WITH x AS (<statement>)
+                if upper in FORBIDDEN_STATEMENTS and prev == "(" and i > 1 and tokens[i - 2][1].upper() == "AS":
+                    return False, f"Forbidden keyword: {upper}"
+                if upper == "FOR" and nxt.upper() in LOCKING_WORDS:
+                    return False, "Row locking (FOR UPDATE/SHARE) is not allowed"
+            prev = upper
+        else:
+            prev = text
+    return True, ""
+
+
+def is_safe_query(sql):
+    return check_sql(sql)[0]
@@ -0,0 +1,373 @@
+"""Saved queries with incremental refresh.
+
+A saved query keeps its last result. When one of its output columns is a
+monotonic watermark over the fact table (order_date, a date_trunc() of it,
+or the id itself), a refresh only fetches rows at or above the stored
+high-water mark and merges them into the previous result: rows below the
+mark are kept, rows at or above it are replaced by the delta. Refresh cost
+then follows the new data instead of the whole history.
+
+The watermark column must be part of every row (a plain column or a GROUP
+BY key), so each output row depends on one watermark value only. Changes to
+older rows, or to joined dimension tables, are picked up by a full refresh
+every SAVED_QUERY_FULL_REFRESH seconds. Queries relative to the current
+time (now(), CURRENT_DATE) always run in full.
+
+    python -m sqlkit.saved_queries save daily_revenue "SELECT order_date, SUM(total_amount) ..."
+    python -m sqlkit.saved_queries refresh            # every saved query (cron)
+    python -m sqlkit.saved_queries show daily_revenue
+"""
+import argparse
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from datetime import date, datetime
+
+import pandas as pd
+
+from sqlkit.backends import is_sqlite
+from sqlkit.cost_gate import STATEMENT_TIMEOUT_MS, _set_timeout
+from sqlkit.materialize import _top_level, add_predicate, select_items, split_tail
+from sqlkit.pool import get_pool
+from sqlkit.safety import check_sql
+from sqlkit.sqltext import is_volatile, referenced_tables, table_aliases, tokenize, tokenize_spans
+
+FULL_REFRESH = float(os.getenv("SAVED_QUERY_FULL_REFRESH", str(24 * 3600)))
+MONOTONIC_SAMPLE = 1000  # newest fact rows checked when detecting a watermark
+
+# Functions that keep a column's order (date_trunc('month', order_date))
+_ORDER_PRESERVING = {"DATE", "DATETIME", "DATE_TRUNC", "STRFTIME", "CAST"}
+_TYPE_WORDS = {"AS", "DATE", "TIMESTAMP", "TEXT", "INTEGER", "BIGINT", "VARCHAR"}
+_TIME_TYPES = ("date", "timestamp", "datetime")
+
+
+# ---------- watermark detection ----------
+
+def _output_column(item):
+    """(expression, output name) of a select item."""
+    tokens = tokenize_spans(item)
+    if len(tokens) > 2 and tokens[-2][1].upper() == "AS":
+        return item[:tokens[-2][2]].strip(), tokens[-1][1].strip('"')
+    if len(tokens) > 1 and tokens[-1][0] in ("word", "qident") and tokens[-2][1] == ")":
+        # date_trunc('month', order_date) month
+        return item[:tokens[-1][2]].strip(), tokens[-1][1].strip('"')
+    return item, tokens[-1][1].strip('"') if tokens else item
+
+
+def _column_refs(expression):
+    """[(qualifier or None, column)] in an expression, or None when it calls
+    a function that may not preserve order."""
+    tokens = tokenize(expression)
+    refs = []
+    for i, (kind, text) in enumerate(tokens):
+        if kind != "word":
+            continue
+        following = tokens[i + 1][1] if i + 1 < len(tokens) else None
+        if following == "(":
+            if text.upper() not in _ORDER_PRESERVING:
+                return None
+        elif following == ".":
+            continue
+        elif text.upper() not in _TYPE_WORDS:
+            qualifier = tokens[i - 2][1].lower() if i > 1 and tokens[i - 1][1] == "." else None
+            refs.append((qualifier, text.lower()))
+    return refs
+
+
+def _is_monotonic(conn, table, column):
+    """Whether `column` never decreases as `table`.id grows (newest rows)."""
+    cur = conn.cursor()
+    cur.execute(f"SELECT {column} FROM {table} WHERE {column} IS NOT NULL ORDER BY id DESC LIMIT {MONOTONIC_SAMPLE}")
+    values = [row[0] for row in cur.fetchall()]
+    cur.close()
+    return len(values) > 1 and all(a >= b for a, b in zip(values, values[1:]))
+
+
+def _sort_order(tail, columns):
+    """[(column, ascending)] for an ORDER BY over output columns, [] for no
+    tail, None for anything else (LIMIT, expressions, positions)."""
+    if not tail:
+        return []
+    words = [text.upper() if kind == "word" else text for kind, text in tokenize(tail)]
+    # o.order_date -> order_date
+    words = [w for i, w in enumerate(words) if w != "." and (i + 1 == len(words) or words[i + 1] != ".")]
+    if words[:2] != ["ORDER", "BY"]:
+        return None
+    order, current = [], None
+    for text in words[2:] + [","]:
+        if text == ",":
+            if current is None:
+                return None
+            order.append(current)
+            current = None
+        elif current is None and text.strip('"').lower() in columns:
+            current = (columns[text.strip('"').lower()], True)
+        elif current is not None and text in ("ASC", "DESC"):
+            current = (current[0], text == "ASC")
+        else:
+            return None
+    return order
+
+
+def watermark_plan(conn, sql, catalog):
+    """{"column", "expression", "table", "order"} when `sql` can be refreshed
+    incrementally, else None. `catalog` maps table -> {column: data type}."""
+    body, tail = split_tail(sql)
+    words = [t[1] for t in _top_level(body)]
+    if any(w in words for w in ("UNION", "INTERSECT", "EXCEPT")) or "OVER" in body.upper().split():
+        return None
+    # "Last 30 days": rows below the mark leave the window, but the merge keeps them
+    if is_volatile(body):
+        return None
+    items = [_output_column(item) for item in select_items(body)]
+    order = _sort_order(tail, {name.lower(): name for _, name in items})
+    if order is None:
+        return None
+    tables = [t for t in referenced_tables(body) if t in catalog]
+    aliases = table_aliases(body, set(tables))
+    group_by = ""
+    if "GROUP" in words:
+        tokens = _top_level(body)
+        start = tokens[words.index("GROUP")][2]
+        ends = [tokens[i][2] for i, w in enumerate(words) if w in ("HAVING", "WINDOW") and tokens[i][2] > start]
+        group_by = " ".join(t[1] for t in tokenize(body[start:ends[0] if ends else len(body)])).upper()
+
+    candidates = []
+    for position, (expression, name) in enumerate(items, 1):
+        refs = _column_refs(expression)
+        if not refs or len(refs) != 1:
+            continue
+        qualifier, column = refs[0]
+        owners = [aliases.get(qualifier, qualifier)] if qualifier else [t for t in tables if column in catalog[t]]
+        if len(owners) != 1 or owners[0] not in catalog or "id" not in catalog[owners[0]]:
+            continue
+        dtype = catalog[owners[0]].get(column, "")
+        if column != "id" and not dtype.startswith(_TIME_TYPES):
+            continue
+        keys = group_by.replace(",", " ").split()
+        if group_by and name.upper() not in keys and str(position) not in keys and \
+                " ".join(t[1] for t in tokenize(expression)).upper() not in group_by:
+            continue
+        # Time columns first: they are what reports are bucketed by
+        candidates.append((column == "id", expression, name, owners[0], column))
+
+    for _, expression, name, table, column in sorted(candidates, key=lambda c: c[0]):
+        if _is_monotonic(conn, table, column):
+            return {"column": name, "expression": expression, "table": table, "order": order}
+    return None
+
+
+# ---------- merge ----------
+
+def _param(value, sqlite):
+    """High-water mark as a driver parameter (numpy/pandas scalars unwrapped)."""
+    if isinstance(value, pd.Timestamp):
+        value = value.to_pydatetime()
+    elif hasattr(value, "item"):
+        value = value.item()
+    if sqlite and isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    if sqlite and isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def high_water(frame, column):
+    values = frame[column].dropna()
+    return values.max() if len(values) else None
+
+
+def merge_delta(previous, delta, column, mark, order=()):
+    """Rows of `previous` below `mark` followed by `delta`, vectorized; NULL
+    watermarks in `previous` are kept."""
+    values = previous[column]
+    present = values.notna()
+    newer = pd.Series(False, index=previous.index)
+    newer[present] = values[present] >= mark
+    merged = pd.concat([previous[~newer], delta], ignore_index=True)
+    if order:
+        columns, ascending = zip(*order)
+        merged = merged.sort_values(list(columns), ascending=list(ascending), kind="stable", ignore_index=True)
+    return merged
+
+
+# ---------- registry ----------
+
+class SavedQueries:
+    """Named queries and their last results, in a local SQLite file."""
+
+    def __init__(self, db_config, path="saved_queries.sqlite3"):
+        self.db_config = db_config
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS saved_queries (
+                name TEXT PRIMARY KEY,
+                sql TEXT NOT NULL,
+                watermark TEXT,
+                expression TEXT,
+                sort TEXT,
+                high_water TEXT,
+                result BLOB,
+                rows INTEGER,
+                refreshed_at REAL,
+                full_refreshed_at REAL
+            );
+        """)
+        self._db.commit()
+
+    def _catalog(self, conn):
+        from sqlkit.schema import read_catalog
+        columns, _ = read_catalog(conn)
+        catalog = {}
+        for table, column, dtype in columns:
+            catalog.setdefault(table.lower(), {})[column.lower()] = (dtype or "").lower()
+        return catalog
+
+    def save(self, name, sql):
+        """Store a query (replacing one of the same name), run it and return
+        its refresh stats."""
+        ok, reason = check_sql(sql)
+        if not ok:
+            raise ValueError(f"only SELECT queries can be saved ({reason})")
+        sql = sql.strip().rstrip(";").strip()
+        with get_pool(self.db_config).connection() as conn:
+            plan = watermark_plan(conn, sql, self._catalog(conn))
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO saved_queries (name, sql, watermark, expression, sort) VALUES (?, ?, ?, ?, ?)",
+                (name, sql, plan and plan["column"], plan and plan["expression"],
+                 json.dumps(plan["order"]) if plan else None))
+            self._db.commit()
+        return self.refresh(name, full=True)
+
+    def get(self, name):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT sql, watermark, expression, sort, result, refreshed_at, full_refreshed_at "
+                "FROM saved_queries WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            raise KeyError(name)
+        sql, watermark, expression, sort, result, refreshed, full = row
+        return {"name": name, "sql": sql, "watermark": watermark, "expression": expression,
+                "order": json.loads(sort) if sort else [], "result": pickle.loads(result) if result else None,
+                "refreshed_at": refreshed, "full_refreshed_at": full}
+
+    def result(self, name):
+        """Last stored result (no database access)."""
+        return self.get(name)["result"]
+
+    def list(self):
+        with self._lock:
+            return self._db.execute(
+                "SELECT name, watermark, high_water, rows, refreshed_at, sql FROM saved_queries ORDER BY name"
+            ).fetchall()
+
+    def drop(self, name):
+        with self._lock:
+            deleted = self._db.execute("DELETE FROM saved_queries WHERE name = ?", (name,)).rowcount
+            self._db.commit()
+        return bool(deleted)
+
+    def refresh(self, name, full=False):
+        """Re-run a saved query. Fetches only rows at or above the high-water
+        mark when the query has a watermark, a result is stored and a full
+        refresh isn't due. Returns {"mode", "rows", "fetched", "seconds"}."""
+        start = time.perf_counter()
+        saved = self.get(name)
+        previous, watermark = saved["result"], saved["watermark"]
+        mark = high_water(previous, watermark) if watermark and previous is not None else None
+        due = saved["full_refreshed_at"] is None or time.time() - saved["full_refreshed_at"] > FULL_REFRESH
+        incremental = mark is not None and not full and not due
+
+        with get_pool(self.db_config).connection() as conn:
+            _set_timeout(conn, STATEMENT_TIMEOUT_MS)
+            cur = conn.cursor()
+            if incremental:
+                body, _ = split_tail(saved["sql"])
+                if is_sqlite(conn):
+                    delta_sql = add_predicate(body, f"{saved['expression']} >= ?")
+                else:
+                    # With parameters psycopg2 reads every % as a placeholder (LIKE 'a%')
+                    delta_sql = add_predicate(body.replace("%", "%%"), f"{saved['expression']} >= %s")
+                cur.execute(delta_sql, (_param(mark, is_sqlite(conn)),))
+            else:
+                cur.execute(saved["sql"])
+            columns = [d[0] for d in cur.description]
+            fetched = pd.DataFrame.from_records(cur.fetchall(), columns=columns)
+            cur.close()
+
+        if incremental:
+            result = merge_delta(previous, fetched, watermark, mark, saved["order"])
+        else:
+            result = fetched
+        mark = high_water(result, watermark) if watermark else None
+
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "UPDATE saved_queries SET result = ?, rows = ?, high_water = ?, refreshed_at = ?, "
+                "full_refreshed_at = coalesce(?, full_refreshed_at) WHERE name = ?",
+                (pickle.dumps(result), len(result), None if mark is None else str(mark), now,
+                 None if incremental else now, name))
+            self._db.commit()
+        return {"mode": "incremental" if incremental else "full", "rows": len(result),
+                "fetched": len(fetched), "seconds": time.perf_counter() - start}
+
+    def refresh_all(self, full=False):
+        return {name: self.refresh(name, full=full) for name, *_ in self.list()}
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def get_saved_queries(db_config):
+    """Shared registry for a connection config (SAVED_QUERIES_PATH)."""
+    path = os.getenv("SAVED_QUERIES_PATH", "saved_queries.sqlite3")
+    key = (path, tuple(sorted((k, str(v)) for k, v in db_config.items())))
+    with _registries_lock:
+        if key not in _registries:
+            _registries[key] = SavedQueries(db_config, path)
+        return _registries[key]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Saved queries with incremental refresh")
+    parser.add_argument("command", choices=["save", "refresh", "show", "list", "drop"])
+    parser.add_argument("name", nargs="?")
+    parser.add_argument("sql", nargs="?")
+    parser.add_argument("--full", action="store_true", help="refresh: re-run the whole query")
+    args = parser.parse_args()
+
+    # Same connection settings as the agents
+    db_config = {"host": os.getenv("DB_HOST"), "port": os.getenv("DB_PORT"), "database": os.getenv("DB_NAME"),
+                 "user": os.getenv("DB_USER"), "password": os.getenv("DB_PASSWORD")}
+    saved = get_saved_queries(db_config)
+
+    if args.command == "save":
+        if not args.name or not args.sql:
+            parser.error("save needs a name and the SQL")
+        stats = saved.save(args.name, args.sql)
+        watermark = saved.get(args.name)["watermark"]
+        print(f"{args.name}: {stats['rows']} rows, "
+              f"{'watermark ' + watermark if watermark else 'no watermark (full refreshes only)'}")
+    elif args.command == "refresh":
+        results = {args.name: saved.refresh(args.name, args.full)} if args.name else saved.refresh_all(args.full)
+        for name, r in results.items():
+            print(f"{name}: {r['mode']}, fetched {r['fetched']} of {r['rows']} rows in {r['seconds'] * 1000:.0f} ms")
+    elif args.command == "show":
+        print(saved.result(args.name).to_string(index=False, max_rows=50))
+    elif args.command == "drop":
+        print("dropped" if saved.drop(args.name) else "no such query")
+    else:
+        for name, watermark, mark, rows, refreshed, sql in saved.list():
+            age = time.time() - (refreshed or 0)
+            print(f"{name}  {rows} rows  age {age:.0f}s  watermark {watermark or '-'} >= {mark or '-'}\n    {sql[:100]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+import hashlib
+import threading
+import time
+
+from sqlkit.backends import is_sqlite
+
+# Changes whenever a public table/view is created, dropped or has a column
+# added, dropped, renamed or retyped. Reads only pg_catalog, so it is cheap.
+SCHEMA_FINGERPRINT_SQL = """
+    SELECT md5(coalesce(string_agg(
+               c.oid::text || ':' || c.relname || ':' || a.attnum || ':' || a.attname || ':' || a.atttypid,
+               ',' ORDER BY c.oid, a.attnum), ''))
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    JOIN pg_attribute a ON a.attrelid = c.oid
+    WHERE n.nspname = 'public'
+      AND c.relkind IN ('r', 'p', 'v', 'm')
+      AND a.attnum > 0
+      AND NOT a.attisdropped
+"""
+
+COLUMNS_SQL = """
+    SELECT table_name, column_name, data_type
+    FROM information_schema.columns
+    WHERE table_schema = 'public'
+    ORDER BY table_name, ordinal_position
+"""
+
+# SQLite summary tables written by sqlkit.materialize (on PostgreSQL they live
+# in their own schema); they are not part of the schema the model sees
+SUMMARY_PREFIX = "mv_"
+
+ROW_ESTIMATES_SQL = """
+    SELECT c.relname, c.reltuples::bigint
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p', 'm')
+"""
+
+
+class SchemaCatalog:
+    """In-memory copy of the public schema, rebuilt only when its fingerprint changes.
+
+    The fingerprint is re-checked at most every `check_interval` seconds;
+    between checks (and when it is unchanged) the pre-rendered text is served
+    without touching information_schema.
+    """
+
+    def __init__(self, pool, check_interval=30.0):
+        self.pool = pool
+        self.check_interval = check_interval
+        self.fingerprint = None
+        self.tables = {}  # name -> [(column, data_type), ...]
+        self.row_estimates = {}  # name -> planner row estimate (pg_class.reltuples)
+        self.rendered = ""
+        self.builds = 0
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def refresh(self, force=False):
+        """Re-check the fingerprint; rebuild if it changed. Returns True on rebuild."""
+        with self._lock:
+            now = time.monotonic()
+            if not force and self.fingerprint and now - self._checked_at < self.check_interval:
+                return False
+            with self.pool.connection() as conn:
+                fp = read_fingerprint(conn)
+                self._checked_at = now
+                if fp == self.fingerprint and not force:
+                    return False
+                columns, estimates = read_catalog(conn)
+
+            tables = {}
+            for table, column, dtype in columns:
+                tables.setdefault(table, []).append((column, dtype))
+            self.tables = tables
+            self.row_estimates = estimates
+            self.fingerprint = fp
+            self.rendered = render_schema(tables, estimates)
+            self.builds += 1
+            return True
+
+    def text(self):
+        self.refresh()
+        return self.rendered
+
+
+def read_fingerprint(conn):
+    if is_sqlite(conn):
+        rows = conn.execute("SELECT type, name, coalesce(sql, '') FROM sqlite_master "
+                            "WHERE tbl_name NOT LIKE ? ESCAPE '\\' ORDER BY type, name",
+                            (SUMMARY_PREFIX.replace("_", "\\_") + "%",))
+        return hashlib.md5(repr(rows.fetchall()).encode("utf-8")).hexdigest()
+    cur = conn.cursor()
+    cur.execute(SCHEMA_FINGERPRINT_SQL)
+    fp = cur.fetchone()[0]
+    cur.close()
+    return fp
+
+
+def read_catalog(conn):
+    """([(table, column, data_type), ...], {table: estimated rows})"""
+    if is_sqlite(conn):
+        names = conn.execute(
+            "SELECT name, type FROM sqlite_master WHERE type IN ('table', 'view') "
+            "AND name NOT LIKE 'sqlite_%' AND name NOT LIKE ? ESCAPE '\\' ORDER BY name",
+            (SUMMARY_PREFIX.replace("_", "\\_") + "%",)).fetchall()
+        columns = []
+        estimates = {}
+        for name, kind in names:
+            for _, column, dtype, *_ in conn.execute(f'PRAGMA table_info("{name}")'):
+                columns.append((name, column, (dtype or "").lower()))
+            if kind == "table":
+                # max(rowid) is an index lookup, unlike count(*)
+                estimates[name] = conn.execute(f'SELECT coalesce(max(rowid), 0) FROM "{name}"').fetchone()[0]
+        return columns, estimates
+
+    cur = conn.cursor()
+    cur.execute(COLUMNS_SQL)
+    columns = cur.fetchall()
+    cur.execute(ROW_ESTIMATES_SQL)
+    estimates = dict(cur.fetchall())
+    cur.close()
+    return columns, estimates
+
+
+def render_schema(tables, row_estimates=None):
+    """Schema text for the prompt, with table sizes when they are known."""
+    row_estimates = row_estimates or {}
+    output = ["Database Schema:"]
+    for table, columns in tables.items():
+        rows = row_estimates.get(table)
+        size = f" (~{rows:,} rows)" if rows is not None and rows >= 0 else ""
+        output.append(f"\n{table}{size}:")
+        for column, dtype in columns:
+            output.append(f"  - {column} ({dtype})")
+    return "\n".join(output)
+
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(pool):
+    """Shared SchemaCatalog for a connection pool."""
+    with _catalogs_lock:
+        catalog = _catalogs.get(id(pool))
+        if catalog is None:
+            catalog = _catalogs[id(pool)] = SchemaCatalog(pool)
+        return catalog
+
+
+def schema_fingerprint(pool, max_age=60.0):
+    """Fingerprint of the live public schema, or None when the database cannot be reached."""
+    catalog = get_catalog(pool)
+    try:
+        if time.monotonic() - catalog._checked_at >= max_age:
+            catalog.refresh()
+    except Exception:
+        return None
+    return catalog.fingerprint
@@ -0,0 +1,195 @@
+import math
+import os
+import re
+import threading
+from collections import Counter
+
+from sqlkit.backends import is_sqlite
+from sqlkit.schema import get_catalog, render_schema
+from sqlkit.sqltext import estimate_tokens
+
+TOP_K = int(os.getenv("SCHEMA_TOP_K", "5"))
+
+COMMENTS_SQL = """
+    SELECT c.relname, a.attname, obj_description(c.oid, 'pg_class'), col_description(c.oid, a.attnum)
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+    WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p', 'v', 'm')
+"""
+
+# Sample values come from ANALYZE statistics, so no table is scanned
+SAMPLE_VALUES_SQL = """
+    SELECT tablename, attname, most_common_vals::text
+    FROM pg_stats
+    WHERE schemaname = 'public' AND most_common_vals IS NOT NULL
+"""
+
+FOREIGN_KEYS_SQL = """
+    SELECT src.relname, sa.attname, dst.relname, da.attname
+    FROM pg_constraint k
+    JOIN pg_class src ON src.oid = k.conrelid
+    JOIN pg_class dst ON dst.oid = k.confrelid
+    JOIN pg_namespace n ON n.oid = src.relnamespace
+    JOIN pg_attribute sa ON sa.attrelid = k.conrelid AND sa.attnum = k.conkey[1]
+    JOIN pg_attribute da ON da.attrelid = k.confrelid AND da.attnum = k.confkey[1]
+    WHERE k.contype = 'f' AND n.nspname = 'public'
+"""
+
+
+def terms(text):
+    """Lower-cased word terms; snake_case is split and plurals folded."""
+    out = []
+    for word in re.findall(r"[a-z0-9]+", (text or "").lower().replace("_", " ")):
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        out.append(word)
+    return out
+
+
+class BM25:
+    def __init__(self, docs, k1=1.2, b=0.75):
+        self.k1, self.b = k1, b
+        self.docs = [Counter(d) for d in docs]
+        self.lengths = [len(d) for d in docs]
+        self.avg_len = sum(self.lengths) / len(docs) if docs else 0.0
+        df = Counter(t for d in self.docs for t in d)
+        n = len(docs)
+        self.idf = {t: math.log(1 + (n - f + 0.5) / (f + 0.5)) for t, f in df.items()}
+
+    def scores(self, query_terms):
+        out = []
+        for doc, length in zip(self.docs, self.lengths):
+            score = 0.0
+            for t in query_terms:
+                tf = doc.get(t)
+                if tf:
+                    norm = tf + self.k1 * (1 - self.b + self.b * length / (self.avg_len or 1))
+                    score += self.idf[t] * tf * (self.k1 + 1) / norm
+            out.append(score)
+        return out
+
+
+class SchemaIndex:
+    """BM25 index over tables (names, columns, comments, common values).
+
+    relevant_schema(question) renders only the top-k tables plus the join
+    keys that connect them, and records how many prompt tokens that saved.
+    """
+
+    def __init__(self, pool, top_k=None):
+        self.pool = pool
+        self.catalog = get_catalog(pool)
+        self.top_k = top_k or TOP_K
+        self.fingerprint = None
+        self.tables = []
+        self.join_keys = []  # (table, column, ref_table, ref_column)
+        self.full_tokens = 0
+        self.tokens_saved = 0
+        self.last_report = None
+        self._bm25 = None
+        self._lock = threading.Lock()
+
+    def build(self):
+        self.catalog.refresh()
+        with self._lock:
+            if self.fingerprint == self.catalog.fingerprint and self._bm25 is not None:
+                return
+            with self.pool.connection() as conn:
+                comments, samples, foreign_keys = read_documents(conn, self.catalog.tables)
+
+            text = {t: [t, t, t] for t in self.catalog.tables}  # table names weigh most
+            for table, columns in self.catalog.tables.items():
+                text[table].extend(col for col, _ in columns)
+            for table, column, table_comment, column_comment in comments:
+                if table in text:
+                    text[table].extend(filter(None, (table_comment, column_comment)))
+            for table, column, values in samples:
+                if table in text:
+                    text[table].append(values)
+
+            self.tables = list(text)
+            self._bm25 = BM25([terms(" ".join(parts)) for parts in text.values()])
+            self.join_keys = [tuple(fk) for fk in foreign_keys] or guess_join_keys(self.catalog.tables)
+            self.full_tokens = estimate_tokens(self.catalog.rendered)
+            self.fingerprint = self.catalog.fingerprint
+
+    def relevant_tables(self, question, top_k=None):
+        self.build()
+        scores = self._bm25.scores(terms(question))
+        ranked = sorted(range(len(self.tables)), key=lambda i: -scores[i])
+        picked = [self.tables[i] for i in ranked[:top_k or self.top_k] if scores[i] > 0]
+        return picked or [self.tables[i] for i in ranked[:top_k or self.top_k]]
+
+    def relevant_schema(self, question, top_k=None):
+        """Schema text for just the tables relevant to `question`, or None
+        when the database is small enough to send whole."""
+        self.build()
+        if len(self.tables) <= (top_k or self.top_k):
+            return None
+        picked = self.relevant_tables(question, top_k)
+        chosen = set(picked)
+        text = render_schema({t: self.catalog.tables[t] for t in picked}, self.catalog.row_estimates)
+        joins = [f"  - {t}.{c} = {rt}.{rc}" for t, c, rt, rc in self.join_keys if t in chosen or rt in chosen]
+        if joins:
+            text += "\n\nJoin keys:\n" + "\n".join(joins)
+
+        pruned = estimate_tokens(text)
+        with self._lock:
+            self.tokens_saved += max(self.full_tokens - pruned, 0)
+            self.last_report = {
+                "tables": picked,
+                "full_tokens": self.full_tokens,
+                "pruned_tokens": pruned,
+                "saved_tokens": max(self.full_tokens - pruned, 0),
+                "total_saved_tokens": self.tokens_saved,
+            }
+        return text
+
+
+def read_documents(conn, tables):
+    """(comments, sample values, foreign keys) rows for the index."""
+    if is_sqlite(conn):
+        # No comments or planner statistics in SQLite; foreign keys only
+        foreign_keys = []
+        for table in tables:
+            for row in conn.execute(f'PRAGMA foreign_key_list("{table}")'):
+                foreign_keys.append((table, row[3], row[2], row[4] or "id"))
+        return [], [], foreign_keys
+
+    cur = conn.cursor()
+    cur.execute(COMMENTS_SQL)
+    comments = cur.fetchall()
+    cur.execute(SAMPLE_VALUES_SQL)
+    samples = cur.fetchall()
+    cur.execute(FOREIGN_KEYS_SQL)
+    foreign_keys = cur.fetchall()
+    cur.close()
+    return comments, samples, foreign_keys
+
+
+def guess_join_keys(tables):
+    """<name>_id columns pointing at the id of a table called <name> or <name>s."""
+    keys = []
+    for table, columns in tables.items():
+        for column, _ in columns:
+            if not column.endswith("_id"):
+                continue
+            base = column[:-3]
+            for ref in (base, base + "s", base + "es"):
+                if ref in tables and any(c == "id" for c, _ in tables[ref]):
+                    keys.append((table, column, ref, "id"))
+                    break
+    return keys
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_schema_index(pool):
+    with _indexes_lock:
+        index = _indexes.get(id(pool))
+        if index is None:
+            index = _indexes[id(pool)] = SchemaIndex(pool)
+        return index
@@ -0,0 +1,134 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+
+
+def normalize_question(text):
+    """Lower-case, collapse whitespace and drop trailing punctuation."""
+    text = re.sub(r"\s+", " ", (text or "").strip().lower())
+    return text.rstrip(" ?!.;")
+
+
+def _sha(*parts):
+    return hashlib.sha256("\x1f".join(p or "" for p in parts).encode("utf-8")).hexdigest()
+
+
+class SQLCache:
+    """Disk-backed (SQLite) cache of question -> generated SQL.
+
+    Keys are the normalized question + conversation context. The cache is
+    stamped with a version (hash of the system prompt and schema fingerprint);
+    when the version changes every entry is dropped. Entries expire after
+    `ttl` seconds and the least recently used ones are evicted past
+    `max_entries`.
+    """
+
+    def __init__(self, path="sql_cache.sqlite3", max_entries=1000, ttl=7 * 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                question TEXT,
+                sql TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS entries_last_used ON entries(last_used);
+            CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT);
+        """)
+        self._db.commit()
+
+    def get(self, question, context="", version=""):
+        key = self._key(question, context)
+        now = time.time()
+        with self._lock:
+            self._check_version(version)
+            row = self._db.execute(
+                "SELECT sql, created_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                    self._db.commit()
+                self.misses += 1
+                return None
+            self._db.execute(
+                "UPDATE entries SET last_used = ?, hits = hits + 1 WHERE key = ?", (now, key)
+            )
+            self._db.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, question, context, version, sql):
+        key = self._key(question, context)
+        now = time.time()
+        with self._lock:
+            self._check_version(version)
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (key, question, sql, created_at, last_used, hits) "
+                "VALUES (?, ?, ?, ?, ?, 0)",
+                (key, normalize_question(question), sql, now, now),
+            )
+            self._evict()
+            self._db.commit()
+
+    def discard(self, question, context=""):
+        """Forget an entry, e.g. when its SQL failed to execute."""
+        with self._lock:
+            self._db.execute("DELETE FROM entries WHERE key = ?", (self._key(question, context),))
+            self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM entries")
+            self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            size = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": size,
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    # ---------- internals ----------
+
+    def _key(self, question, context):
+        return _sha(normalize_question(question), normalize_question(context))
+
+    def _check_version(self, version):
+        row = self._db.execute("SELECT value FROM meta WHERE name = 'version'").fetchone()
+        if row is not None and row[0] == version:
+            return
+        self._db.execute("DELETE FROM entries")
+        self._db.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('version', ?)", (version,))
+        self._db.commit()
+
+    def _evict(self):
+        self._db.execute("DELETE FROM entries WHERE created_at < ?", (time.time() - self.ttl,))
+        self._db.execute(
+            "DELETE FROM entries WHERE key IN ("
+            "  SELECT key FROM entries ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+
+def cache_version(system_prompt, schema_fp):
+    """Cache version for a prompt + schema; any change invalidates the cache."""
+    return _sha(system_prompt, schema_fp)
@@ -0,0 +1,165 @@
+import re
+
+# One alternation, scanned left to right in a single pass. Order matters:
+# comments and quoted text must win over operators and words.
+_TOKEN_RE = re.compile(r"""
+    (?P<ws>\s+)
+  | (?P<comment>--[^\n]*|/\*.*?(?:\*/|\Z))
+  | (?P<string>(?:[EeBbXxNn])?'(?:[^']|'')*(?:'|\Z))
+  | (?P<dollar>\$(?P<tag>[A-Za-z_]\w*)?\$.*?(?:\$(?P=tag)?\$|\Z))
+  | (?P<qident>"(?:[^"]|"")*(?:"|\Z))
+  | (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<param>%\(\w+\)s|%s|\$\d+|\?)
+  | (?P<word>[A-Za-z_][\w$]*)
+  | (?P<op>::|<>|!=|<=|>=|\|\||[^\s\w])
+""", re.VERBOSE | re.DOTALL)
+
+
+def tokenize_spans(sql):
+    """Like tokenize(), but each token is (kind, text, start, end)."""
+    tokens = []
+    for m in _TOKEN_RE.finditer(sql):
+        kind = m.lastgroup
+        if kind in ("ws", "comment"):
+            continue
+        if kind in ("dollar", "tag"):
+            kind = "string"
+        tokens.append((kind, m.group(), m.start(), m.end()))
+    return tokens
+
+
+def tokenize(sql):
+    """Split SQL into (kind, text) tokens, dropping whitespace and comments.
+
+    kind is one of: word, qident, string, number, param, op.
+    """
+    return [(kind, text) for kind, text, _, _ in tokenize_spans(sql)]
+
+
+def estimate_tokens(text):
+    """Rough LLM token count (~4 characters per token)."""
+    return (len(text) + 3) // 4
+
+
+def canonicalize(sql):
+    """Whitespace- and case-normalized SQL text with literals left untouched.
+
+    Unquoted identifiers and keywords are case-insensitive in PostgreSQL, so
+    they are upper-cased; strings and quoted identifiers are kept verbatim.
+    """
+    parts = []
+    for kind, text in tokenize(sql):
+        parts.append(text.upper() if kind == "word" else text)
+    while parts and parts[-1] == ";":
+        parts.pop()
+    return " ".join(parts)
+
+
+def statement_shape(sql):
+    """canonicalize() with every string and number literal replaced by '?',
+    so queries that differ only in their constants group together."""
+    parts = []
+    for kind, text in tokenize(sql):
+        if kind in ("string", "number"):
+            parts.append("?")
+        else:
+            parts.append(text.upper() if kind == "word" else text)
+    while parts and parts[-1] == ";":
+        parts.pop()
+    return " ".join(parts)
+
+
+_TABLE_END = {"WHERE", "GROUP", "ORDER", "LIMIT", "HAVING", "ON", "USING", "JOIN", "INNER",
+              "LEFT", "RIGHT", "FULL", "CROSS", "NATURAL", "UNION", "EXCEPT", "INTERSECT",
+              "OFFSET", "FETCH", "WINDOW", "FOR", "LATERAL"}
+
+
+def referenced_tables(sql):
+    """Lower-cased names of tables that appear after FROM / JOIN (or in a FROM list)."""
+    tokens = tokenize(sql)
+    tables = []
+    expect = False
+    in_from = False
+    depth = 0
+    from_depth = None
+    i = 0
+    while i < len(tokens):
+        kind, text = tokens[i]
+        upper = text.upper() if kind == "word" else text
+        if text == "(":
+            depth += 1
+        elif text == ")":
+            depth -= 1
+            if from_depth is not None and depth < from_depth:
+                in_from, from_depth = False, None
+
+        if kind == "word" and upper in ("FROM", "JOIN"):
+            expect = True
+            in_from = upper == "FROM" or in_from
+            from_depth = depth
+        elif expect and kind in ("word", "qident") and upper not in _TABLE_END:
+            name = text
+            # schema.table -> table
+            while i + 2 < len(tokens) and tokens[i + 1][1] == "." and tokens[i + 2][0] in ("word", "qident"):
+                i += 2
+                name = tokens[i][1]
+            tables.append(name.strip('"') if kind == "qident" or name.startswith('"') else name.lower())
+            expect = False
+        elif expect:
+            expect = False
+        elif in_from and text == "," and depth == from_depth:
+            expect = True
+        elif kind == "word" and upper in _TABLE_END - {"JOIN", "INNER", "LEFT", "RIGHT", "FULL",
+                                                       "CROSS", "NATURAL", "LATERAL", "ON", "USING"}:
+            if depth == from_depth:
+                in_from, from_depth = False, None
+        i += 1
+    return tables
+
+
+_NOT_ALIASES = {"WHERE", "JOIN", "INNER", "LEFT", "RIGHT", "FULL", "CROSS", "NATURAL", "ON", "USING",
+                "GROUP", "ORDER", "LIMIT", "HAVING", "UNION", "EXCEPT", "INTERSECT", "OFFSET", "AS"}
+
+
+def table_aliases(sql, tables):
+    """{alias: table} for the `tables` (lower-cased names) aliased in `sql`."""
+    tokens = tokenize(sql)
+    aliases = {}
+    for i, (kind, text) in enumerate(tokens[:-1]):
+        if kind != "word" or text.lower() not in tables:
+            continue
+        j = i + 2 if tokens[i + 1][1].upper() == "AS" else i + 1
+        if j < len(tokens) and tokens[j][0] == "word" and tokens[j][1].upper() not in _NOT_ALIASES:
+            aliases[tokens[j][1].lower()] = text.lower()
+    return aliases
+
+
+def outer_limit(sql):
+    """The numeric top-level LIMIT of a statement, or None."""
+    tokens = tokenize(sql)
+    depth = 0
+    for i, (kind, text) in enumerate(tokens):
+        if text == "(":
+            depth += 1
+        elif text == ")":
+            depth -= 1
+        elif depth == 0 and kind == "word" and text.upper() == "LIMIT" and i + 1 < len(tokens):
+            if tokens[i + 1][0] == "number":
+                return int(float(tokens[i + 1][1]))
+    return None
+
+
+_VOLATILE_WORDS = {"NOW", "CURRENT_DATE", "CURRENT_TIME", "CURRENT_TIMESTAMP", "LOCALTIME", "LOCALTIMESTAMP",
+                   "CLOCK_TIMESTAMP", "STATEMENT_TIMESTAMP", "TRANSACTION_TIMESTAMP", "TIMEOFDAY", "RANDOM"}
+_VOLATILE_STRINGS = {"now", "today", "yesterday", "tomorrow"}
+
+
+def is_volatile(sql):
+    """Whether the result depends on when the statement runs: now(),
+    CURRENT_DATE, random(), 'now'::date or SQLite's date('now', '-7 days')."""
+    for kind, text in tokenize(sql):
+        if kind == "word" and text.upper() in _VOLATILE_WORDS:
+            return True
+        if kind == "string" and text.strip("'").lower() in _VOLATILE_STRINGS:
+            return True
+    return False
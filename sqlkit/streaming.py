@@ -0,0 +1,100 @@
+import os
+import uuid
+
+from sqlkit.backends import is_sqlite
+from sqlkit.typed import column_kinds
+
+DEFAULT_BATCH_SIZE = int(os.getenv("DB_FETCH_BATCH", "1000"))
+
+
+class QueryStream:
+    """Lazy row iterator backed by a named (server-side) cursor.
+
+    Rows are pulled with fetchmany(batch_size), so at most one batch is held
+    in memory. The pooled connection is returned once the stream is
+    exhausted or closed. `prepare(conn, sql)` may rewrite the SQL on the
+    checked-out connection before the cursor is opened (e.g. cost_gate).
+    """
+
+    def __init__(self, pool, sql, params=None, batch_size=None, prepare=None):
+        self.pool = pool
+        self.sql = sql
+        self.batch_size = batch_size or DEFAULT_BATCH_SIZE
+        self.count = 0
+        self._conn = pool.getconn()
+        self._cursor = None
+        try:
+            if prepare is not None:
+                sql = self.sql = prepare(self._conn, sql)
+            if is_sqlite(self._conn):
+                # SQLite cursors already step through rows lazily
+                self._cursor = self._conn.cursor()
+            else:
+                self._cursor = self._conn.cursor(name=f"stream_{uuid.uuid4().hex[:12]}")
+            if params is None:
+                self._cursor.execute(sql)
+            else:
+                self._cursor.execute(sql, params)
+            # Named cursors only fill in description after the first fetch
+            self._first = self._cursor.fetchmany(self.batch_size)
+            self.columns = [d[0] for d in self._cursor.description]
+            self.kinds = column_kinds(self._cursor.description)
+        except Exception:
+            self.close()
+            raise
+
+    def batches(self):
+        """Yield lists of row tuples, one fetchmany() batch at a time."""
+        try:
+            batch, self._first = self._first, None
+            while batch:
+                self.count += len(batch)
+                yield batch
+                if self._cursor is None:
+                    break
+                batch = self._cursor.fetchmany(self.batch_size)
+        finally:
+            self.close()
+
+    def __iter__(self):
+        for batch in self.batches():
+            yield from batch
+
+    def dicts(self):
+        columns = self.columns
+        for row in self:
+            yield dict(zip(columns, row))
+
+    def close(self):
+        if self._conn is None:
+            return
+        conn, self._conn = self._conn, None
+        try:
+            if self._cursor is not None:
+                self._cursor.close()
+        except Exception:
+            pass
+        self._cursor = None
+        self.pool.putconn(conn, discard=bool(getattr(conn, "closed", False)))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def as_batches(data, batch_size=None):
+    """Return (columns, batch iterator) for a QueryStream (or anything with the
+    same batches() interface) or a list of row dicts."""
+    if hasattr(data, "batches"):
+        return data.columns, data.batches()
+
+    columns = list(data[0].keys()) if data else []
+    size = batch_size or DEFAULT_BATCH_SIZE
+
+    def gen():
+        for start in range(0, len(data), size):
+            yield [tuple(row.get(c) for c in columns) for row in data[start:start + size]]
+
+    return columns, gen()
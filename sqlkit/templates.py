@@ -0,0 +1,286 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from sqlkit.backends import is_sqlite
+from sqlkit.cost_gate import STATEMENT_TIMEOUT_MS, _set_timeout, ensure_limit
+from sqlkit.sql_cache import normalize_question
+from sqlkit.sqltext import tokenize_spans
+
+US_STATES = {
+    "AL": "Alabama", "AK": "Alaska", "AZ": "Arizona", "AR": "Arkansas", "CA": "California",
+    "CO": "Colorado", "CT": "Connecticut", "DE": "Delaware", "DC": "District of Columbia",
+    "FL": "Florida", "GA": "Georgia", "HI": "Hawaii", "ID": "Idaho", "IL": "Illinois",
+    "IN": "Indiana", "IA": "Iowa", "KS": "Kansas", "KY": "Kentucky", "LA": "Louisiana",
+    "ME": "Maine", "MD": "Maryland", "MA": "Massachusetts", "MI": "Michigan", "MN": "Minnesota",
+    "MS": "Mississippi", "MO": "Missouri", "MT": "Montana", "NE": "Nebraska", "NV": "Nevada",
+    "NH": "New Hampshire", "NJ": "New Jersey", "NM": "New Mexico", "NY": "New York",
+    "NC": "North Carolina", "ND": "North Dakota", "OH": "Ohio", "OK": "Oklahoma", "OR": "Oregon",
+    "PA": "Pennsylvania", "RI": "Rhode Island", "SC": "South Carolina", "SD": "South Dakota",
+    "TN": "Tennessee", "TX": "Texas", "UT": "Utah", "VT": "Vermont", "VA": "Virginia",
+    "WA": "Washington", "WV": "West Virginia", "WI": "Wisconsin", "WY": "Wyoming",
+}
+
+# slot=table.column pairs whose distinct values become entities
+ENTITY_COLUMNS = os.getenv("TEMPLATE_ENTITY_COLUMNS", "city=customers.city,category=products.category")
+
+
+class Vocabulary:
+    """Entity surface forms -> (slot, value).
+
+    States are built in (full names, plus upper-case codes like "TX"); other
+    slots are filled from distinct column values with load_columns().
+    """
+
+    def __init__(self):
+        self.entries = {}  # lower-case surface -> (slot, value, case_sensitive surface or None)
+        for code, name in US_STATES.items():
+            self.add("state", name, code)
+            self.add("state", code, code, case_sensitive=True)
+
+    def add(self, slot, surface, value, case_sensitive=False):
+        key = surface.lower()
+        if key not in self.entries:
+            self.entries[key] = (slot, value, surface if case_sensitive else None)
+
+    def load_columns(self, pool, spec=None, limit=1000):
+        pairs = [item.split("=", 1) for item in (spec or ENTITY_COLUMNS).split(",") if "=" in item]
+        with pool.connection() as conn:
+            cur = conn.cursor()
+            for slot, column in pairs:
+                table, col = column.strip().split(".")
+                try:
+                    cur.execute(f'SELECT DISTINCT "{col}" FROM "{table}" WHERE "{col}" IS NOT NULL LIMIT {int(limit)}')
+                except Exception:
+                    conn.rollback()
+                    continue
+                for (value,) in cur.fetchall():
+                    if isinstance(value, str) and len(value) > 1:
+                        self.add(slot.strip(), value, value)
+            cur.close()
+
+    def mentions(self, question):
+        """[(start, end, slot, value, surface)] found in the question, longest first."""
+        found = []
+        words = list(re.finditer(r"[A-Za-z0-9][A-Za-z0-9'&.-]*", question))
+        i = 0
+        while i < len(words):
+            for n in (4, 3, 2, 1):
+                if i + n > len(words):
+                    continue
+                start, end = words[i].start(), words[i + n - 1].end()
+                surface = question[start:end].rstrip(".")
+                entry = self.entries.get(surface.lower())
+                if entry and (entry[2] is None or entry[2] == surface):
+                    found.append((start, start + len(surface), entry[0], entry[1], surface))
+                    i += n
+                    break
+            else:
+                if words[i].group().isdigit():
+                    found.append((words[i].start(), words[i].end(), "number", int(words[i].group()), words[i].group()))
+                i += 1
+        return found
+
+
+class TemplateMatch:
+    def __init__(self, template, values):
+        self.template = template  # {"pattern", "sql", "slots"}
+        self.values = values
+        self.sql = bind_literals(template["sql"], values)
+        self.name = "tpl_" + hashlib.md5(template["sql"].encode("utf-8")).hexdigest()[:16]
+
+
+class TemplateCache:
+    """Parameterized SQL learned from generated queries.
+
+    learn(question, sql) lifts literals that match entities mentioned in the
+    question ("California" -> 'CA', "top 5" -> LIMIT 5) into $n parameters
+    and stores the question pattern ("how many customers are from {state}").
+    match(question) binds the new entity values into a stored template, so
+    parameter-only variants need no LLM call. Stored in SQLite next to the
+    SQL cache and versioned the same way.
+    """
+
+    def __init__(self, path="sql_cache.sqlite3", vocabulary=None):
+        self.vocabulary = vocabulary or Vocabulary()
+        self.hits = 0
+        self.misses = 0
+        self.learned = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS templates (
+                pattern TEXT PRIMARY KEY,
+                sql TEXT NOT NULL,
+                slots TEXT NOT NULL,
+                version TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                uses INTEGER NOT NULL DEFAULT 0
+            );
+        """)
+        self._db.commit()
+
+    def learn(self, question, sql, version=""):
+        """Store a template for (question, sql); returns it, or None when the
+        question has no entity that maps onto a literal of the SQL."""
+        mentions = self.vocabulary.mentions(question)
+        literals = [t for t in tokenize_spans(sql) if t[0] in ("string", "number")]
+        if not mentions or not literals:
+            return None
+
+        slots, replacements, used = [], [], set()
+        for start, end, slot, value, surface in mentions:
+            for idx, (kind, text, lstart, lend) in enumerate(literals):
+                if idx in used:
+                    continue
+                literal = text[1:-1].replace("''", "'") if kind == "string" else text
+                if slot == "number":
+                    if kind != "number" or literal != str(value):
+                        continue
+                    form = "value"
+                elif kind != "string":
+                    continue
+                elif literal.lower() == str(value).lower():
+                    form = "value"
+                elif literal.lower() == surface.lower():
+                    form = "surface"
+                else:
+                    continue
+                used.add(idx)
+                slots.append({"slot": slot, "form": form, "start": start, "end": end})
+                replacements.append((lstart, lend, len(slots)))
+                break
+            else:
+                if slot != "number":
+                    # An entity the SQL doesn't use literally: not safe to template
+                    return None
+        if not slots:
+            return None
+
+        template_sql = sql
+        for lstart, lend, n in sorted(replacements, reverse=True):
+            template_sql = template_sql[:lstart] + f"${n}" + template_sql[lend:]
+        pattern = question_pattern(question, slots)
+        template = {"pattern": pattern, "sql": template_sql,
+                    "slots": [{"slot": s["slot"], "form": s["form"]} for s in slots]}
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO templates (pattern, sql, slots, version, created_at, uses) "
+                "VALUES (?, ?, ?, ?, ?, 0)",
+                (pattern, template_sql, json.dumps(template["slots"]), version, time.time()))
+            self._db.commit()
+            self.learned += 1
+        return template
+
+    def match(self, question, version=""):
+        mentions = self.vocabulary.mentions(question)
+        # Try with every mention as a slot first, then leave numbers as text
+        for keep_numbers in (False, True):
+            chosen = [m for m in mentions if not (keep_numbers and m[2] == "number")]
+            if not chosen:
+                continue
+            slots = [{"start": m[0], "end": m[1], "slot": m[2]} for m in chosen]
+            pattern = question_pattern(question, slots)
+            with self._lock:
+                row = self._db.execute(
+                    "SELECT sql, slots FROM templates WHERE pattern = ? AND version = ?", (pattern, version)
+                ).fetchone()
+            if row is None:
+                continue
+            stored = json.loads(row[1])
+            if [s["slot"] for s in stored] != [m[2] for m in chosen]:
+                continue
+            values = [m[4] if s["form"] == "surface" else m[3] for s, m in zip(stored, chosen)]
+            with self._lock:
+                self._db.execute("UPDATE templates SET uses = uses + 1 WHERE pattern = ?", (pattern,))
+                self._db.commit()
+                self.hits += 1
+            return TemplateMatch({"pattern": pattern, "sql": row[0], "slots": stored}, values)
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM templates")
+            self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            size = self._db.execute("SELECT COUNT(*) FROM templates").fetchone()[0]
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "templates": size, "learned": self.learned}
+
+
+def question_pattern(question, slots):
+    parts, last = [], 0
+    for s in sorted(slots, key=lambda s: s["start"]):
+        parts.append(question[last:s["start"]])
+        parts.append("{" + s["slot"] + "}")
+        last = s["end"]
+    parts.append(question[last:])
+    return normalize_question("".join(parts))
+
+
+def bind_literals(template_sql, values):
+    """Template with $n replaced by SQL literals (for display, history and cache keys)."""
+    out = template_sql
+    for kind, text, start, end in sorted(tokenize_spans(template_sql), key=lambda t: -t[2]):
+        if kind == "param" and text.startswith("$"):
+            value = values[int(text[1:]) - 1]
+            literal = str(value) if isinstance(value, (int, float)) else "'" + str(value).replace("'", "''") + "'"
+            out = out[:start] + literal + out[end:]
+    return out
+
+
+def execute_prepared(conn, match, timeout_ms=None, limit=None):
+    """Run a template match as a server-side prepared statement.
+
+    PostgreSQL: PREPARE once per pooled connection, then only EXECUTE with
+    the new values on later checkouts, reusing the plan. The names are kept
+    on the connection (conn.prepared, see sqlkit.backends); the pool's
+    session reset keeps the statements. SQLite: numbered ?n parameters,
+    which sqlite3 keeps prepared in its statement cache. Returns an open
+    cursor.
+    """
+    sql = ensure_limit(match.template["sql"], limit)
+    timeout_ms = STATEMENT_TIMEOUT_MS if timeout_ms is None else timeout_ms
+    _set_timeout(conn, timeout_ms)
+    if is_sqlite(conn):
+        return conn.execute(re.sub(r"\$(\d+)", r"?\1", sql), match.values)
+
+    names = getattr(conn, "prepared", None)
+    if names is None:
+        names = set()  # plain psycopg2 connection: prepare for this call only
+    cur = conn.cursor()
+    execute = f"EXECUTE {match.name} ({', '.join(['%s'] * len(match.values))})"
+    if match.name in names:
+        try:
+            cur.execute(execute, match.values)
+            return cur
+        except Exception as e:
+            # 26000: dropped behind our back (DISCARD elsewhere); prepare again
+            if getattr(e, "pgcode", None) != "26000":
+                raise
+            conn.rollback()
+            names.discard(match.name)
+            _set_timeout(conn, timeout_ms)
+            cur = conn.cursor()
+    try:
+        cur.execute(f"PREPARE {match.name} AS {sql}")
+    except Exception as e:
+        # 42P05: already prepared in this session
+        if getattr(e, "pgcode", None) != "42P05":
+            raise
+        conn.rollback()
+        _set_timeout(conn, timeout_ms)
+        cur = conn.cursor()
+    names.add(match.name)
+    cur.execute(execute, match.values)
+    return cur
@@ -0,0 +1,78 @@
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from sqlkit.cancel import current_tracker, tracking
+
+TOOL_TIMEOUT = float(os.getenv("TOOL_TIMEOUT", "60"))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=int(os.getenv("TOOL_WORKERS", "8")),
+                                           thread_name_prefix="tool")
+        return _executor
+
+
+def _timed_invoke(tool, args, tracker=None):
+    start = time.perf_counter()
+    if tracker is None:
+        result = tool.invoke(args)
+    else:
+        with tracking(tracker):
+            result = tool.invoke(args)
+    return result, time.perf_counter() - start
+
+
+def run_tool_calls(tool_calls, tools, timeouts=None, default_timeout=None):
+    """Run every tool call of one model response concurrently.
+
+    tools maps tool name -> LangChain tool; timeouts maps tool name -> seconds
+    (default TOOL_TIMEOUT). Returns [{"call", "name", "result", "seconds"}] in
+    the same order as tool_calls. Errors and timeouts become error strings so
+    the model can react to them. When the caller has a current QueryTracker
+    (sqlkit.cancel), each call runs under a child of it and a timed-out
+    call's statements are cancelled; otherwise it keeps running in the
+    background and its result is discarded.
+    """
+    timeouts = timeouts or {}
+    default_timeout = TOOL_TIMEOUT if default_timeout is None else default_timeout
+    executor = _get_executor()
+
+    parent = current_tracker()
+    started = time.perf_counter()
+    pending = []
+    for call in tool_calls:
+        tool = tools.get(call["name"])
+        tracker = parent.child() if parent is not None else None
+        # Run in a copy of the caller's context so tools see its context vars (e.g. the session)
+        future = executor.submit(contextvars.copy_context().run, _timed_invoke, tool,
+                                 call.get("args", {}), tracker) if tool else None
+        pending.append((call, future, tracker))
+
+    outcomes = []
+    for call, future, tracker in pending:
+        name = call["name"]
+        if future is None:
+            outcomes.append({"call": call, "name": name, "result": f"Unknown tool: {name}", "seconds": 0.0})
+            continue
+        # Calls run in parallel, so each waits only for what is left of its own budget
+        remaining = started + timeouts.get(name, default_timeout) - time.perf_counter()
+        try:
+            result, seconds = future.result(timeout=max(remaining, 0))
+        except TimeoutError:
+            if tracker is not None:
+                # Frees its pooled connection; the tool sees cancelled and writes nothing
+                tracker.cancel()
+            result, seconds = f"Error: {name} timed out", time.perf_counter() - started
+        except Exception as e:
+            result, seconds = f"Error: {name} failed: {e}", time.perf_counter() - started
+        outcomes.append({"call": call, "name": name, "result": result, "seconds": seconds})
+    return outcomes
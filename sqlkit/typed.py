@@ -0,0 +1,84 @@
+"""Typed fetch: numeric and temporal columns as dense NumPy dtypes.
+
+PostgreSQL connections get a NUMERIC -> float typecaster (register_typecasters),
+so rows never carry Decimal objects. typed_frame() then builds a DataFrame
+whose numeric columns are float64/int64 and whose date/timestamp columns are
+datetime64, using the cursor.description type OIDs when they are known and
+the first non-null value otherwise (SQLite, cached results).
+"""
+from datetime import date, datetime
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+# pg_type OIDs
+NUMERIC_OIDS = {1700}                 # numeric / decimal
+FLOAT_OIDS = {700, 701}               # float4, float8
+INT_OIDS = {20, 21, 23}               # int8, int2, int4
+DATE_OIDS = {1082, 1114, 1184}        # date, timestamp, timestamptz
+
+
+def register_typecasters(conn):
+    """Decode NUMERIC straight to float on this psycopg2 connection."""
+    import psycopg2.extensions
+
+    def cast_numeric(value, cur):
+        return None if value is None else float(value)
+
+    numeric = psycopg2.extensions.new_type(tuple(NUMERIC_OIDS), "NUMERIC_FLOAT", cast_numeric)
+    psycopg2.extensions.register_type(numeric, conn)
+    return conn
+
+
+def column_kinds(description):
+    """"float", "int", "datetime" or None per column, from the type OIDs of a
+    cursor description (SQLite leaves type_code empty, so all None)."""
+    kinds = []
+    for col in description:
+        oid = col[1]
+        if oid in NUMERIC_OIDS or oid in FLOAT_OIDS:
+            kinds.append("float")
+        elif oid in INT_OIDS:
+            kinds.append("int")
+        elif oid in DATE_OIDS:
+            kinds.append("datetime")
+        else:
+            kinds.append(None)
+    return kinds
+
+
+def _infer_kind(series):
+    sample = series.dropna()
+    if sample.empty:
+        return None
+    first = sample.iloc[0]
+    if isinstance(first, (Decimal, float)):
+        return "float"
+    if isinstance(first, (date, datetime)):
+        return "datetime"
+    return None
+
+
+def typed_frame(rows, columns, kinds=None):
+    """DataFrame of `rows` with numeric columns as float64/int64 and temporal
+    columns as datetime64."""
+    df = pd.DataFrame.from_records(rows, columns=columns)
+    kinds = kinds or [None] * len(columns)
+    for i, kind in enumerate(kinds):
+        series = df.iloc[:, i]
+        if series.dtype != object:
+            continue
+        kind = kind or _infer_kind(series)
+        if kind == "float":
+            df.isetitem(i, np.array(series.to_numpy(), dtype=np.float64))
+        elif kind == "int" and not series.isna().any():
+            df.isetitem(i, series.to_numpy().astype(np.int64))
+        elif kind == "datetime":
+            df.isetitem(i, pd.to_datetime(series, utc=_is_aware(series)))
+    return df
+
+
+def _is_aware(series):
+    sample = series.dropna()
+    return not sample.empty and isinstance(sample.iloc[0], datetime) and sample.iloc[0].tzinfo is not None
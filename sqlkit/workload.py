@@ -0,0 +1,192 @@
+"""Append-only workload log: one row per executed statement. The week2
+agent also writes one row without SQL per question, carrying its LLM time.
+
+Agents call get_workload_log().record(...) on the hot path; the row goes on
+a queue and a background thread writes batches to a SQLite file
+(WORKLOAD_LOG, default workload.sqlite3; empty disables logging).
+
+Report the slowest and most frequent statements:
+
+    python -m sqlkit.workload --path workload.sqlite3 --top 10
+"""
+import argparse
+import atexit
+import hashlib
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from sqlkit.sqltext import statement_shape
+
+FIELDS = ("ts", "agent", "session", "question", "sql", "shape", "shape_hash", "sql_source",
+          "result_cached", "llm_ms", "db_ms", "rows", "bytes", "error")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS queries (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    agent TEXT,
+    session TEXT,
+    question TEXT,
+    sql TEXT,
+    shape TEXT,
+    shape_hash TEXT,
+    sql_source TEXT,
+    result_cached INTEGER,
+    llm_ms REAL,
+    db_ms REAL,
+    rows INTEGER,
+    bytes INTEGER,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS queries_ts ON queries(ts);
+CREATE INDEX IF NOT EXISTS queries_shape ON queries(shape_hash);
+"""
+
+
+class WorkloadLog:
+    """Background writer for the workload log.
+
+    record() never touches the disk: rows are queued and written by one
+    thread in transactions of up to `batch_size` rows. If the queue is full
+    the row is dropped (and counted) rather than slowing the agent down.
+    """
+
+    def __init__(self, path="workload.sqlite3", batch_size=200, max_queue=10000):
+        self.path = path
+        self.batch_size = batch_size
+        self.dropped = 0
+        self.written = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        db = sqlite3.connect(path)
+        db.executescript(SCHEMA)
+        db.close()
+        self._thread = threading.Thread(target=self._writer, name="workload-log", daemon=True)
+        self._thread.start()
+
+    def record(self, agent, question=None, sql=None, sql_source=None, result_cached=False,
+               llm_ms=None, db_ms=None, rows=None, bytes=None, error=None, session=None):
+        shape = statement_shape(sql) if sql else None
+        row = (time.time(), agent, session, question, sql, shape,
+               hashlib.md5(shape.encode("utf-8")).hexdigest()[:16] if shape else None,
+               sql_source, int(bool(result_cached)), llm_ms, db_ms, rows, bytes, error)
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, timeout=5.0):
+        """Wait until everything recorded so far is on disk."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def _writer(self):
+        db = sqlite3.connect(self.path)
+        insert = f"INSERT INTO queries ({', '.join(FIELDS)}) VALUES ({', '.join('?' * len(FIELDS))})"
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with db:
+                    db.executemany(insert, batch)
+                self.written += len(batch)
+            except sqlite3.Error:
+                self.dropped += len(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+
+class _NullLog:
+    def record(self, *args, **kwargs):
+        pass
+
+    def flush(self, timeout=5.0):
+        pass
+
+
+_log = None
+_log_lock = threading.Lock()
+
+
+def get_workload_log():
+    """Process-wide workload log configured from WORKLOAD_LOG."""
+    global _log
+    with _log_lock:
+        if _log is None:
+            path = os.getenv("WORKLOAD_LOG", "workload.sqlite3")
+            _log = WorkloadLog(path) if path else _NullLog()
+            atexit.register(_log.flush)
+        return _log
+
+
+# ---------- reports ----------
+
+def slowest(db, top=10, since=None):
+    """Statement shapes by total database time."""
+    return db.execute("""
+        SELECT shape, COUNT(*) AS runs, SUM(db_ms) AS total_ms, AVG(db_ms) AS avg_ms,
+               MAX(db_ms) AS max_ms, AVG(rows) AS avg_rows, MIN(sql) AS example
+        FROM queries
+        WHERE shape IS NOT NULL AND db_ms IS NOT NULL AND ts >= ?
+        GROUP BY shape_hash ORDER BY total_ms DESC LIMIT ?
+    """, (since or 0, top)).fetchall()
+
+
+def most_frequent(db, top=10, since=None):
+    """Statement shapes by number of runs, with their cache and error rates."""
+    return db.execute("""
+        SELECT shape, COUNT(*) AS runs, AVG(result_cached) AS cached,
+               AVG(sql_source != 'llm') AS no_llm, SUM(error IS NOT NULL) AS errors,
+               AVG(db_ms) AS avg_ms, MIN(sql) AS example
+        FROM queries
+        WHERE shape IS NOT NULL AND ts >= ?
+        GROUP BY shape_hash ORDER BY runs DESC LIMIT ?
+    """, (since or 0, top)).fetchall()
+
+
+def totals(db, since=None):
+    return db.execute("""
+        SELECT COUNT(sql), COUNT(DISTINCT shape_hash), SUM(llm_ms), SUM(db_ms), SUM(rows), SUM(bytes)
+        FROM queries WHERE ts >= ?
+    """, (since or 0,)).fetchone()
+
+
+def _short(text, width=90):
+    text = " ".join((text or "").split())
+    return text if len(text) <= width else text[:width - 3] + "..."
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Slowest and most frequent statements in the workload log")
+    parser.add_argument("--path", default=os.getenv("WORKLOAD_LOG", "workload.sqlite3"))
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--hours", type=float, default=None, help="only the last N hours")
+    args = parser.parse_args()
+
+    since = time.time() - args.hours * 3600 if args.hours else None
+    db = sqlite3.connect(args.path)
+    n, shapes, llm_ms, db_ms, rows, size = totals(db, since)
+    print(f"{n} statements, {shapes} distinct shapes, LLM {(llm_ms or 0) / 1000:.1f}s, "
+          f"DB {(db_ms or 0) / 1000:.1f}s, {rows or 0} rows, {(size or 0) / 1024:.1f} KB")
+
+    print("\nSlowest (by total DB time)")
+    print(f"{'runs':>6}{'total ms':>11}{'avg ms':>9}{'max ms':>9}{'avg rows':>10}  statement")
+    for _, runs, total_ms, avg_ms, max_ms, avg_rows, example in slowest(db, args.top, since):
+        print(f"{runs:>6}{total_ms:>11.0f}{avg_ms:>9.1f}{max_ms:>9.1f}{avg_rows or 0:>10.0f}  {_short(example)}")
+
+    print("\nMost frequent")
+    print(f"{'runs':>6}{'cached':>8}{'no LLM':>8}{'errors':>8}{'avg ms':>9}  statement")
+    for _, runs, cached, no_llm, errors, avg_ms, example in most_frequent(db, args.top, since):
+        print(f"{runs:>6}{cached or 0:>8.0%}{no_llm or 0:>8.0%}{errors:>8}{avg_ms or 0:>9.1f}  {_short(example)}")
+
+
+if __name__ == "__main__":
+    main()
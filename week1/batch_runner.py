@@ -0,0 +1,112 @@
+"""Run a file of questions through the text-to-SQL agent.
+
+Usage:
+    python batch_runner.py questions.txt -o results.jsonl --llm-workers 4 --db-workers 4
+
+questions.txt has one question per line (blank lines and # comments are
+skipped). Each result line has the question, SQL, row count, error and
+per-stage timings in seconds.
+"""
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import text_to_sql_agent as agent
+from sqlkit.pool import get_pool
+from sqlkit.safety import check_sql
+
+
+def load_questions(path):
+    with open(path, encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.strip().startswith('#')]
+
+
+def run_question(question, llm_slots, db_slots, include_rows=False):
+    """generate SQL -> validate -> execute, timing each stage"""
+    record = {'question': question, 'sql': None, 'rows': 0, 'error': None, 'timings': {}}
+    timings = record['timings']
+    start = time.perf_counter()
+    
+    with llm_slots:
+        t = time.perf_counter()
+        hits_before = agent.sql_cache.hits
+        sql = agent.text_to_sql(question)
+        timings['llm'] = time.perf_counter() - t
+    record['sql'] = sql
+    # Approximate under concurrency: another thread may also have hit
+    record['sql_cache_hit'] = agent.sql_cache.hits > hits_before
+    
+    if not sql:
+        record['error'] = 'Failed to generate SQL'
+    else:
+        t = time.perf_counter()
+        ok, reason = check_sql(sql)
+        timings['validate'] = time.perf_counter() - t
+        
+        if not ok:
+            record['error'] = f'Unsafe query: {reason}'
+        else:
+            with db_slots:
+                t = time.perf_counter()
+                result = agent.execute_query(sql)
+                timings['db'] = time.perf_counter() - t
+            
+            if 'error' in result:
+                record['error'] = result['error']
+            else:
+                record['rows'] = result['count']
+                record['result_cache_hit'] = bool(result.get('cached'))
+                if include_rows:
+                    record['data'] = result['data']
+    
+    timings['total'] = time.perf_counter() - start
+    return record
+
+
+def run_batch(questions, output, llm_workers=4, db_workers=4, include_rows=False):
+    """Run questions with at most llm_workers LLM calls and db_workers queries in flight"""
+    llm_slots = threading.BoundedSemaphore(llm_workers)
+    db_slots = threading.BoundedSemaphore(db_workers)
+    # Size the shared pool before the agent first touches it
+    get_pool(agent.DB_CONFIG, max_size=max(db_workers, 1))
+    
+    write_lock = threading.Lock()
+    summary = {'questions': len(questions), 'ok': 0, 'failed': 0}
+    start = time.perf_counter()
+    
+    with open(output, 'w', encoding='utf-8') as out:
+        def work(index, question):
+            record = run_question(question, llm_slots, db_slots, include_rows)
+            record['index'] = index
+            with write_lock:
+                out.write(json.dumps(record, default=str) + '\n')
+                out.flush()
+                summary['failed' if record['error'] else 'ok'] += 1
+        
+        with ThreadPoolExecutor(max_workers=llm_workers + db_workers) as pool:
+            for future in [pool.submit(work, i, q) for i, q in enumerate(questions)]:
+                future.result()
+    
+    summary['seconds'] = time.perf_counter() - start
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk text-to-SQL runner')
+    parser.add_argument('questions', help='file with one question per line')
+    parser.add_argument('-o', '--output', default='batch_results.jsonl')
+    parser.add_argument('--llm-workers', type=int, default=4, help='max concurrent LLM calls')
+    parser.add_argument('--db-workers', type=int, default=4, help='max concurrent DB queries')
+    parser.add_argument('--include-rows', action='store_true', help='write result rows too')
+    args = parser.parse_args()
+    
+    questions = load_questions(args.questions)
+    print(f"Running {len(questions)} questions...")
+    summary = run_batch(questions, args.output, args.llm_workers, args.db_workers, args.include_rows)
+    print(f"Done: {summary['ok']} ok, {summary['failed']} failed in {summary['seconds']:.1f}s -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
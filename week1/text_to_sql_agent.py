@@ -1,47 +1,63 @@
 import os
+import sys
+import time
 from dotenv import load_dotenv
 import google.generativeai as genai
-import psycopg2
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from sqlkit.cost_gate import CostGateError, guard_query
+from sqlkit.export import export_query
+from sqlkit.materialize import rewrite_materialized
+from sqlkit.pool import get_pool
+from sqlkit.result_cache import CachingStream, RowSet, db_namespace, get_result_cache
+from sqlkit.safety import check_sql
+from sqlkit.schema import schema_fingerprint
+from sqlkit.schema_index import get_schema_index
+from sqlkit.sql_cache import SQLCache, cache_version
+from sqlkit.streaming import QueryStream, as_batches
+from sqlkit.templates import TemplateCache, execute_prepared
+from sqlkit.typed import typed_frame
+from sqlkit.workload import get_workload_log
 
 load_dotenv()
 
 genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
 
+DB_CONFIG = {
+    "host": os.getenv("DB_HOST"),
+    "port": os.getenv("DB_PORT"),
+    "database": os.getenv("DB_NAME"),
+    "user": os.getenv("DB_USER"),
+    "password": os.getenv("DB_PASSWORD")
+}
+
+DB_NAMESPACE = db_namespace(DB_CONFIG)
+result_cache = get_result_cache()
+
 def get_db_connection():
-    """Connect to PostgreSQL database"""
+    """Check out a pooled PostgreSQL connection (return it with release_db_connection)"""
     try:
-        conn = psycopg2.connect(
-            host=os.getenv("DB_HOST"),
-            port=os.getenv("DB_PORT"),
-            database=os.getenv("DB_NAME"),
-            user=os.getenv("DB_USER"),
-            password=os.getenv("DB_PASSWORD")
-        )
-        return conn
+        return get_pool(DB_CONFIG).getconn()
     except Exception as e:
         print(f"Database connection failed: {e}")
         return None
+
+def release_db_connection(conn, discard=False):
+    """Return a connection to the pool"""
+    get_pool(DB_CONFIG).putconn(conn, discard=discard)
     
 def is_safe_query(sql):
-    """Check if SQL query is safe (only SELECT allowed)"""
-    sql_upper = sql.upper().strip()
-    dangerous_keywords = ['DELETE', 'DROP', 'INSERT', 'UPDATE', 'ALTER', 'TRUNCATE', 'EXEC', 'EXECUTE']
-    
-    if not sql_upper.startswith('SELECT'):
-        return False
-    
-    for keyword in dangerous_keywords:
-        if keyword in sql_upper:
-            return False
-    
-    return True
+    """Check if SQL query is safe (single read-only SELECT / WITH statement)"""
+    return check_sql(sql)[0]
 
-SYSTEM_PROMPT = """You are a PostgreSQL expert. Generate safe SQL queries.
-
-Database Schema:
+SCHEMA_SECTION = """Database Schema:
 1. customers table: id, name, email, city, state, signup_date
 2. products table: id, name, category, price, stock
-3. orders table: id, customer_id, product_id, quantity, total_amount, order_date, status
+3. orders table: id, customer_id, product_id, quantity, total_amount, order_date, status"""
+
+SYSTEM_PROMPT = f"""You are a PostgreSQL expert. Generate safe SQL queries.
+
+{SCHEMA_SECTION}
 
 Rules:
 - Only generate SELECT queries
@@ -53,11 +69,61 @@ Rules:
 conversation_history = []
 last_query_result = None
 
-def text_to_sql(question, context=""):
+sql_cache = SQLCache(
+    os.getenv("SQL_CACHE_PATH", "sql_cache.sqlite3"),
+    max_entries=int(os.getenv("SQL_CACHE_SIZE", "1000")),
+    ttl=float(os.getenv("SQL_CACHE_TTL", str(7 * 24 * 3600)))
+)
+
+template_cache = TemplateCache(os.getenv("SQL_CACHE_PATH", "sql_cache.sqlite3"))
+_vocabulary_loaded = False
+
+def match_template(question, version):
+    """Stored template matching this question with new entity values, or None"""
+    global _vocabulary_loaded
+    if version is None:
+        return None
+    if not _vocabulary_loaded:
+        try:
+            template_cache.vocabulary.load_columns(get_pool(DB_CONFIG))
+        except Exception as e:
+            print(f"Could not load template vocabulary: {e}")
+        _vocabulary_loaded = True
+    return template_cache.match(question, version)
+
+def current_cache_version():
+    """Version of SYSTEM_PROMPT + live schema, or None if the schema can't be read"""
+    schema_fp = schema_fingerprint(get_pool(DB_CONFIG))
+    if schema_fp is None:
+        return None
+    return cache_version(SYSTEM_PROMPT, schema_fp)
+
+def system_prompt_for(question):
+    """SYSTEM_PROMPT, with the schema narrowed to the relevant tables once the
+    database has more than SCHEMA_TOP_K tables"""
+    try:
+        schema = get_schema_index(get_pool(DB_CONFIG)).relevant_schema(question)
+    except Exception:
+        schema = None
+    if schema is None:
+        return SYSTEM_PROMPT
+    return SYSTEM_PROMPT.replace(SCHEMA_SECTION, schema)
+
+def text_to_sql(question, context="", info=None):
+    """Generated SQL for the question (None on failure). If `info` is a dict it
+    gets "sql_source" ("cache" or "llm") and "llm_ms" for the workload log."""
+    info = {} if info is None else info
+    version = current_cache_version()
+    if version is not None:
+        cached = sql_cache.get(question, context, version)
+        if cached:
+            info["sql_source"] = "cache"
+            return cached
+    
     try:
         model = genai.GenerativeModel(
             "gemini-2.5-flash",
-            system_instruction=SYSTEM_PROMPT
+            system_instruction=system_prompt_for(question)
         )
         
         if context:
@@ -69,116 +135,231 @@ If the user uses words like 'they', 'it', apply previous WHERE clause."""
         else:
             full_prompt = question
         
+        start = time.perf_counter()
         response = model.generate_content(full_prompt)
+        info["sql_source"] = "llm"
+        info["llm_ms"] = (time.perf_counter() - start) * 1000
         sql = response.text.strip().replace('```sql', '').replace('```', '').strip()
+        if version is not None and sql:
+            sql_cache.put(question, context, version, sql)
         return sql
 
     except Exception as e:
         print(f"Error generating SQL: {e}")
         return None
     
-def execute_query(sql):
-    if not is_safe_query(sql):
-        return {"error": "Unsafe query. Only SELECT allowed."}
+def execute_query(sql, stream=False, batch_size=None, confirm=None):
+    """Run a SELECT. With stream=True the rows come back as a lazy QueryStream
+    (server-side cursor, fetched batch_size rows at a time) instead of a list.
+    Expensive plans are rejected unless confirm(plan) returns True."""
+    ok, reason = check_sql(sql)
+    if not ok:
+        return {"error": f"Unsafe query. Only SELECT allowed. ({reason})"}
+    
+    cached = result_cache.get(sql, namespace=DB_NAMESPACE)
+    if cached is not None:
+        columns, rows = cached
+        if stream:
+            return {"success": True, "stream": RowSet(columns, rows), "columns": columns, "cached": True}
+        results = [dict(zip(columns, row)) for row in rows]
+        return {"success": True, "data": results, "count": len(results), "cached": True}
+    
+    if stream:
+        try:
+            rows = QueryStream(get_pool(DB_CONFIG), rewrite_materialized(DB_CONFIG, sql), batch_size=batch_size,
+                               prepare=lambda conn, q: guard_query(conn, q, confirm=confirm))
+        except CostGateError as e:
+            return {"error": f"Query rejected: {e}"}
+        except Exception as e:
+            return {"error": f"Query execution failed: {e}"}
+        rows = CachingStream(result_cache, sql, rows, namespace=DB_NAMESPACE)
+        return {"success": True, "stream": rows, "columns": rows.columns}
     
     conn = get_db_connection()
     if not conn:
         return {"error": "Database connection failed"}
     
     try:
+        run_sql = guard_query(conn, rewrite_materialized(DB_CONFIG, sql), confirm=confirm)
         cursor = conn.cursor()
-        cursor.execute(sql)
+        cursor.execute(run_sql)
         
         columns = [desc[0] for desc in cursor.description]
         rows = cursor.fetchall()
         
         cursor.close()
-        conn.close()
+        release_db_connection(conn)
+        result_cache.put(sql, columns, rows, namespace=DB_NAMESPACE)
         
         results = [dict(zip(columns, row)) for row in rows]
         
         return {"success": True, "data": results, "count": len(results)}
         
+    except CostGateError as e:
+        release_db_connection(conn)
+        return {"error": f"Query rejected: {e}"}
     except Exception as e:
-        conn.close()
+        release_db_connection(conn, discard=bool(getattr(conn, 'closed', False)))
+        return {"error": f"Query execution failed: {e}"}
+
+def execute_template(match, confirm=None):
+    """Run a template match as a prepared statement (no LLM call). Same result
+    shape as execute_query(sql, stream=True), and the same cost gate and
+    summary-table rewrite."""
+    ok, reason = check_sql(match.sql)
+    if not ok:
+        return {"error": f"Unsafe query. Only SELECT allowed. ({reason})"}
+    
+    cached = result_cache.get(match.sql, namespace=DB_NAMESPACE)
+    if cached is not None:
+        columns, rows = cached
+        return {"success": True, "stream": RowSet(columns, rows), "columns": columns, "cached": True}
+    
+    conn = get_db_connection()
+    if not conn:
+        return {"error": "Database connection failed"}
+    
+    try:
+        rewritten = rewrite_materialized(DB_CONFIG, match.sql)
+        run_sql = guard_query(conn, rewritten, confirm=confirm)
+        if rewritten != match.sql:
+            cursor = conn.cursor()
+            cursor.execute(run_sql)
+        else:
+            cursor = execute_prepared(conn, match)
+        columns = [desc[0] for desc in cursor.description]
+        rows = cursor.fetchall()
+        cursor.close()
+        release_db_connection(conn)
+        result_cache.put(match.sql, columns, rows, namespace=DB_NAMESPACE)
+        return {"success": True, "stream": RowSet(columns, rows), "columns": columns}
+    except CostGateError as e:
+        release_db_connection(conn)
+        return {"error": f"Query rejected: {e}"}
+    except Exception as e:
+        release_db_connection(conn, discard=bool(getattr(conn, 'closed', False)))
         return {"error": f"Query execution failed: {e}"}
 
 def export_results(data, format='csv', filename='results'):
+    """Export a list of row dicts or a QueryStream, one batch at a time"""
     import pandas as pd
     from datetime import datetime
     
-    if not data:
+    columns, batches = as_batches(data)
+    if not columns:
         print("No data to export")
         return
     
-    df = pd.DataFrame(data)
-    
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     
     try:
         if format == 'csv':
             file = f"{filename}_{timestamp}.csv"
-            df.to_csv(file, index=False)
+            with open(file, 'w', newline='', encoding='utf-8') as f:
+                for i, batch in enumerate(batches):
+                    pd.DataFrame(batch, columns=columns).to_csv(f, index=False, header=(i == 0))
         elif format == 'json':
             file = f"{filename}_{timestamp}.json"
-            df.to_json(file, orient='records', indent=2)
+            with open(file, 'w', encoding='utf-8') as f:
+                f.write('[')
+                for i, batch in enumerate(batches):
+                    chunk = pd.DataFrame(batch, columns=columns).to_json(orient='records')
+                    if i:
+                        f.write(',')
+                    f.write(chunk[1:-1])
+                f.write(']')
         elif format == 'excel':
+            from openpyxl import Workbook
             file = f"{filename}_{timestamp}.xlsx"
-            df.to_excel(file, index=False)
+            # write_only workbooks flush rows instead of keeping every cell
+            wb = Workbook(write_only=True)
+            ws = wb.create_sheet()
+            ws.append(columns)
+            for batch in batches:
+                for row in batch:
+                    ws.append([v if isinstance(v, (int, float, str)) or v is None else str(v) for v in row])
+            wb.save(file)
+        else:
+            return
         
         print(f"Exported to: {file}")
     except Exception as e:
         print(f"Export failed: {e}")
 
+def export_sql(sql, format='csv', filename='results'):
+    """Stream a query straight from the database into a csv/jsonl/parquet file.
+    Guarded like execute_query (the plan was already confirmed), so the file
+    holds the rows that were shown."""
+    from datetime import datetime
+    
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    file = f"{filename}_{timestamp}.{format}"
+    
+    try:
+        stats = export_query(get_pool(DB_CONFIG), rewrite_materialized(DB_CONFIG, sql), format, file,
+                             prepare=lambda conn, q: guard_query(conn, q, confirm=lambda plan: True))
+        print(f"Exported to: {file} ({stats['rows']} rows, {stats['rows_per_sec']:.0f} rows/sec)")
+    except CostGateError as e:
+        print(f"Export rejected: {e}")
+    except Exception as e:
+        print(f"Export failed: {e}")
+
 def generate_chart(data, chart_type='bar'):
-    import matplotlib.pyplot as plt
+    """Chart the first column against the first numeric column.
+    Only those two columns are kept while the rows are read batch by batch."""
     import pandas as pd
     from datetime import datetime
+    from sqlkit.charts import render_chart
     
-    if not data or len(data) < 2:
-        print("Not enough data for chart")
-        return
-    
-    df = pd.DataFrame(data)
+    columns, batches = as_batches(data)
+    kinds = getattr(data, 'kinds', None)
     
-    numeric_cols = df.select_dtypes(include=['int64', 'float64']).columns
+    x_col = y_col = None
+    parts = []
+    for batch in batches:
+        # numeric columns arrive as float64, dates as datetime64
+        chunk = typed_frame(batch, columns, kinds)
+        if y_col is None:
+            numeric_cols = chunk.select_dtypes(include='number').columns
+            if len(numeric_cols) == 0:
+                print("No numeric data to visualize")
+                return
+            x_col, y_col = columns[0], numeric_cols[0]
+        parts.append(chunk[[x_col, y_col]] if x_col != y_col else chunk[[x_col]])
     
-    if len(numeric_cols) == 0:
-        print("No numeric data to visualize")
+    if not parts or sum(len(p) for p in parts) < 2:
+        print("Not enough data for chart")
         return
     
+    df = pd.concat(parts, ignore_index=True)
+    
     try:
-        x_col = df.columns[0]
-        y_col = numeric_cols[0]
-        
-        plt.figure(figsize=(10, 6))
-        
-        if chart_type == 'bar':
-            plt.bar(df[x_col].astype(str), df[y_col])
-        elif chart_type == 'line':
-            plt.plot(df[x_col].astype(str), df[y_col], marker='o')
-        elif chart_type == 'pie':
-            plt.pie(df[y_col], labels=df[x_col].astype(str), autopct='%1.1f%%')
-        
-        plt.title(f'{y_col} by {x_col}')
-        plt.xlabel(x_col)
-        plt.ylabel(y_col)
-        plt.xticks(rotation=45, ha='right')
-        plt.tight_layout()
-        
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         filename = f"chart_{timestamp}.png"
         
-        plt.savefig(filename)
-        print(f"Chart saved: {filename}")
-        plt.close()
+        # Downsampled to CHART_MAX_POINTS and drawn in a worker process
+        future, strategy = render_chart(df[x_col], df[y_col], chart_type, filename,
+                                        title=f'{y_col} by {x_col}', xlabel=x_col, ylabel=y_col)
+        print(f"Rendering chart ({strategy}) in the background...")
+        future.add_done_callback(_report_chart)
         
     except Exception as e:
         print(f"Chart generation failed: {e}")
 
+def _report_chart(future):
+    try:
+        print(f"\nChart saved: {future.result()}")
+    except Exception as e:
+        print(f"\nChart generation failed: {e}")
+
+def confirm_expensive(plan):
+    """Ask before running a query the planner thinks is expensive"""
+    answer = input(f"Estimated cost {plan['cost']:.0f}, ~{plan['rows']:.0f} rows. Run anyway? (y/n): ")
+    return answer.strip().lower() == 'y'
+
 def main():
     print("Text-to-SQL Agent")
-    print("Type 'exit' to quit\n")
+    print("Type 'exit' to quit, 'stats' for cache stats\n")
     
     while True:
         question = input("You: ").strip()
@@ -187,6 +368,13 @@ def main():
             print("Goodbye")
             break
         
+        if question.lower() == 'stats':
+            print(f"SQL cache: {sql_cache.stats()}")
+            print(f"Template cache: {template_cache.stats()}")
+            print(f"Result cache: {result_cache.stats()}")
+            print(f"Schema pruning: {get_schema_index(get_pool(DB_CONFIG)).last_report}\n")
+            continue
+        
         if question.lower() == 'clear':
             conversation_history.clear()
             last_query_result = None
@@ -205,37 +393,90 @@ def main():
 Previous SQL: {last_item['sql']}
 Previous results: {last_item['result_count']}"""
         
-        sql = text_to_sql(question, context)
-        if not sql:
-            print("Failed to generate SQL\n")
-            continue
-        
-        print(f"SQL: {sql}\n")
+        # Templates only cover standalone questions; follow-ups need the LLM
+        version = current_cache_version() if not context else None
+        match = match_template(question, version)
+        info = {"sql_source": "template"}
+        if match:
+            sql = match.sql
+            print(f"SQL (template): {sql}\n")
+            print("Executing query...")
+            db_start = time.perf_counter()
+            result = execute_template(match, confirm=confirm_expensive)
+        else:
+            sql = text_to_sql(question, context, info=info)
+            if not sql:
+                print("Failed to generate SQL\n")
+                continue
+            
+            print(f"SQL: {sql}\n")
+            
+            print("Executing query...")
+            db_start = time.perf_counter()
+            result = execute_query(sql, stream=True, confirm=confirm_expensive)
+            if "error" not in result and version is not None:
+                template_cache.learn(question, sql, version)
         
-        print("Executing query...")
-        result = execute_query(sql)
+        db_ms = (time.perf_counter() - db_start) * 1000
+        size = 0
+        if "error" in result:
+            count = 0
+            # Don't keep serving SQL that failed
+            sql_cache.discard(question, context)
+            print(result['error'], "\n")
+        else:
+            rows = result['stream']
+            columns, kinds = rows.columns, getattr(rows, "kinds", None)
+            batches = rows.batches()
+            i = 0
+            while True:
+                # Only the fetches count towards db_ms, not printing
+                fetch_start = time.perf_counter()
+                batch = next(batches, None)
+                db_ms += (time.perf_counter() - fetch_start) * 1000
+                if batch is None:
+                    break
+                # Same measure as week2: in-memory size of the typed frame
+                size += int(typed_frame(batch, columns, kinds).memory_usage(index=False).sum())
+                for row in batch:
+                    i += 1
+                    print(f"{i}. {dict(zip(columns, row))}")
+            count = rows.count
+            print(f"Rows: {count}")
+
+        # Written by a background thread
+        get_workload_log().record(
+            "week1", question=question, sql=sql, sql_source=info.get("sql_source"),
+            result_cached=result.get("cached", False), llm_ms=info.get("llm_ms"),
+            db_ms=db_ms, rows=count, bytes=size, error=result.get("error"))
         
         conversation_history.append({
             'question': question,
             'sql': sql,
-            'result_count': result.get('count', 0)
+            'result_count': count
         })
         
-        if "error" in result:
-            print(result['error'], "\n")
-        else:
-            print(f"Rows: {result['count']}")
-            for i, row in enumerate(result['data'], 1):
-                print(f"{i}. {row}")
-            
-            if result['count'] > 0:
-                export = input("\nExport (csv/json/excel/no): ").strip().lower()
-                if export in ['csv', 'json', 'excel']:
-                    export_results(result['data'], format=export)
+        if "error" not in result:
+            # Rows were streamed and dropped while printing, so export and
+            # chart re-read them from a fresh cursor (already confirmed)
+            if count > 0:
+                export = input("\nExport (csv/jsonl/parquet/json/excel/no): ").strip().lower()
+                if export in ['csv', 'jsonl', 'parquet']:
+                    export_sql(sql, format=export)
+                elif export in ['json', 'excel']:
+                    rerun = execute_query(sql, stream=True, confirm=lambda plan: True)
+                    if "error" in rerun:
+                        print(rerun['error'])
+                    else:
+                        export_results(rerun['stream'], format=export)
                 
                 chart = input("Chart (bar/line/pie/no): ").strip().lower()
                 if chart in ['bar', 'line', 'pie']:
-                    generate_chart(result['data'], chart_type=chart)
+                    rerun = execute_query(sql, stream=True, confirm=lambda plan: True)
+                    if "error" in rerun:
+                        print(rerun['error'])
+                    else:
+                        generate_chart(rerun['stream'], chart_type=chart)
             print()
 
 if __name__ == "__main__":
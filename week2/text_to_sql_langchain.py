@@ -7,8 +7,21 @@ if not hasattr(langchain, "verbose"):
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.tools import tool
 from dotenv import load_dotenv
-import psycopg2
 import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from sqlkit.cost_gate import CostGateError, guard_query, hit_limit
+from sqlkit.followup import answer_followup
+from sqlkit.materialize import rewrite_materialized
+from sqlkit.memory import ConversationMemory, llm_summarizer, result_note
+from sqlkit.pool import get_pool
+from sqlkit.result_cache import db_namespace, get_result_cache
+from sqlkit.safety import check_sql
+from sqlkit.schema import get_catalog
+from sqlkit.schema_index import get_schema_index
+from sqlkit.tool_runner import run_tool_calls
+from sqlkit.typed import typed_frame
 
 # Load env
 load_dotenv()
@@ -27,96 +40,104 @@ DB_CONFIG = {
     'user': 'postgres',
     'password': os.getenv('DB_PASSWORD')
 }
+result_cache = get_result_cache()
+
+# Rows of the last query, for follow-ups answered locally
+last_results = None
+last_truncated = False  # last_results may be cut off by a LIMIT
 
 # Tool 1: Get Schema
 @tool
-def get_schema() -> str:
-    """Get database schema with table and column information"""
-    conn = psycopg2.connect(**DB_CONFIG)
-    cur = conn.cursor()
-    
-    cur.execute("""
-        SELECT table_name, column_name, data_type 
-        FROM information_schema.columns 
-        WHERE table_schema = 'public'
-        ORDER BY table_name, ordinal_position
-    """)
-    
-    schema = cur.fetchall()
-    cur.close()
-    conn.close()
-    
-    result = "Database Schema:\n"
-    current_table = None
-    for table, column, dtype in schema:
-        if table != current_table:
-            result += f"\n{table}:\n"
-            current_table = table
-        result += f"  - {column} ({dtype})\n"
-    
-    return result
+def get_schema(question: str = "") -> str:
+    """Get database schema with table and column information. Pass the user's question to get only the relevant tables and their join keys"""
+    # Served from memory; rebuilt only when the catalog fingerprint changes
+    if question:
+        pruned = get_schema_index(get_pool(DB_CONFIG)).relevant_schema(question)
+        if pruned is not None:
+            return pruned
+    return get_catalog(get_pool(DB_CONFIG)).text()
 
 # Tool 2: Execute SQL (safe)
 @tool
 def execute_sql(sql: str) -> str:
     """Execute SELECT queries only. Returns results as text."""
-    if not sql.strip().upper().startswith('SELECT'):
-        return "Error: Only SELECT queries allowed"
+    global last_results, last_truncated
+    ok, reason = check_sql(sql)
+    if not ok:
+        return f"Error: Only SELECT queries allowed ({reason})"
     
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
-        cur = conn.cursor()
-        cur.execute(sql)
-        results = cur.fetchall()
-        cur.close()
-        conn.close()
+        cached = result_cache.get(sql, namespace=db_namespace(DB_CONFIG))
+        if cached is not None:
+            cols, results = cached
+        else:
+            with get_pool(DB_CONFIG).connection() as conn:
+                run_sql = guard_query(conn, rewrite_materialized(DB_CONFIG, sql))
+                cur = conn.cursor()
+                cur.execute(run_sql)
+                results = cur.fetchall()
+                cols = [d[0] for d in cur.description]
+                cur.close()
+            result_cache.put(sql, cols, results, namespace=db_namespace(DB_CONFIG))
         
         if not results:
+            last_results = None
             return "No results found"
         
+        last_results = typed_frame(results, cols)
+        last_truncated = hit_limit(sql, len(results))
         return f"Query returned {len(results)} rows. First result: {results[0]}"
+    except CostGateError as e:
+        return f"Query rejected: {e}. Add filters, aggregate, or narrow the joins."
     except Exception as e:
         return f"SQL Error: {str(e)}"
 
-llm_with_tools = llm.bind_tools([get_schema, execute_sql])
+TOOLS = {"get_schema": get_schema, "execute_sql": execute_sql}
+llm_with_tools = llm.bind_tools(list(TOOLS.values()))
 
-conversation_history = []
+# Recent turns verbatim, older ones summarized in the background
+memory = ConversationMemory(summarize=llm_summarizer(llm))
 
 def run_agent(question):
-    global conversation_history
-    
-    # Add user question to history
-    conversation_history.append({"role": "user", "content": question})
+    global last_results
+    # Refinements of the previous answer ("top 3", "sort by total") run on
+    # last_results in pandas, with no LLM or database round trip
+    local = answer_followup(question, last_results, last_truncated)
+    if local is not None:
+        last_results, how = local
+        print(f"[Local] {how}")
+        answer = last_results.to_string(index=False)
+        memory.add_turn(question, answer, [f"refined previous result locally ({how}) -> {len(last_results)} rows"])
+        return answer
     
-    # Use FULL conversation history
-    messages = conversation_history.copy()
+    # Summary + recent turns + the new question, within MEMORY_TOKENS
+    messages = memory.messages(question)
+    notes = []
     
     for iteration in range(5):
+        print(f"[Prompt] ~{memory.record_prompt(messages)} tokens")
         response = llm_with_tools.invoke(messages)
         
         if response.tool_calls:
-            tool_call = response.tool_calls[0]
-            tool_name = tool_call['name']
-            tool_args = tool_call['args']
-            
-            print(f"[Step {iteration+1}] Using tool: {tool_name}")
-            
-            if tool_name == 'get_schema':
-                result = get_schema.invoke(tool_args)
-            elif tool_name == 'execute_sql':
-                result = execute_sql.invoke(tool_args)
-                print(f"SQL executed: {tool_args.get('sql', '')[:100]}...")
-            
             messages.append({"role": "assistant", "content": response.content, "tool_calls": response.tool_calls})
-            messages.append({"role": "tool", "content": result, "tool_call_id": tool_call['id']})
+            
+            # Run every tool call from this response in parallel, keep their order
+            for outcome in run_tool_calls(response.tool_calls, TOOLS):
+                tool_call = outcome['call']
+                print(f"[Step {iteration+1}] Using tool: {outcome['name']} ({outcome['seconds']:.2f}s)")
+                if outcome['name'] == 'execute_sql':
+                    print(f"SQL executed: {tool_call['args'].get('sql', '')[:100]}...")
+                    # Only the SQL and row count are remembered, not the payload
+                    notes.append(result_note(tool_call['args'].get('sql', ''), outcome['result']))
+                messages.append({"role": "tool", "content": outcome['result'], "tool_call_id": tool_call['id']})
         else:
-            # Save assistant response to history
-            conversation_history.append({"role": "assistant", "content": response.content})
+            answer = response.content[0]['text'] if isinstance(response.content, list) else response.content
             
-            if isinstance(response.content, list):
-                return response.content[0]['text']
-            return response.content
+            # Save the turn to memory
+            memory.add_turn(question, answer, notes)
+            return answer
     
+    memory.add_turn(question, "Max iterations reached", notes)
     return "Max iterations reached"
 
 # Test
@@ -8,11 +8,34 @@ if not hasattr(langchain, "verbose"):
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.tools import tool
 from dotenv import load_dotenv
-import psycopg2
+import contextvars
 import os
+import select
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, wait
 import pandas as pd
 from datetime import datetime
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from sqlkit.cancel import QueryCancelled, QueryTracker, current_tracker, tracking
+from sqlkit.cost_gate import CostGateError, guard_query, hit_limit
+from sqlkit.digest import digest_frame
+from sqlkit.export import export_query
+from sqlkit.followup import answer_followup
+from sqlkit.materialize import rewrite_materialized
+from sqlkit.memory import ConversationMemory, llm_summarizer, result_note
+from sqlkit.pool import get_pool
+from sqlkit.result_cache import db_namespace, get_result_cache
+from sqlkit.safety import check_sql
+from sqlkit.saved_queries import get_saved_queries
+from sqlkit.schema import get_catalog
+from sqlkit.schema_index import get_schema_index
+from sqlkit.streaming import DEFAULT_BATCH_SIZE
+from sqlkit.tool_runner import run_tool_calls
+from sqlkit.typed import column_kinds, typed_frame
+from sqlkit.workload import get_workload_log
+
 load_dotenv()
 
 # LLM
@@ -29,122 +52,247 @@ DB_CONFIG = {
     "user": os.getenv("DB_USER", "postgres"),
     "password": os.getenv("DB_PASSWORD")
 }
+result_cache = get_result_cache()
+
+# ---------- SESSION STATE ----------
+
+
+class Session:
+    """One user's conversation: memory, last result frame and SQL, tool timings.
+
+    The CLI uses a single session; the HTTP service (text_to_sql_server.py)
+    keeps one per client. The LLM client and connection pool are shared.
+    """
+
+    def __init__(self, session_id="cli"):
+        self.id = session_id
+        # Recent turns verbatim, older ones summarized in the background
+        self.memory = ConversationMemory(summarize=llm_summarizer(llm))
+        self.last_results = None
+        self.last_sql = None
+        self.last_truncated = False  # last_results may be cut off by a LIMIT
+        self.tool_timings = []  # (tool name, seconds) for the last question
+        self.workload = []  # statements run for the current question, logged when it ends
+        self.llm_seconds = 0.0
+        self.last_used = time.monotonic()
+
+
+cli_session = Session()
+_current_session = contextvars.ContextVar("session", default=cli_session)
+
+
+def current_session() -> Session:
+    """Session of the question being answered (tools run in its context)."""
+    return _current_session.get()
 
-# Global state
-last_results = None
-last_sql = None
-conversation_history = []
 
 # ---------- TOOLS ----------
 
 
 @tool
-def get_schema() -> str:
-    """Return database schema: tables, columns and data types."""
-    conn = psycopg2.connect(**DB_CONFIG)
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT table_name, column_name, data_type
-        FROM information_schema.columnsA
-        WHERE table_schema='public'
-        ORDER BY table_name, ordinal_position
-    """)
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
-
-    output = ["Database Schema:"]
-    current_table = None
-    for table, col, dtype in rows:
-        if current_table != table:
-            output.append(f"\n{table}:")
-            current_table = table
-        output.append(f"  - {col} ({dtype})")
-    return "\n".join(output)
+def get_schema(question: str = "") -> str:
+    """Return database schema: tables, columns and data types. Pass the user's question to get only the relevant tables and their join keys."""
+    # Served from memory; rebuilt only when the catalog fingerprint changes
+    if question:
+        pruned = get_schema_index(get_pool(DB_CONFIG)).relevant_schema(question)
+        if pruned is not None:
+            return pruned
+    return get_catalog(get_pool(DB_CONFIG)).text()
 
 
 @tool
 def execute_sql(sql: str) -> str:
     """Execute a safe SELECT query and return results as formatted text."""
-    global last_results, last_sql
-
-    sql_clean = sql.strip().upper()
-    if not sql_clean.startswith("SELECT"):
-        return "Error: Only SELECT queries allowed."
-
+    session = current_session()
+    # Running queries of the question (or of this tool call), for progress and cancel
+    tracker = current_tracker() or QueryTracker()
+    entry = {"sql": sql, "result_cached": False}
+    session.workload.append(entry)
+
+    ok, reason = check_sql(sql)
+    if not ok:
+        entry["error"] = reason
+        return f"Error: Only SELECT queries allowed. ({reason})"
+
+    start = time.perf_counter()
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
-        cur = conn.cursor()
-        cur.execute(sql)
-        rows = cur.fetchall()
-        cols = [d[0] for d in cur.description]
-        cur.close()
-        conn.close()
+        cached = result_cache.get(sql, namespace=db_namespace(DB_CONFIG))
+        kinds = None
+        if cached is not None:
+            cols, rows = cached
+            entry["result_cached"] = True
+        else:
+            with get_pool(DB_CONFIG).connection() as conn, tracker.running(conn):
+                run_sql = guard_query(conn, rewrite_materialized(DB_CONFIG, sql))
+                cur = conn.cursor()
+                cur.execute(run_sql)
+                cols = [d[0] for d in cur.description]
+                kinds = column_kinds(cur.description)
+                # Fetched in batches so progress shows rows as they arrive
+                rows = []
+                while True:
+                    batch = cur.fetchmany(DEFAULT_BATCH_SIZE)
+                    if not batch:
+                        break
+                    rows.extend(batch)
+                    tracker.add_rows(len(batch))
+                    if tracker.cancelled:
+                        raise QueryCancelled("query cancelled")
+                cur.close()
+            result_cache.put(sql, cols, rows, namespace=db_namespace(DB_CONFIG))
+        entry["db_ms"] = (time.perf_counter() - start) * 1000
+        entry["rows"] = len(rows)
+
+        # Timed out (run_tool_calls cancelled it): the model has moved on, so
+        # leave the session's current result alone
+        if tracker.cancelled:
+            entry["error"] = "cancelled"
+            return "Cancelled."
 
         if not rows:
-            last_results = None
-            last_sql = None
+            session.last_results = None
+            session.last_sql = None
             return "No results."
 
-        last_results = pd.DataFrame(rows, columns=cols)
-        last_sql = sql
+        session.last_results = typed_frame(rows, cols, kinds)
+        session.last_sql = sql
+        session.last_truncated = hit_limit(sql, len(rows))
+        entry["bytes"] = int(session.last_results.memory_usage(index=False).sum())
 
-        return f"Rows: {len(rows)}\n\n{last_results.to_string()}"
+        # Token-budgeted digest; the full frame stays in last_results
+        return digest_frame(session.last_results)
 
+    except CostGateError as e:
+        entry["error"] = f"rejected: {e}"
+        return f"Query rejected: {e}. Add filters, aggregate, or narrow the joins."
     except Exception as e:
+        entry["db_ms"] = (time.perf_counter() - start) * 1000
+        if tracker.cancelled:
+            entry["error"] = "cancelled"
+            return "Cancelled by the user."
+        entry["error"] = str(e)
         return f"SQL Error: {str(e)}"
 
 
 # Bind tools
-llm_with_tools = llm.bind_tools([get_schema, execute_sql])
+TOOLS = {"get_schema": get_schema, "execute_sql": execute_sql}
+llm_with_tools = llm.bind_tools(list(TOOLS.values()))
 
 
 # ---------- AGENT LOOP ----------
-def run_agent(question: str) -> str:
-    conversation_history.append({"role": "user", "content": question})
-    messages = conversation_history.copy()
+
+
+def run_agent(question: str, session: Session = None, on_tool=None, tracker: QueryTracker = None) -> str:
+    """Answer one question in `session` (the CLI session by default).
+    on_tool(outcome) is called after each tool call, for progress reporting;
+    tracker.cancel() from another thread stops its queries and the loop."""
+    session = session or cli_session
+    tracker = tracker or QueryTracker()
+    session.last_used = time.monotonic()
+    session.workload = []
+    session.llm_seconds = 0.0
+    token = _current_session.set(session)
+    try:
+        with tracking(tracker):
+            return _run_agent(question, session, on_tool, tracker)
+    finally:
+        _current_session.reset(token)
+        session.last_used = time.monotonic()
+        _log_workload(question, session)
+
+
+def _log_workload(question, session):
+    """Workload log rows for a question (written in the background): one
+    without SQL that carries the question's LLM time, also for questions that
+    ran no SQL, and one per statement it ran with llm_ms left NULL."""
+    log = get_workload_log()
+    log.record("week2", question=question, sql_source="llm" if session.llm_seconds else "local",
+               llm_ms=session.llm_seconds * 1000, session=session.id)
+    for entry in session.workload:
+        log.record("week2", question=question, sql_source="llm", session=session.id, **entry)
+
+
+def _run_agent(question, session, on_tool, tracker):
+    memory = session.memory
+    session.tool_timings.clear()
+
+    # "top 3", "sort by total descending", ... are answered from last_results
+    # without the LLM or the database
+    local = answer_followup(question, session.last_results, session.last_truncated)
+    if local is not None:
+        session.last_results, how = local
+        session.last_sql = None  # exports now come from the refined frame
+        txt = digest_frame(session.last_results)
+        memory.add_turn(question, txt, [f"refined previous result locally ({how}) -> {len(session.last_results)} rows"])
+        return txt
+    messages = memory.messages(question)
+    notes = []
 
     for _ in range(5):
+        memory.record_prompt(messages)
+        start = time.perf_counter()
         response = llm_with_tools.invoke(messages)
+        session.llm_seconds += time.perf_counter() - start
+        if tracker.cancelled:
+            memory.add_turn(question, "Cancelled.", notes)
+            return "Cancelled."
 
         if response.tool_calls:
-            tool_call = response.tool_calls[0]
-            name = tool_call["name"]
-            args = tool_call.get("args", {})
-
-            if name == "get_schema":
-                result = get_schema.invoke(args)
-            elif name == "execute_sql":
-                result = execute_sql.invoke(args)
-            else:
-                result = f"Unknown tool: {name}"
-
             messages.append({
                 "role": "assistant",
                 "content": response.content,
                 "tool_calls": response.tool_calls
             })
-            messages.append({
-                "role": "tool",
-                "content": result,
-                "tool_call_id": tool_call.get("id")
-            })
+
+            # All tool calls of the response run in parallel; results keep their order
+            for outcome in run_tool_calls(response.tool_calls, TOOLS):
+                session.tool_timings.append((outcome["name"], outcome["seconds"]))
+                if on_tool is not None:
+                    on_tool(outcome)
+                if outcome["name"] == "execute_sql":
+                    # Only the SQL and row count are remembered, not the payload
+                    notes.append(result_note(outcome["call"]["args"].get("sql", ""), outcome["result"]))
+                messages.append({
+                    "role": "tool",
+                    "content": outcome["result"],
+                    "tool_call_id": outcome["call"].get("id")
+                })
+            if tracker.cancelled:
+                memory.add_turn(question, "Cancelled.", notes)
+                return "Cancelled."
             continue
 
         txt = response.content if isinstance(response.content, str) else response.content[0].get("text")
-        conversation_history.append({"role": "assistant", "content": txt})
+        memory.add_turn(question, txt, notes)
         return txt
 
+    memory.add_turn(question, "Max iterations reached.", notes)
     return "Max iterations reached."
 
 
 # ---------- EXPORT ----------
-def export_results(fmt="csv"):
+def export_results(fmt="csv", session=None):
+    session = session or cli_session
+    last_results, last_sql = session.last_results, session.last_sql
     if last_results is None:
         return
 
     ts = datetime.now().strftime("%Y%m%d_%H%M%S")
 
+    if fmt in ("csv", "jsonl", "parquet") and last_sql:
+        # Re-stream from the database instead of copying the DataFrame
+        fn = f"results_{ts}.{fmt}"
+        try:
+            # Same guard and summary rewrite as execute_sql, so the file
+            # holds the rows the answer was based on
+            stats = export_query(get_pool(DB_CONFIG), rewrite_materialized(DB_CONFIG, last_sql), fmt, fn,
+                                 prepare=guard_query)
+        except Exception as e:
+            print(f"Export failed: {e}")
+            return
+        print(f"{fn} ({stats['rows']} rows, {stats['rows_per_sec']:.0f} rows/sec)")
+        return
+
     if fmt == "csv":
         fn = f"results_{ts}.csv"
         last_results.to_csv(fn, index=False)
@@ -154,6 +302,17 @@ def export_results(fmt="csv"):
     elif fmt == "json":
         fn = f"results_{ts}.json"
         last_results.to_json(fn, orient="records", indent=2)
+    elif fmt == "jsonl":
+        # Frames without SQL behind them (refined or saved results)
+        fn = f"results_{ts}.jsonl"
+        last_results.to_json(fn, orient="records", lines=True, date_format="iso")
+    elif fmt == "parquet":
+        fn = f"results_{ts}.parquet"
+        try:
+            last_results.to_parquet(fn, index=False)
+        except ImportError as e:
+            print(f"Export failed: {e}")
+            return
     else:
         return
 
@@ -161,61 +320,154 @@ def export_results(fmt="csv"):
 
 
 # ---------- VISUALIZE ----------
-def visualize_results():
+def visualize_results(session=None):
+    last_results = (session or cli_session).last_results
     if last_results is None:
         return
 
     if len(last_results.columns) != 2:
         return
 
-    import matplotlib.pyplot as plt
+    from sqlkit.charts import render_chart
 
-    df = last_results.copy()
+    df = last_results
     x, y = df.columns[0], df.columns[1]
 
-    try:
-        df[y] = df[y].astype(str).str.replace("$", "").str.replace(",", "").astype(float)
-    except:
-        pass
+    # last_results is a typed frame: numeric columns are already float64/int64
+    if not pd.api.types.is_numeric_dtype(df[y]):
+        return
 
     df = df.dropna(subset=[y])
     if df.empty:
         return
 
-    df.plot(kind="bar", x=x, y=y, legend=False)
-    plt.tight_layout()
-
     ts = datetime.now().strftime("%Y%m%d_%H%M%S")
     fn = f"chart_{ts}.png"
-    plt.savefig(fn)
-    plt.close()
 
-    print(fn)
+    # Downsampled and drawn on the Agg backend in a worker process
+    future, _ = render_chart(df[x], df[y], "bar", fn, xlabel=x, ylabel=y)
+    future.add_done_callback(_print_chart)
+
+
+def _print_chart(future):
+    try:
+        print(future.result())
+    except Exception as e:
+        print(f"Chart failed: {e}")
 
 
 # ---------- HISTORY ----------
-def show_history():
-    if not conversation_history:
-        return
-    for i, m in enumerate(conversation_history, 1):
+def show_history(session=None):
+    memory = (session or cli_session).memory
+    if memory.summary:
+        print(f"[summary] {memory.summary[:180]}")
+    turns = [m for m in memory.messages() if m["role"] != "system"]
+    for i, m in enumerate(turns, 1):
         content = str(m['content'])[:180]
         print(f"[{i}] {m['role']}: {content}")
+    if memory.prompt_tokens:
+        print(f"Prompt tokens per call: {memory.prompt_tokens[-10:]}")
+
 
+def show_timings(session=None):
+    for name, seconds in (session or cli_session).tool_timings:
+        print(f"{name}: {seconds:.2f}s")
 
-def clear_history():
-    global conversation_history
-    conversation_history = []
+
+def clear_history(session=None):
+    (session or cli_session).memory.clear()
+
+
+# ---------- SAVED QUERIES ----------
+def save_query(name, session=None):
+    session = session or cli_session
+    if not session.last_sql:
+        print("No query to save.")
+        return
+    saved = get_saved_queries(DB_CONFIG)
+    stats = saved.save(name, session.last_sql)
+    watermark = saved.get(name)["watermark"]
+    print(f"Saved {name} ({stats['rows']} rows, "
+          f"{'refreshes from ' + watermark if watermark else 'full refreshes only'})")
+
+
+def run_saved(name, session=None):
+    """Refresh a saved query (only new rows when it has a watermark) and
+    make its result the current one for /export and /viz."""
+    session = session or cli_session
+    saved = get_saved_queries(DB_CONFIG)
+    try:
+        stats = saved.refresh(name)
+    except KeyError:
+        print(f"No saved query named {name}.")
+        return
+    session.last_results = saved.result(name)
+    session.last_truncated = False
+    # Exports come from the stored frame: re-running the SQL would add the
+    # default LIMIT and cut the report short
+    session.last_sql = None
+    print(session.last_results.head(20).to_string(index=False))
+    print(f"{stats['rows']} rows ({stats['mode']} refresh, {stats['fetched']} fetched, "
+          f"{stats['seconds'] * 1000:.0f} ms)")
 
 
 # ---------- CLI ----------
+# Questions run here so the prompt thread can show progress and cancel them.
+# A cancelled question may still be finishing its LLM call and writes to
+# cli_session when it does, so ask() waits for it before the next prompt.
+_agent_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="cli-agent")
+
+
+def _poll_command(timeout):
+    """A line typed while a question runs (e.g. /cancel), or None after `timeout`."""
+    try:
+        ready, _, _ = select.select([sys.stdin], [], [], timeout)
+    except (OSError, ValueError):
+        # No select() on console stdin (Windows): only Ctrl-C cancels
+        time.sleep(timeout)
+        return None
+    return sys.stdin.readline().strip() if ready else None
+
+
+def ask(question):
+    """Run the agent on a worker thread. While it works, show elapsed time and
+    rows fetched; Ctrl-C or /cancel cancels the running query."""
+    tracker = QueryTracker()
+    future = _agent_executor.submit(run_agent, question, cli_session, None, tracker)
+    try:
+        while True:
+            try:
+                return future.result(timeout=0.5)
+            except TimeoutError:
+                pass
+            print(f"\r... {tracker.elapsed:.1f}s, {tracker.rows} rows (/cancel to stop)", end="", flush=True)
+            if _poll_command(0.5) == "/cancel":
+                raise KeyboardInterrupt
+    except KeyboardInterrupt:
+        stopped = tracker.cancel()
+        print(f"\nCancelling{' (query stopped)' if stopped else ''}...", end="", flush=True)
+        while not future.done():
+            try:
+                wait([future], timeout=0.5)
+            except KeyboardInterrupt:
+                pass
+        print(" cancelled.")
+        return None
+    finally:
+        print("\r" + " " * 60 + "\r", end="", flush=True)
+
+
 def main():
     print("Ready")
     while True:
         try:
             q = input().strip()
-            if not q:
-                continue
+        except (KeyboardInterrupt, EOFError):
+            break
+        if not q:
+            continue
 
+        try:
             if q == "/exit":
                 break
             elif q.startswith("/export"):
@@ -229,17 +481,29 @@ def main():
             elif q == "/history":
                 show_history()
                 continue
+            elif q == "/timings":
+                show_timings()
+                continue
             elif q == "/clear":
                 clear_history()
                 continue
+            elif q.startswith("/save ") or q.startswith("/run "):
+                command, name = q.split(maxsplit=1)
+                if command == "/save":
+                    save_query(name)
+                else:
+                    run_saved(name)
+                continue
+            elif q == "/cancel":
+                print("Nothing running.")
+                continue
 
-            ans = run_agent(q)
-            print(ans)
+            ans = ask(q)
+            if ans is not None:
+                print(ans)
 
-        except KeyboardInterrupt:
-            break
-        except Exception:
-            break
+        except Exception as e:
+            print(f"Error: {e}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,316 @@
+"""HTTP service in front of the LangChain text-to-SQL agent (stdlib asyncio).
+
+    python week2/text_to_sql_server.py --port 8000
+
+Every client works in its own Session (memory, last result, timings) while
+the LLM client and the connection pool are shared. Idle sessions are evicted
+after SESSION_IDLE_SECONDS. Answers are streamed as NDJSON events.
+
+    POST   /sessions                 -> {"session_id": "..."}
+    POST   /sessions/<id>/ask        {"question": "..."} -> NDJSON stream:
+           {"event": "tool", ...}, {"event": "answer", ...},
+           {"event": "columns", ...}, {"event": "rows", ...}, {"event": "done", ...}
+    DELETE /sessions/<id>
+    GET    /health
+
+Unknown sessions get 404, and sessions dropped while a request waits get
+410. A client that disconnects mid-answer cancels its running queries.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import text_to_sql_langchain_cli as agent
+from sqlkit.cancel import QueryTracker
+from sqlkit.pool import get_pool
+
+SESSION_IDLE_SECONDS = float(os.getenv("SESSION_IDLE_SECONDS", "900"))
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", "1000"))
+AGENT_WORKERS = int(os.getenv("AGENT_WORKERS", "16"))
+STREAM_BATCH = int(os.getenv("STREAM_BATCH", "500"))
+MAX_BODY = 1024 * 1024
+DISCONNECT_POLL = 0.5  # seconds between checks for a client that hung up
+
+REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found",
+           405: "Method Not Allowed", 410: "Gone", 413: "Payload Too Large", 503: "Service Unavailable"}
+
+
+class SessionStore:
+    """Sessions by id, with one lock each so a session answers one question at a time."""
+
+    def __init__(self, idle_seconds=None, max_sessions=None):
+        self.idle_seconds = SESSION_IDLE_SECONDS if idle_seconds is None else idle_seconds
+        self.max_sessions = max_sessions or MAX_SESSIONS
+        self.sessions = {}
+        self.locks = {}
+        self.evicted = 0
+
+    def create(self):
+        if len(self.sessions) >= self.max_sessions:
+            # Make room by dropping the longest-idle session that isn't busy
+            idle = [s for s in self.sessions.values() if not self.locks[s.id].locked()]
+            if not idle:
+                return None
+            self.drop(min(idle, key=lambda s: s.last_used).id)
+            self.evicted += 1
+        session = agent.Session(uuid.uuid4().hex)
+        self.sessions[session.id] = session
+        self.locks[session.id] = asyncio.Lock()
+        return session
+
+    def get(self, session_id):
+        return self.sessions.get(session_id)
+
+    def drop(self, session_id):
+        self.locks.pop(session_id, None)
+        return self.sessions.pop(session_id, None) is not None
+
+    def evict_idle(self):
+        cutoff = time.monotonic() - self.idle_seconds
+        stale = [sid for sid, s in self.sessions.items()
+                 if s.last_used < cutoff and not self.locks[sid].locked()]
+        for sid in stale:
+            self.drop(sid)
+        self.evicted += len(stale)
+        return len(stale)
+
+    async def reap(self, interval=None):
+        while True:
+            await asyncio.sleep(interval or max(self.idle_seconds / 4, 1))
+            self.evict_idle()
+
+
+class AgentService:
+    def __init__(self, store=None, workers=None):
+        self.store = store or SessionStore()
+        # run_agent blocks (LLM call, database); each question gets a worker thread
+        self.executor = ThreadPoolExecutor(max_workers=workers or AGENT_WORKERS, thread_name_prefix="agent")
+        self.questions = 0
+        self.started = time.time()
+        self._reaper = None
+
+    async def start(self, host="127.0.0.1", port=8000):
+        self._reaper = asyncio.ensure_future(self.store.reap())
+        return await asyncio.start_server(self.handle, host, port)
+
+    def close(self):
+        if self._reaper is not None:
+            self._reaper.cancel()
+        self.executor.shutdown(wait=False)
+
+    # ---------- HTTP ----------
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request = await read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                await self.route(method, path, body, reader, writer)
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except ValueError as e:
+            await send_json(writer, 400, {"error": str(e)})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def route(self, method, path, body, reader, writer):
+        parts = [p for p in path.split("?", 1)[0].split("/") if p]
+        if parts == ["health"] and method == "GET":
+            await send_json(writer, 200, self.health())
+        elif parts == ["sessions"] and method == "POST":
+            session = self.store.create()
+            if session is None:
+                await send_json(writer, 503, {"error": "too many active sessions"})
+            else:
+                await send_json(writer, 201, {"session_id": session.id})
+        elif len(parts) >= 2 and parts[0] == "sessions":
+            session = self.store.get(parts[1])
+            if session is None:
+                await send_json(writer, 404, {"error": "unknown or expired session"})
+            elif len(parts) == 2 and method == "DELETE":
+                self.store.drop(session.id)
+                await send_json(writer, 200, {"deleted": session.id})
+            elif parts[2:] == ["ask"] and method == "POST":
+                try:
+                    question = json.loads(body or b"{}").get("question", "").strip()
+                except (ValueError, AttributeError):
+                    question = ""
+                if not question:
+                    await send_json(writer, 400, {"error": "body must be JSON with a 'question'"})
+                else:
+                    await self.ask(session, question, reader, writer)
+            else:
+                await send_json(writer, 405, {"error": "method not allowed"})
+        else:
+            await send_json(writer, 404, {"error": "not found"})
+
+    def health(self):
+        return {
+            "sessions": len(self.store.sessions),
+            "evicted": self.store.evicted,
+            "questions": self.questions,
+            "uptime_s": round(time.time() - self.started, 1),
+            "pool": get_pool(agent.DB_CONFIG).stats(),
+        }
+
+    # ---------- AGENT ----------
+
+    async def ask(self, session, question, reader, writer):
+        loop = asyncio.get_running_loop()
+        events = asyncio.Queue()
+
+        def on_tool(outcome):
+            event = {"event": "tool", "name": outcome["name"], "seconds": round(outcome["seconds"], 4)}
+            if outcome["name"] == "execute_sql":
+                event["sql"] = outcome["call"].get("args", {}).get("sql", "")
+            loop.call_soon_threadsafe(events.put_nowait, event)
+
+        # The session may be deleted or evicted while this request waits
+        lock = self.store.locks.get(session.id)
+        if lock is None:
+            await send_json(writer, 410, {"error": "session expired"})
+            return
+        async with lock:
+            if self.store.get(session.id) is not session:
+                await send_json(writer, 410, {"error": "session expired"})
+                return
+            start = time.perf_counter()
+            before = session.last_results
+            tracker = QueryTracker()
+            await start_stream(writer)
+            future = loop.run_in_executor(self.executor, agent.run_agent, question, session, on_tool, tracker)
+
+            try:
+                # Forward tool events while the agent works; notice a client
+                # that hangs up even when there is nothing to write
+                getter = asyncio.ensure_future(events.get())
+                while True:
+                    done, _ = await asyncio.wait({getter, future}, timeout=DISCONNECT_POLL,
+                                                 return_when=asyncio.FIRST_COMPLETED)
+                    if getter in done:
+                        await write_event(writer, getter.result())
+                        getter = asyncio.ensure_future(events.get())
+                    elif future in done:
+                        break
+                    elif reader.at_eof() or writer.is_closing():
+                        raise ConnectionResetError("client disconnected")
+                getter.cancel()
+                while not events.empty():
+                    await write_event(writer, events.get_nowait())
+
+                try:
+                    answer = future.result()
+                except Exception as e:
+                    await write_event(writer, {"event": "error", "error": str(e)})
+                else:
+                    self.questions += 1
+                    await write_event(writer, {"event": "answer", "text": answer})
+                    df = session.last_results
+                    if df is not None and df is not before:
+                        await stream_frame(writer, df)
+                await write_event(writer, {"event": "done", "seconds": round(time.perf_counter() - start, 4)})
+                await end_stream(writer)
+            except ConnectionError:
+                # Stop the abandoned question's queries, and keep the session
+                # locked until the agent has stopped writing to it
+                getter.cancel()
+                tracker.cancel()
+                await asyncio.wait({future})
+                raise
+
+
+# ---------- wire format ----------
+
+async def read_request(reader):
+    """(method, path, headers, body) of the next request, or None at EOF."""
+    line = await reader.readline()
+    if not line.strip():
+        return None
+    try:
+        method, path, _ = line.decode("latin-1").split(" ", 2)
+    except ValueError:
+        raise ValueError("malformed request line")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", "0") or 0)
+    if length > MAX_BODY:
+        raise ValueError("request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), path, headers, body
+
+
+async def send_json(writer, status, payload):
+    body = json.dumps(payload, default=str).encode("utf-8")
+    writer.write((f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                  "Content-Type: application/json\r\n"
+                  f"Content-Length: {len(body)}\r\n\r\n").encode("latin-1") + body)
+    await writer.drain()
+
+
+async def start_stream(writer):
+    writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\n"
+                 b"Transfer-Encoding: chunked\r\nCache-Control: no-cache\r\n\r\n")
+    await writer.drain()
+
+
+async def write_chunk(writer, data):
+    writer.write(f"{len(data):x}\r\n".encode("latin-1") + data + b"\r\n")
+    await writer.drain()
+
+
+async def write_event(writer, event):
+    await write_chunk(writer, json.dumps(event, default=str).encode("utf-8") + b"\n")
+
+
+async def stream_frame(writer, df):
+    """Result rows as "columns" then "rows" events of STREAM_BATCH rows."""
+    await write_event(writer, {"event": "columns", "columns": [str(c) for c in df.columns], "count": len(df)})
+    for start in range(0, len(df), STREAM_BATCH):
+        rows = df.iloc[start:start + STREAM_BATCH].to_json(orient="values", date_format="iso")
+        await write_chunk(writer, b'{"event": "rows", "rows": ' + rows.encode("utf-8") + b"}\n")
+
+
+async def end_stream(writer):
+    writer.write(b"0\r\n\r\n")
+    await writer.drain()
+
+
+async def serve(host, port):
+    service = AgentService()
+    server = await service.start(host, port)
+    print(f"Listening on http://{host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Text-to-SQL HTTP service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()